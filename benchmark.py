@@ -0,0 +1,218 @@
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import statistics
+import subprocess
+from datetime import datetime
+
+# Окно не показывается на экране; переменную можно задать и снаружи
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from library.core import LibraryCore, data_paths
+from library.synthetic import generate_dataset
+from library.writer import WriteBehindSaver
+
+# =============================================================
+# Замеры на синтетических данных (см. library/synthetic.py).
+# Каждый результат — строка JSON:
+#   {"benchmark": "...", "students": N, "books": N, "runs": N,
+#    "min_ms": ..., "median_ms": ..., "max_ms": ..., ...}
+# python benchmark.py --students 1000 10000 --output results.jsonl
+# =============================================================
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BASE_DIR,
+                              capture_output=True, text=True, timeout=5).stdout.strip()
+    except Exception:
+        return ""
+
+
+class Recorder:
+    def __init__(self, out, repeat, meta):
+        self.out = out
+        self.repeat = repeat
+        self.meta = meta
+
+    def run(self, name, fn, repeat=None, after=None):
+        # fn выполняется repeat раз; after (не замеряется) — возврат данных в исходное состояние
+        times = []
+        for _ in range(repeat or self.repeat):
+            start = time.perf_counter()
+            fn()
+            times.append((time.perf_counter() - start) * 1000)
+            if after is not None:
+                after()
+        record = dict(self.meta, benchmark=name, runs=len(times),
+                      min_ms=round(min(times), 3), median_ms=round(statistics.median(times), 3),
+                      max_ms=round(max(times), 3))
+        self.out.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self.out.flush()
+        return record
+
+
+def bench_core(rec, directory):
+    paths = data_paths(directory)
+    cache_path = os.path.splitext(paths["books"])[0] + ".cache"
+
+    def drop_cache():
+        if os.path.exists(cache_path):
+            os.remove(cache_path)
+
+    # Первый запуск ещё и пишет кэш каталога и журнал выдач
+    rec.run("core.load.first", lambda: LibraryCore(paths).close(), repeat=1)
+    drop_cache()
+    rec.run("core.load.cold_cache", lambda: LibraryCore(paths).close(), repeat=1)
+    rec.run("core.load.warm", lambda: LibraryCore(paths).close())
+
+    saver = WriteBehindSaver(delay=0)
+    core = LibraryCore(paths, saver)
+    rec.run("core.index.readers", lambda: setattr(core, "_readers_index", None) or core.readers_index)
+    rec.run("core.index.stats", lambda: setattr(core, "_stats", None) or core.stats)
+
+    def build_books():
+        core._book_index = None
+        core.book_index.wait()
+    rec.run("core.index.books", build_books)
+
+    rec.run("students.filter.all", lambda: core.search_students())
+    rec.run("students.filter.fio", lambda: core.search_students("ива"))
+    rec.run("students.filter.class", lambda: core.search_students("", "5", "А"))
+    rec.run("students.filter.fio_class", lambda: core.search_students("петр", "5", None))
+    rec.run("books.search.suggestions", lambda: core.search_books("тайн", 50))
+    rec.run("books.search.full", lambda: core.search_books("тайн"))
+    rec.run("books.search.short", lambda: core.search_books("та"))
+    rec.run("books.search.short_rare", lambda: core.search_books("ъ", 50))
+    rec.run("debts.overdue", lambda: core.ledger.overdue())
+    rec.run("promotion.plan", lambda: core.plan_promotion())
+
+    # Изменения записываются на диск (flush), затем отменяются вне замера
+    student = next(iter(core.students.values()))
+    book_id = next(iter(core.books))
+
+    def save_student():
+        core.update_student(core.students[student["id"]], dict(student, books=student["books"] + [book_id]))
+        saver.flush()
+
+    def undo():
+        core.undo()
+        saver.flush()
+    rec.run("save.student", save_student, after=undo)
+
+    def apply_promotion():
+        core.promote(core.plan_promotion())
+        saver.flush()
+    rec.run("promotion.apply", apply_promotion, repeat=1, after=undo)
+    core.close()
+    saver.close()
+
+
+def bench_gui(rec, directory):
+    try:
+        from PyQt6.QtWidgets import QApplication
+    except ImportError:
+        print("PyQt6 не установлен: замеры интерфейса пропущены", file=sys.stderr)
+        return
+    import widget
+
+    app = QApplication.instance() or QApplication(sys.argv)
+    widget.paths = data_paths(directory)
+    windows = []
+
+    def startup():
+        window = widget.LibraryApp()
+        window.show()
+        app.processEvents()
+        windows.append(window)
+
+    def close_windows():
+        while windows:
+            windows.pop().close()
+    rec.run("gui.startup", startup, after=close_windows)
+
+    window = widget.LibraryApp()
+    window.show()
+    app.processEvents()
+
+    def fill_readers(text, cls="Все"):
+        def run():
+            window.fio_search.blockSignals(True)
+            window.fio_search.setText(text)
+            window.fio_search.blockSignals(False)
+            window.class_filter.setCurrentText(cls)
+            window.refresh_readers()
+            app.processEvents()
+        return run
+    rec.run("gui.readers.populate_all", fill_readers(""))
+    rec.run("gui.readers.populate_fio", fill_readers("ива"))
+    rec.run("gui.readers.populate_class", fill_readers("", "5"))
+    fill_readers("")()
+
+    def filter_books(text):
+        def run():
+            window.book_search_edit.setText(text)
+            window.refresh_books()
+            app.processEvents()
+        return run
+    rec.run("gui.books.filter", filter_books("тайн"))
+    rec.run("gui.books.populate_all", filter_books(""))
+
+    student = next(iter(window.students.values()))
+    dialogs = []
+    rec.run("gui.student_dialog.open",
+            lambda: dialogs.append(window.create_student_dialog(student)),
+            after=lambda: dialogs.pop().deleteLater())
+    rec.run("gui.promotion_dialog.open",
+            lambda: dialogs.append(widget.PromotionDialog(window.students, window.readers_index.class_groups(),
+                                                          window.core.last_class(), parent=window)),
+            after=lambda: dialogs.pop().deleteLater())
+    rec.run("gui.stats.refresh", window.refresh_stats)
+    window.close()
+    app.processEvents()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Замеры производительности на синтетических данных")
+    parser.add_argument("--students", type=int, nargs="+", default=[1000])
+    parser.add_argument("--books", type=int, help="книг в каталоге (по умолчанию вдвое больше учеников)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", help="файл JSON lines (по умолчанию — стандартный вывод)")
+    parser.add_argument("--no-gui", action="store_true", help="только слой данных, без PyQt6")
+    parser.add_argument("--keep", action="store_true", help="не удалять сгенерированные папки")
+    args = parser.parse_args(argv)
+
+    out = open(args.output, "a", encoding="utf-8") if args.output else sys.stdout
+    try:
+        for students in args.students:
+            books = args.books or students * 2
+            directory = tempfile.mkdtemp(prefix=f"library-bench-{students}-")
+            try:
+                generate_dataset(directory, students, books, args.seed, overwrite=True)
+                meta = {"students": students, "books": books, "seed": args.seed,
+                        "revision": git_revision(), "python": platform.python_version(),
+                        "platform": platform.platform(), "time": datetime.now().isoformat(timespec="seconds")}
+                rec = Recorder(out, args.repeat, meta)
+                bench_core(rec, directory)
+                if not args.no_gui:
+                    bench_gui(rec, directory)
+            finally:
+                if args.keep:
+                    print(f"Данные оставлены в {directory}", file=sys.stderr)
+                else:
+                    shutil.rmtree(directory, ignore_errors=True)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1 @@
+# Слой данных школьной библиотеки (без зависимостей от Qt)
@@ -0,0 +1,6 @@
+import sys
+
+from library.cli import main
+
+# python -m library <команда> (см. library/cli.py)
+sys.exit(main())
@@ -0,0 +1,170 @@
+import os
+import re
+import gzip
+import json
+import zlib
+from datetime import datetime
+
+from library.formats import book_display
+from library.search import NAME_FIELDS, normalize
+from library.writer import DirectSaver
+
+GRADUATED = "graduated"
+DELETED = "deleted"
+
+REASON_NAMES = {GRADUATED: "Выпущен", DELETED: "Удалён"}
+
+PARTITION_RE = re.compile(r"^(\d{4})\.jsonl\.gz$")
+# Начало блока gzip: сигнатура и метод сжатия deflate
+GZIP_MAGIC = b"\x1f\x8b\x08"
+
+
+def archive_entry(student, loans, reason, books, when=None):
+    # Запись архива не зависит от каталога: книги сохраняются строками
+    # "Название - Автор", ведь каталог может измениться после ухода ученика.
+    # Ключ включает время, так как номер ученика после перезапуска
+    # может достаться новому ученику
+    when = when or datetime.now().isoformat(timespec="seconds")
+
+    def title(entry):
+        if isinstance(entry, int):
+            book = books.get(entry)
+            return book_display(book) if book is not None else ""
+        return entry
+
+    return {
+        "id": f"{when}/{student['id']}",
+        "year": int(when[:4]),
+        "archived": when[:10],
+        "reason": reason,
+        "student": dict(student, books=[title(entry) for entry in student.get("books", [])]),
+        "loans": [dict(loan, book=title(loan["book"])) for loan in loans],
+    }
+
+
+def entry_debts(entry):
+    return [loan for loan in entry["loans"] if loan.get("returned") is None]
+
+
+def entry_matches(entry, query, debts_only=False):
+    # query уже нормализован (normalize): подстрока в фамилии, имени
+    # или отчестве, как и в ReadersIndex
+    st = entry["student"]
+    if query and not any(query in normalize(st.get(field, "")) for field in NAME_FIELDS):
+        return False
+    return not debts_only or bool(entry_debts(entry))
+
+
+# =============================================================
+# Архив выпускников и удалённых учеников
+# =============================================================
+class StudentArchive:
+    # Холодное хранилище рядом с рабочими данными: по файлу на год,
+    # архив/ГГГГ.jsonl.gz. Как и журнал учеников, каждая строка —
+    # операция {"op": "put", "entry": {...}} или {"op": "delete", "id": ...}
+    # (удаление пишет отмена). Новые строки дописываются отдельным
+    # блоком gzip, файл целиком не переписывается. При запуске архив
+    # не читается: части загружаются только для поиска.
+    # Ученик не должен пропасть ни из рабочих данных, ни из архива:
+    # store пишет сразу и с fsync, до удаления учеников из рабочих
+    # данных, а remove (отмена) — через saver, после их возвращения.
+    # При сбое между двумя записями ученик окажется в обоих местах.
+    def __init__(self, directory, saver=None):
+        self.directory = directory
+        self.saver = saver if saver is not None else DirectSaver()
+        self._removing = False
+
+    def partition_path(self, year):
+        return os.path.join(self.directory, f"{year}.jsonl.gz")
+
+    def years(self):
+        self.saver.flush()
+        if not os.path.isdir(self.directory):
+            return []
+        years = [int(m.group(1)) for m in map(PARTITION_RE.match, os.listdir(self.directory)) if m]
+        return sorted(years, reverse=True)
+
+    def store(self, entries):
+        # Синхронно; ошибка записи (OSError) пробрасывается вызывающему
+        if not entries:
+            return
+        if self._removing:
+            # Строки удаления, поставленные отменой, должны лечь в часть раньше новых
+            self.saver.flush()
+            self._removing = False
+        for year, data in _blocks((entry["year"], {"op": "put", "entry": entry}) for entry in entries).items():
+            self._append(self.partition_path(year), data)
+
+    def remove(self, entries):
+        for year, data in _blocks((entry["year"], {"op": "delete", "id": entry["id"]}) for entry in entries).items():
+            self._removing = True
+            self.saver.submit(lambda path=self.partition_path(year), data=data: self._append(path, data),
+                              os.path.basename(self.partition_path(year)))
+
+    def _append(self, path, data):
+        os.makedirs(self.directory, exist_ok=True)
+        created = not os.path.exists(path)
+        with open(path, "ab") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        if created and hasattr(os, "O_DIRECTORY"):
+            # Новый файл части переживёт сбой, только если записана и папка
+            fd = os.open(self.directory, os.O_RDONLY | os.O_DIRECTORY)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+
+    def read(self, year):
+        # Записи одного года по ключу; недописанный при сбое хвост пропускается
+        self.saver.flush()
+        entries = {}
+        path = self.partition_path(year)
+        if not os.path.exists(path):
+            return entries
+        with open(path, "rb") as f:
+            raw = f.read()
+        for line in _decompress(raw, os.path.basename(path)).splitlines():
+            try:
+                op = json.loads(line)
+            except ValueError:
+                continue
+            if op.get("op") == "put":
+                entries[op["entry"]["id"]] = op["entry"]
+            elif op.get("op") == "delete":
+                entries.pop(op.get("id"), None)
+        return entries
+
+
+def _blocks(ops):
+    # Пары (год, операция) -> {год: блок gzip со строками этого года}
+    lines = {}
+    for year, op in ops:
+        lines.setdefault(year, []).append(json.dumps(op, ensure_ascii=False) + "\n")
+    return {year: gzip.compress("".join(year_lines).encode("utf-8")) for year, year_lines in lines.items()}
+
+
+def _decompress(raw, name):
+    # Файл — последовательность блоков gzip, по блоку на запись в архив;
+    # gzip.decompress отверг бы весь файл из-за одного оборванного блока.
+    # Оборванный сбоем блок пропускается целиком, а чтение продолжается
+    # со следующего заголовка gzip: дописанное после сбоя не теряется
+    chunks = []
+    view = memoryview(raw)
+    start = 0
+    while start < len(raw):
+        decoder = zlib.decompressobj(wbits=16 + zlib.MAX_WBITS)
+        try:
+            data = decoder.decompress(view[start:])
+        except zlib.error as e:
+            print(f"Ошибка загрузки {name}:", e)
+            data = None
+        if data is not None and decoder.eof:
+            chunks.append(data)
+            start = len(raw) - len(decoder.unused_data)
+            continue
+        start = raw.find(GZIP_MAGIC, start + 1)
+        if start < 0:
+            break
+    return b"".join(chunks).decode("utf-8", errors="replace")
@@ -0,0 +1,123 @@
+import os
+import gc
+import sys
+import struct
+import hashlib
+from array import array
+
+from library.formats import parse_books
+from library.writer import DirectSaver, atomic_write
+
+# Заголовок кэша: метка формата, размер, mtime (нс) и хэш исходного файла, число книг.
+# Дальше идут номера книг (int64, little-endian), затем названия и авторы
+# в UTF-8, разделённые нулевым символом.
+CACHE_MAGIC = b"LIBCAT2\0"
+CACHE_HEADER = struct.Struct("<8sQq16sI")
+ID_SIZE = 8
+SEPARATOR = "\0"
+
+
+def cache_path_for(books_path):
+    return os.path.splitext(books_path)[0] + ".cache"
+
+
+def source_digest(data):
+    return hashlib.blake2b(data, digest_size=16).digest()
+
+
+def _id_array(values=()):
+    ids = array("q", values)
+    assert ids.itemsize == ID_SIZE
+    return ids
+
+
+def encode_catalog(books, size, mtime_ns, digest):
+    ids = _id_array(b["id"] for b in books)
+    if sys.byteorder != "little":
+        ids.byteswap()
+    payload = SEPARATOR.join(b["Title"] + SEPARATOR + b["Author"] for b in books)
+    return CACHE_HEADER.pack(CACHE_MAGIC, size, mtime_ns, digest, len(books)) + \
+        ids.tobytes() + payload.encode("utf-8")
+
+
+def decode_catalog(blob):
+    # Возвращает ((size, mtime_ns, digest), books) или None, если кэш испорчен
+    try:
+        magic, size, mtime_ns, digest, count = CACHE_HEADER.unpack_from(blob)
+        if magic != CACHE_MAGIC:
+            return None
+        text_start = CACHE_HEADER.size + count * ID_SIZE
+        ids = _id_array()
+        ids.frombytes(blob[CACHE_HEADER.size:text_start])
+        fields = blob[text_start:].decode("utf-8").split(SEPARATOR) if count else []
+    except (struct.error, ValueError):
+        return None
+    if len(ids) != count or len(fields) != count * 2:
+        return None
+    if sys.byteorder != "little":
+        ids.byteswap()
+    it = iter(fields)
+    # Сотни тысяч новых словарей без пауз сборщика мусора собираются почти вдвое быстрее
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        books = [{"Title": t, "Author": a, "id": i} for t, a, i in zip(it, it, ids)]
+    finally:
+        if gc_enabled:
+            gc.enable()
+    return (size, mtime_ns, digest), books
+
+
+def read_cache(cache_path):
+    try:
+        with open(cache_path, "rb") as f:
+            blob = f.read()
+    except OSError:
+        return None, None
+    return decode_catalog(blob), blob
+
+
+def write_catalog_cache(books_path, books, source):
+    # Вызывается после записи литература.txt, чтобы кэш не устаревал
+    stat = os.stat(books_path)
+    atomic_write(cache_path_for(books_path),
+                 encode_catalog(books, stat.st_size, stat.st_mtime_ns, source_digest(source)))
+
+
+# =============================================================
+# Загрузка каталога: литература.txt остаётся основным источником,
+# кэш используется, пока совпадают размер и mtime либо хэш файла
+# =============================================================
+def load_catalog(books_path, saver=None, read_only=False):
+    # read_only — кэш не пишется (консольные отчёты и проверка)
+    if not os.path.exists(books_path):
+        return []
+    saver = saver if saver is not None else DirectSaver()
+    cache_path = cache_path_for(books_path)
+    cached, cache_blob = read_cache(cache_path)
+    stat = os.stat(books_path)
+    if cached is not None:
+        (size, mtime_ns, digest), books = cached
+        if size == stat.st_size and mtime_ns == stat.st_mtime_ns:
+            return books
+    with open(books_path, "rb") as f:
+        source = f.read()
+        stat = os.fstat(f.fileno())
+    digest = source_digest(source)
+    if cached is not None and cached[0][2] == digest:
+        # Файл переписан без изменений (копирование, синхронизация) — обновляем только заголовок
+        books = cached[1]
+        blob = CACHE_HEADER.pack(CACHE_MAGIC, stat.st_size, stat.st_mtime_ns, digest, len(books)) + \
+            cache_blob[CACHE_HEADER.size:]
+    else:
+        books = parse_books(source.decode("utf-8"))
+        if not all("id" in b for b in books):
+            # Файл старого формата без номеров: хранилище выдаст номера и
+            # перепишет его вместе с кэшем
+            return books
+        blob = encode_catalog(books, stat.st_size, stat.st_mtime_ns, digest)
+    if read_only:
+        return books
+    saver.schedule(("cache", cache_path), lambda: atomic_write(cache_path, blob),
+                   os.path.basename(cache_path))
+    return books
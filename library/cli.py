@@ -0,0 +1,269 @@
+import os
+import io
+import sys
+import csv
+import json
+import argparse
+
+from library.core import LibraryCore, data_paths
+from library.formats import STUDENT_FIELDS, parse_books
+from library.ledger import today_iso
+from library.promotion import ACTION_NAMES, GRADUATE, KEEP, PROMOTE
+from library.synthetic import generate_dataset
+
+# По умолчанию данные берутся из папки программы (на уровень выше library/)
+DEFAULT_DATA_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+LOAN_HEADERS = ["id", "ученик", "класс", "книга", "выдана", "срок", "возвращена"]
+
+
+# =============================================================
+# Вывод таблиц: text (для человека), csv и json (для других программ)
+# =============================================================
+def write_rows(headers, rows, fmt, out):
+    if fmt == "json":
+        json.dump([dict(zip(headers, row)) for row in rows], out, ensure_ascii=False, indent=2)
+        out.write("\n")
+    elif fmt == "csv":
+        writer = csv.writer(out)
+        writer.writerow(headers)
+        writer.writerows(rows)
+    else:
+        out.write("\t".join(headers) + "\n")
+        for row in rows:
+            out.write("\t".join("" if value is None else str(value) for value in row) + "\n")
+
+
+def open_output(path):
+    if not path or path == "-":
+        return sys.stdout
+    return open(path, "w", encoding="utf-8", newline="")
+
+
+def student_name(st):
+    return f'{st.get("last_name", "")} {st.get("first_name", "")} {st.get("middle_name", "")}'
+
+
+def loan_rows(core, loans):
+    rows = []
+    for loan in loans:
+        st = core.students.get(loan["student_id"], {})
+        rows.append([loan["id"], student_name(st), f'{st.get("class", "")}{st.get("parallel", "")}',
+                     core.loan_display(loan["book"]), loan["issued"], loan["due"], loan.get("returned")])
+    return rows
+
+
+def read_records(path):
+    # Ученики или книги из .json (список объектов) или .csv (строка заголовков)
+    with open(path, "r", encoding="utf-8-sig", newline="") as f:
+        text = f.read()
+    if path.lower().endswith(".json"):
+        return json.loads(text)
+    dialect = csv.Sniffer().sniff(text.splitlines()[0] if text else ",", delimiters=",;\t")
+    return list(csv.DictReader(io.StringIO(text), dialect=dialect))
+
+
+# =============================================================
+# Команды
+# =============================================================
+def cmd_import(core, args):
+    if args.kind == "books":
+        if args.file.lower().endswith((".csv", ".json")):
+            books = read_records(args.file)
+        else:
+            with open(args.file, "r", encoding="utf-8") as f:
+                books = parse_books(f.read())
+        change = core.import_books(books)
+        print(f"Добавлено книг: {len(change.books) if change else 0} из {len(books)}")
+        return 0
+    students = []
+    rejected = 0
+    for i, record in enumerate(read_records(args.file), 1):
+        data = {field: str(record.get(field) or "").strip() for field in STUDENT_FIELDS}
+        data["books"] = []
+        error = core.validate_student(data)
+        if error:
+            print(f"Строка {i}: {error}")
+            rejected += 1
+            continue
+        students.append(data)
+    core.import_students(students)
+    print(f"Добавлено учеников: {len(students)}, пропущено: {rejected}")
+    return 1 if rejected else 0
+
+
+def cmd_export(core, args):
+    if args.what == "students":
+        headers = ["id", *STUDENT_FIELDS, "books"]
+        rows = [[st["id"], *(st.get(field, "") for field in STUDENT_FIELDS),
+                 "; ".join(core.loan_display(entry) for entry in st.get("books", []))]
+                for st in core.students.values()]
+    elif args.what == "books":
+        headers = ["id", "Title", "Author"]
+        rows = [[b["id"], b.get("Title", ""), b.get("Author", "")] for b in core.books.values()]
+    else:
+        headers = LOAN_HEADERS
+        loans = core.ledger.due_between() if args.what == "debts" else \
+            sorted(core.ledger.loans.values(), key=lambda loan: loan["id"])
+        rows = loan_rows(core, loans)
+    out = open_output(args.output)
+    try:
+        write_rows(headers, rows, args.format, out)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    return 0
+
+
+def cmd_report(core, args):
+    if args.what == "summary":
+        headers = ["показатель", "значение"]
+        rows = [
+            ["Читателей", len(core.students)],
+            ["Книг в каталоге", len(core.books)],
+            ["Книг на руках", core.stats.loans_on_hand()],
+            ["Просрочено", len(core.ledger.overdue(today_iso()))],
+            ["Выдач в журнале", len(core.ledger)],
+            ["Лет в архиве", len(core.archive.years())],
+        ]
+    elif args.what == "overdue":
+        headers = LOAN_HEADERS
+        rows = loan_rows(core, core.ledger.overdue(today_iso()))
+    elif args.what == "classes":
+        headers = ["класс", "книг на руках"]
+        rows = [[cls + par, count] for (cls, par), count in core.stats.classes()]
+    else:
+        headers = ["книга", "выдач"]
+        rows = [[core.loan_display(book) or "(удалена из каталога)", count]
+                for book, count in core.stats.top_books(args.limit)]
+    write_rows(headers, rows, args.format, sys.stdout)
+    return 0
+
+
+def cmd_promote(core, args):
+    actions = {PROMOTE: PROMOTE, GRADUATE: GRADUATE, KEEP: KEEP}
+    actions.update({name.lower(): action for action, name in ACTION_NAMES.items()})
+    rules = {}
+    for rule in args.rule:
+        cls, _, action = rule.partition("=")
+        if action.lower() not in actions:
+            print(f"Неизвестное действие в правиле {rule}: ожидается {', '.join(sorted(actions))}")
+            return 2
+        rules[cls] = actions[action.lower()]
+    plan = core.plan_promotion(rules, last_class=args.last_class)
+    print(f"Переводятся: {len(plan.moves)}, выпускаются: {len(plan.graduates)}, остаются: {len(plan.kept)}")
+    if not args.apply:
+        print("План не применён (добавьте --apply)")
+        return 0
+    core.promote(plan)
+    print("Перевод выполнен, выпускники перенесены в архив")
+    return 0
+
+
+def cmd_check(core, args):
+    # Без --repair данные только читаются: исправления перечисляются, но не записываются.
+    # Ненулевой код — только несогласованные данные; переход со старого
+    # формата и экземпляры одного названия — просто сведения
+    label = "Требует исправления (запустите check --repair)" if core.read_only else "Исправлено при загрузке"
+    for repair, count in core.repairs.items():
+        print(f"{label}: {repair} ({count})")
+    label = "Обновление формата (при первой записи)" if core.read_only else "Обновлено при загрузке"
+    for upgrade, count in core.upgrades.items():
+        print(f"{label}: {upgrade} ({count})")
+    repeated = core.repeated_titles()
+    if repeated:
+        print(f"Названий с несколькими экземплярами: {len(repeated)} "
+              f"(экземпляров: {sum(repeated.values())})")
+    problems = core.check_integrity()
+    for problem in problems:
+        print(problem)
+    print(f"Найдено проблем: {len(problems)}")
+    return 1 if problems or (core.read_only and core.repairs) else 0
+
+
+def writes_data(args):
+    # Пишущие команды блокируют папку данных (library/lock.py),
+    # остальные открывают её только для чтения
+    if args.command == "import":
+        return True
+    if args.command == "promote":
+        return args.apply
+    if args.command == "check":
+        return args.repair
+    return False
+
+
+def cmd_generate(args):
+    students, books, loans = generate_dataset(args.data, args.students, args.books, args.seed,
+                                              overwrite=args.force)
+    print(f"Создано в {args.data}: учеников {students}, книг {books}, выдач {loans}")
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python -m library", description="Школьная библиотека без интерфейса")
+    parser.add_argument("--data", default=DEFAULT_DATA_DIR, help="папка с данными (по умолчанию — папка программы)")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    p = commands.add_parser("import", help="добавить учеников или книги из файла")
+    p.add_argument("kind", choices=["students", "books"])
+    p.add_argument("file", help="students: .json или .csv; books: литература.txt, .csv или .json")
+    p.set_defaults(func=cmd_import)
+
+    p = commands.add_parser("export", help="выгрузить данные")
+    p.add_argument("what", choices=["students", "books", "loans", "debts"])
+    p.add_argument("-o", "--output", help="файл (по умолчанию — стандартный вывод)")
+    p.add_argument("--format", choices=["csv", "json", "text"], default="csv")
+    p.set_defaults(func=cmd_export)
+
+    p = commands.add_parser("report", help="отчёты")
+    p.add_argument("what", choices=["summary", "overdue", "classes", "top"])
+    p.add_argument("--format", choices=["csv", "json", "text"], default="text")
+    p.add_argument("--limit", type=int, default=20)
+    p.set_defaults(func=cmd_report)
+
+    p = commands.add_parser("promote", help="перевод в следующий класс")
+    p.add_argument("--rule", action="append", default=[], metavar="КЛАСС=ДЕЙСТВИЕ",
+                   help="например 9=graduate или 11=keep")
+    p.add_argument("--last-class")
+    p.add_argument("--apply", action="store_true", help="применить план, а не только показать его")
+    p.set_defaults(func=cmd_promote)
+
+    p = commands.add_parser("check", help="проверка целостности данных")
+    p.add_argument("--repair", action="store_true", help="записать исправления, найденные при загрузке")
+    p.set_defaults(func=cmd_check)
+
+    # Данные для замеров (см. benchmark.py); существующие данные не загружаются
+    p = commands.add_parser("generate", help="создать синтетические данные в папке --data")
+    p.add_argument("--students", type=int, default=1000)
+    p.add_argument("--books", type=int, default=5000)
+    p.add_argument("--seed", type=int, default=1)
+    p.add_argument("--force", action="store_true", help="заменить данные, уже лежащие в папке")
+    p.set_defaults(func=cmd_generate, standalone=True)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if getattr(args, "standalone", False):
+        try:
+            return args.func(args)
+        except Exception as e:
+            print("Ошибка:", e)
+            return 1
+    try:
+        core = LibraryCore(data_paths(args.data), read_only=not writes_data(args))
+    except Exception as e:
+        print("Ошибка загрузки данных:", e)
+        return 1
+    try:
+        return args.func(core, args)
+    except BrokenPipeError:
+        # Вывод передан в head и т.п., который закрылся раньше
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        return 0
+    except Exception as e:
+        print("Ошибка:", e)
+        return 1
+    finally:
+        core.close()
@@ -0,0 +1,409 @@
+import os
+import re
+import json
+from collections import Counter
+
+from library.archive import DELETED, GRADUATED, StudentArchive, archive_entry
+from library.formats import book_display
+from library.history import Change, UndoStack
+from library.ledger import DEFAULT_LOAN_DAYS, LoanLedger
+from library.loans import LoansIndex, resolve_loans
+from library.lock import DataLock
+from library.profiling import ENV_VAR, profiler
+from library.promotion import apply_plan, plan_promotion
+from library.search import ReadersIndex, TrigramIndex
+from library.stats import LibraryStats
+from library.storage import open_storage
+from library.writer import DirectSaver, atomic_write
+
+DEFAULT_CONFIG = {
+    "classes": [str(i) for i in range(1, 12)],
+    "parallels": ["А", "Б", "В", "Г", "Д", "Л", "М"]
+}
+
+
+def data_paths(base_dir):
+    # Файлы данных лежат в одной папке (рядом с программой)
+    return {
+        "config": os.path.join(base_dir, "config.json"),
+        "books": os.path.join(base_dir, "литература.txt"),
+        "students": os.path.join(base_dir, "students.json"),
+        "database": os.path.join(base_dir, "library.db"),
+        "archive": os.path.join(base_dir, "архив"),
+        "stall_log": os.path.join(base_dir, "зависания.log"),
+        "lock": os.path.join(base_dir, "library.lock"),
+    }
+
+
+def load_config(path):
+    if os.path.exists(path):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except Exception as e:
+            print(f"Ошибка загрузки {os.path.basename(path)}:", e)
+    return {key: list(value) for key, value in DEFAULT_CONFIG.items()}
+
+
+def is_valid_name(text):
+    return bool(re.fullmatch(r"[А-Яа-яA-Za-z-]+", text.strip()))
+
+
+class CommitError(RuntimeError):
+    # Изменение не применено: данные и история остались прежними
+    pass
+
+
+# =============================================================
+# Данные библиотеки без интерфейса: окно (widget.py) и консольная
+# утилита (library/cli.py) работают через один и тот же объект
+# =============================================================
+class LibraryCore:
+    # Записи хранятся по id в self.students и self.books; словари не
+    # пересоздаются, так как на них ссылаются индексы и таблицы окна.
+    # Все изменения проходят через commit (см. library/history.py).
+    # Поисковые индексы и статистика строятся при первом обращении:
+    # консольной команде, которой они не нужны, не приходится их ждать.
+    # read_only=True (отчёты, выгрузка, check): на диск ничего не пишется,
+    # исправления при загрузке делаются только в памяти и перечисляются
+    # в self.repairs (несогласованные данные) и self.upgrades (переход
+    # со старого формата, это не ошибка). Иначе папка данных блокируется (library/lock.py):
+    # вторая копия программы получит DataLockedError.
+    @profiler.timed("core.load")
+    def __init__(self, paths, saver=None, read_only=False):
+        self.paths = paths
+        self.read_only = read_only
+        self.lock = None
+        if not read_only:
+            self.lock = DataLock(paths["lock"])
+            self.lock.acquire()
+        self.saver = saver if saver is not None else DirectSaver()
+        self.config = load_config(paths["config"])
+        # Замеры (library/profiling.py): переменная окружения важнее config.json
+        if ENV_VAR not in os.environ:
+            profiler.configure(self.config.get("profiling"))
+        self.storage = open_storage(self.config.get("storage", "files"),
+                                    paths["students"], paths["books"], paths["database"], self.saver,
+                                    read_only)
+        # Выпускники и удалённые ученики уходят в архив и при запуске не читаются
+        self.archive = StudentArchive(paths["archive"], self.saver)
+        with profiler.measure("core.load.books"):
+            self.books = {b["id"]: b for b in self.storage.load_books()}
+        with profiler.measure("core.load.students"):
+            self.students = {st["id"]: st for st in self.storage.load_students()}
+        # Что было исправлено или обновлено при загрузке (см. check_integrity)
+        self.repairs = Counter()
+        self.upgrades = Counter()
+        # Выдачи старого формата (строки "Название - Автор") переводятся на id книг
+        migrated = resolve_loans(self.students.values(), self.books.values())
+        if migrated:
+            if not read_only:
+                self.storage.update_students(migrated)
+            self.upgrades["Списки книг переведены на номера каталога"] += len(migrated)
+        self.loans_index = LoansIndex()
+        self.loans_index.load(self.students.values())
+        # Журнал выдач догоняет списки книг (в том числе при первом запуске)
+        self.ledger = LoanLedger(self.config.get("loan_days", DEFAULT_LOAN_DAYS))
+        self.ledger.load(self.storage.load_loans())
+        # Выдачи учеников, удалённых без них (сбой между записью двух журналов)
+        orphan_ids = {loan["student_id"] for loan in self.ledger.loans.values()} - self.students.keys()
+        orphans = [loan for key in orphan_ids for loan in self.ledger.remove_student(key)]
+        if orphans:
+            if not read_only:
+                self.storage.delete_loans(orphans)
+            self.repairs["Удалены выдачи несуществующих учеников"] += len(orphans)
+        first_ledger = not self.ledger.loans
+        synced = [loan for st in self.students.values() for loan in self.ledger.sync_student(st)]
+        if synced:
+            if not read_only:
+                self.storage.put_loans(synced)
+            if first_ledger:
+                # Данные из версии без журнала выдач
+                self.upgrades["Журнал выдач создан по спискам книг"] += len(synced)
+            else:
+                self.repairs["Журнал выдач приведён к спискам книг"] += len(synced)
+        self._stats = None
+        self._book_index = None
+        self._readers_index = None
+        # Отмена и повтор: в истории хранятся разницы, а не копии данных
+        self.history = UndoStack()
+
+    @property
+    def stats(self):
+        if self._stats is None:
+            self._stats = LibraryStats()
+            self._stats.load(self.students.values(), self.ledger.loans.values(), self.books.values())
+        return self._stats
+
+    @property
+    def book_index(self):
+        if self._book_index is None:
+            self._book_index = TrigramIndex()
+            self._book_index.load((b["id"], b, (b.get("Title", ""), b.get("Author", "")))
+                                  for b in self.books.values())
+        return self._book_index
+
+    @property
+    def readers_index(self):
+        if self._readers_index is None:
+            self._readers_index = ReadersIndex()
+            self._readers_index.load(self.students.values())
+        return self._readers_index
+
+    def save_config(self):
+        data = json.dumps(self.config, ensure_ascii=False, indent=4)
+        path = self.paths["config"]
+        self.saver.schedule("config", lambda: atomic_write(path, data), os.path.basename(path))
+
+    def close(self):
+        # Всё, что ещё не записано, сохраняется
+        self.storage.close()
+        if self.lock is not None:
+            self.lock.release()
+            self.lock = None
+
+    # ---------------------------------------------------------
+    # Запросы
+    # ---------------------------------------------------------
+    @profiler.timed("students.filter")
+    def search_students(self, fio="", cls=None, par=None):
+        # cls / par равные None означают «Все»
+        return self.readers_index.search(fio, cls, par)
+
+    @profiler.timed("books.search")
+    def search_books(self, query="", limit=None):
+        return self.book_index.search(query, limit)
+
+    def loan_display(self, entry):
+        if isinstance(entry, int):
+            book = self.books.get(entry)
+            return book_display(book) if book is not None else ""
+        return entry
+
+    def validate_student(self, data):
+        # Текст ошибки или пустая строка
+        if not all(is_valid_name(data.get(field, "")) for field in ("last_name", "first_name", "middle_name")):
+            return "Фамилия, Имя и Отчество должны содержать только буквы!"
+        return ""
+
+    def last_class(self):
+        classes = [cls for cls in self.config.get("classes", []) if cls.isdigit()]
+        return max(classes, key=int) if classes else "11"
+
+    def plan_promotion(self, rules=None, overrides=None, last_class=None):
+        return plan_promotion(self.readers_index.class_groups(), last_class or self.last_class(),
+                              rules, overrides)
+
+    def check_integrity(self):
+        # Список найденных несогласованностей (строки); исправленное при загрузке
+        # (или, при read_only, требующее исправления) — в self.repairs.
+        # Повторяющиеся названия — экземпляры одной книги, см. repeated_titles
+        problems = []
+        classes = set(self.config.get("classes", []))
+        parallels = set(self.config.get("parallels", []))
+        for st in self.students.values():
+            name = f'{st.get("last_name", "")} {st.get("first_name", "")} (id {st["id"]})'
+            if self.validate_student(st):
+                problems.append(f"{name}: недопустимые символы в ФИО")
+            if st.get("class", "") not in classes:
+                problems.append(f'{name}: класс «{st.get("class", "")}» отсутствует в настройках')
+            if st.get("parallel", "") not in parallels:
+                problems.append(f'{name}: параллель «{st.get("parallel", "")}» отсутствует в настройках')
+            for entry in st.get("books", []):
+                if isinstance(entry, int) and entry not in self.books:
+                    problems.append(f"{name}: книга с номером {entry} отсутствует в каталоге")
+            on_hand = Counter(loan["book"] for loan in self.ledger.open_loans(st["id"]))
+            if on_hand != Counter(st.get("books", [])):
+                problems.append(f"{name}: журнал выдач не совпадает со списком книг")
+        for loan in self.ledger.loans.values():
+            if loan["student_id"] not in self.students:
+                problems.append(f'Выдача {loan["id"]}: ученик {loan["student_id"]} не найден')
+            if loan["due"] < loan["issued"]:
+                problems.append(f'Выдача {loan["id"]}: срок раньше даты выдачи')
+        return problems
+
+    def repeated_titles(self):
+        # Название -> число экземпляров, для названий с несколькими экземплярами
+        titles = Counter(book_display(b) for b in self.books.values())
+        return {title: count for title, count in titles.items() if count > 1}
+
+    # ---------------------------------------------------------
+    # Изменения: каждое возвращает применённый Change (или None)
+    # ---------------------------------------------------------
+    def add_book(self, data):
+        data["id"] = self.storage.new_book_id()
+        change = Change("добавление книги")
+        change.put("books", data)
+        return self.commit(change)
+
+    def update_book(self, book, data):
+        # Читатели ссылаются на книгу по id, поэтому их записи не меняются
+        change = Change("изменение книги")
+        change.put("books", dict(book, **data), book)
+        return self.commit(change)
+
+    def delete_book(self, book):
+        # Меняются только читатели из обратного индекса, одним пакетом с удалением книги.
+        # Книга остаётся у них на руках: в списке и в открытых выдачах номер
+        # заменяется названием, как у книги не из каталога, и выдача не закрывается
+        title = book_display(book)
+        change = Change("удаление книги")
+        for key in self.loans_index.holders(book["id"]):
+            st = self.students[key]
+            change.put("students", dict(st, books=[title if entry == book["id"] else entry
+                                                   for entry in st["books"]]), st)
+            for loan in self.ledger.open_loans(key):
+                if loan["book"] == book["id"]:
+                    change.record("loans", loan["id"], loan, dict(loan, book=title))
+        change.delete("books", book)
+        return self.commit(change)
+
+    def import_books(self, books):
+        # Книги, уже имеющиеся в каталоге, пропускаются
+        known = {book_display(b) for b in self.books.values()}
+        change = Change("импорт книг")
+        for book in books:
+            if not (book.get("Title") and book.get("Author")) or book_display(book) in known:
+                continue
+            known.add(book_display(book))
+            change.put("books", {"Title": book["Title"], "Author": book["Author"],
+                                 "id": self.storage.new_book_id()})
+        return self.commit(change) if change else None
+
+    def add_student(self, data):
+        data["id"] = self.storage.new_student_id()
+        change = Change("добавление ученика")
+        self.stage_student(change, data)
+        return self.commit(change)
+
+    def update_student(self, student, data):
+        data["id"] = student["id"]
+        change = Change("изменение ученика")
+        self.stage_student(change, data, student)
+        return self.commit(change)
+
+    def delete_student(self, student):
+        change = Change("удаление ученика")
+        self.stage_student_delete(change, student, DELETED)
+        return self.commit(change)
+
+    def import_students(self, students):
+        change = Change("импорт учеников")
+        for st in students:
+            st["id"] = self.storage.new_student_id()
+            self.stage_student(change, st)
+        return self.commit(change) if change else None
+
+    def promote(self, plan):
+        # Весь перевод сохраняется одним пакетом; в истории остаются
+        # ссылки на прежние записи затронутых учеников, а не копия списка
+        updated, removed = apply_plan(plan, self.students)
+        change = Change("перевод учеников")
+        for st in updated:
+            change.put("students", st, self.students[st["id"]])
+        for st in removed:
+            self.stage_student_delete(change, st, GRADUATED)
+        return self.commit(change) if change else None
+
+    def set_class_lists(self, classes, parallels):
+        change = Change("изменение классов и параллелей")
+        change.config = ({"classes": self.config.get("classes", []), "parallels": self.config.get("parallels", [])},
+                         {"classes": classes, "parallels": parallels})
+        return self.commit(change) if change.config[0] != change.config[1] else None
+
+    def stage_student(self, change, student, previous=None):
+        # Ученик и выдачи, которые следуют за его списком книг
+        change.put("students", student, previous)
+        for before, after in self.ledger.diff_student(student):
+            change.record("loans", (after or before)["id"], before, after)
+
+    def stage_student_delete(self, change, student, reason):
+        # Ученик и его выдачи (в том числе долги) переносятся в архив
+        loans = self.ledger.student_loans(student["id"])
+        change.delete("students", student)
+        for loan in loans:
+            change.delete("loans", loan)
+        change.put("archive", archive_entry(student, loans, reason, self.books))
+
+    @profiler.timed("core.commit")
+    def commit(self, change, record=True):
+        # Единственная точка изменения данных: хранилище, индексы, счётчики
+        # и журнал выдач обновляются по одной разнице, поэтому отмена —
+        # это применение обратной разницы. Ещё не построенные индексы
+        # не обновляются: при построении они возьмут текущие данные
+        if self.read_only:
+            raise RuntimeError("Данные открыты только для чтения")
+        put_students, deleted_students = change.split("students")
+        put_books, deleted_books = change.split("books")
+        put_loans, deleted_loans = change.split("loans")
+        put_archive, deleted_archive = change.split("archive")
+        # Уходящие ученики сначала записываются в архив (сразу, с fsync) и
+        # только потом удаляются из рабочих данных; если архив не записан,
+        # изменение не применяется вовсе
+        try:
+            self.archive.store(put_archive)
+        except OSError as e:
+            raise CommitError(f"Не удалось записать архив, изменение не сохранено: {e}")
+        with profiler.measure("storage.commit"):
+            self.storage.commit(put_students, deleted_students, put_books, deleted_books,
+                                put_loans, deleted_loans)
+        # Возвращённые отменой убираются из архива после записи в рабочие данные
+        self.archive.remove(deleted_archive)
+        stats, book_index, readers_index = self._stats, self._book_index, self._readers_index
+        for book in deleted_books:
+            self.books.pop(book["id"], None)
+            if book_index is not None:
+                book_index.remove(book["id"])
+            if stats is not None:
+                stats.remove_book(book)
+        for book in put_books:
+            self.books[book["id"]] = book
+            if book_index is not None:
+                book_index.add(book["id"], book, book["Title"], book["Author"])
+            if stats is not None:
+                stats.update_book(book)
+        for st in deleted_students:
+            self.students.pop(st["id"], None)
+            self.loans_index.remove(st)
+            if readers_index is not None:
+                readers_index.remove(st)
+            if stats is not None:
+                stats.remove_student(st)
+        for st in put_students:
+            self.students[st["id"]] = st
+            self.loans_index.add(st)
+            if readers_index is not None:
+                readers_index.add(st)
+            if stats is not None:
+                stats.add_student(st)
+        self.ledger.apply(change.loans.values())
+        if stats is not None:
+            stats.remove_loans(deleted_loans)
+            stats.add_loans(put_loans)
+        if change.config is not None:
+            self.config.update(change.config[1])
+            self.save_config()
+        if record:
+            self.history.push(change)
+        return change
+
+    def undo(self):
+        if self.history.can_undo():
+            change = self.history.undo()
+            try:
+                return self.commit(change, record=False)
+            except Exception:
+                # Изменение не применено: шаг остаётся в истории на прежнем месте
+                self.history.redo()
+                raise
+        return None
+
+    def redo(self):
+        if self.history.can_redo():
+            change = self.history.redo()
+            try:
+                return self.commit(change, record=False)
+            except Exception:
+                self.history.undo()
+                raise
+        return None
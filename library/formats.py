@@ -0,0 +1,62 @@
+import os
+import re
+
+# Одна книга на строку: {Title = "...", Author = "..."}, -- id: N
+# Номер книги записан комментарием, поэтому строка остаётся прежнего вида
+# и читается старыми версиями программы
+BOOK_LINE_RE = re.compile(
+    r'\{Title\s*=\s*"([^"\n]+)"\s*,\s*Author\s*=\s*"([^"\n]+)"\}(?:,?[ \t]*--[ \t]*id:[ \t]*(\d+))?')
+
+STUDENT_FIELDS = ("last_name", "first_name", "middle_name", "class", "parallel")
+
+
+def format_book_line(book):
+    line = f'{{Title = "{book.get("Title", "")}", Author = "{book.get("Author", "")}"}},'
+    if isinstance(book.get("id"), int):
+        line += f' -- id: {book["id"]}'
+    return line + "\n"
+
+
+def book_display(book):
+    # Строка, под которой книга показывается в списках выбора и у читателей
+    return f'{book.get("Title", "")} - {book.get("Author", "")}'
+
+
+def parse_books(text):
+    # Один проход регулярного выражения по всему файлу вместо поиска в каждой строке.
+    # Книги из файлов без номеров возвращаются без "id" (см. assign_ids)
+    books = []
+    for title, author, book_id in BOOK_LINE_RE.findall(text):
+        if book_id:
+            books.append({"Title": title, "Author": author, "id": int(book_id)})
+        else:
+            books.append({"Title": title, "Author": author})
+    return books
+
+
+def read_books_file(path):
+    if os.path.exists(path):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return parse_books(f.read())
+        except Exception as e:
+            print(f"Ошибка загрузки {os.path.basename(path)}:", e)
+    return []
+
+
+def assign_ids(records):
+    # Записям без "id" и повторам уже встреченного номера выдаются номера
+    # после максимального существующего. Возвращает следующий свободный номер
+    seen = set()
+    missing = []
+    for r in records:
+        record_id = r.get("id")
+        if isinstance(record_id, int) and record_id not in seen:
+            seen.add(record_id)
+        else:
+            missing.append(r)
+    next_id = max(seen, default=0) + 1
+    for r in missing:
+        r["id"] = next_id
+        next_id += 1
+    return next_id
@@ -0,0 +1,127 @@
+# =============================================================
+# Отмена и повтор изменений
+# =============================================================
+# Сколько памяти (примерно, в байтах) и сколько шагов хранит история
+HISTORY_BUDGET = 16 * 1024 * 1024
+HISTORY_MAX_STEPS = 200
+
+TABLES = ("students", "books", "loans", "archive")
+
+
+def record_size(record):
+    # Грубая оценка памяти записи: строки, списки и служебные расходы словаря
+    if record is None:
+        return 0
+    size = 240
+    for value in record.values():
+        if isinstance(value, str):
+            size += 50 + 2 * len(value)
+        elif isinstance(value, dict):
+            size += record_size(value)
+        elif isinstance(value, list):
+            size += 56 + sum(record_size(v) if isinstance(v, dict) else 8 for v in value)
+        else:
+            size += 32
+    return size
+
+
+class Change:
+    # Изменение данных как разница: для каждой таблицы id -> (было, стало),
+    # где None означает отсутствие записи. Записи не изменяются на месте,
+    # поэтому "было" — ссылка на прежний объект, а не его копия.
+    # archive — записи архива выпускников (см. library/archive.py);
+    # config — (было, стало) для изменённых ключей config.json или None.
+    def __init__(self, label):
+        self.label = label
+        self.students = {}
+        self.books = {}
+        self.loans = {}
+        self.archive = {}
+        self.config = None
+
+    def record(self, table, key, before, after):
+        # Повторное изменение той же записи сохраняет исходное "было"
+        changes = getattr(self, table)
+        if key in changes:
+            before = changes[key][0]
+        changes[key] = (before, after)
+
+    def put(self, table, after, before=None):
+        self.record(table, after["id"], before, after)
+
+    def delete(self, table, before):
+        self.record(table, before["id"], before, None)
+
+    def split(self, table):
+        # (записи для сохранения, удалённые записи)
+        changes = getattr(self, table).values()
+        return ([after for _, after in changes if after is not None],
+                [before for before, after in changes if after is None and before is not None])
+
+    def __bool__(self):
+        return any(getattr(self, table) for table in TABLES) or bool(self.config)
+
+    def inverse(self):
+        change = Change(self.label)
+        for table in TABLES:
+            setattr(change, table, {key: (after, before) for key, (before, after) in getattr(self, table).items()})
+        if self.config is not None:
+            change.config = (self.config[1], self.config[0])
+        return change
+
+    def size(self):
+        total = 200
+        for table in TABLES:
+            for before, after in getattr(self, table).values():
+                total += 64 + record_size(before) + record_size(after)
+        return total
+
+
+class UndoStack:
+    # Последовательность применённых изменений. Старые шаги вытесняются,
+    # когда суммарная оценка памяти или число шагов превышают лимит
+    def __init__(self, budget=HISTORY_BUDGET, max_steps=HISTORY_MAX_STEPS):
+        self.budget = budget
+        self.max_steps = max_steps
+        self._undo = []
+        self._redo = []
+        self._size = 0
+
+    def push(self, change):
+        for _, size in self._redo:
+            self._size -= size
+        self._redo = []
+        size = change.size()
+        self._undo.append((change, size))
+        self._size += size
+        while self._undo and (self._size > self.budget or len(self._undo) > self.max_steps):
+            _, evicted = self._undo.pop(0)
+            self._size -= evicted
+
+    def can_undo(self):
+        return bool(self._undo)
+
+    def can_redo(self):
+        return bool(self._redo)
+
+    def undo_label(self):
+        return self._undo[-1][0].label if self._undo else ""
+
+    def redo_label(self):
+        return self._redo[-1][0].label if self._redo else ""
+
+    def undo(self):
+        # Возвращает изменение, которое нужно применить для отмены
+        entry = self._undo.pop()
+        self._redo.append(entry)
+        return entry[0].inverse()
+
+    def redo(self):
+        entry = self._redo.pop()
+        self._undo.append(entry)
+        return entry[0]
+
+    def clear(self):
+        self._undo = []
+        self._redo = []
+        self._size = 0
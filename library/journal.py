@@ -0,0 +1,232 @@
+import os
+import json
+import threading
+
+from library.formats import assign_ids
+from library.writer import DirectSaver, atomic_write, report_error
+
+# Размер журнала, после которого он сворачивается в снимки
+JOURNAL_COMPACT_BYTES = 256 * 1024
+
+
+# =============================================================
+# Журнал изменений: снимки таблиц + один дописываемый JSON-lines журнал
+# =============================================================
+class Journal:
+    # Таблицы — учеников ("student", students.json) и выдач ("loan",
+    # loans.json); у каждой свой снимок, а журнал общий (students.journal).
+    # Каждая строка журнала — одно изменение целиком (см. library/history.py):
+    #   {"op": "change", "put": {"student": [...], "loan": [...]},
+    #    "delete": {"student": [id, ...], "loan": [id, ...]}}
+    # Строка, оборванная сбоем, отбрасывается вся: перевод не применится
+    # наполовину, а выдачи не разойдутся со списками книг учеников.
+    # Операции идемпотентны, поэтому повторное применение сегмента,
+    # уже попавшего в снимки, не меняет результат.
+    # Читаются и строки прежнего формата — по операции на строку:
+    #   {"op": "put", "student": {...}}, {"op": "delete", "id": N}
+    # и отдельные журналы таблиц (loans.journal); они сворачиваются
+    # в снимки при первом сворачивании.
+    # Строки сериализуются сразу при изменении, а на диск попадают
+    # пачкой через saver (см. library/writer.py)
+    def __init__(self, snapshots, saver=None, compact_bytes=JOURNAL_COMPACT_BYTES):
+        # snapshots: таблица -> путь снимка; журнал лежит рядом со снимком первой
+        self.snapshots = dict(snapshots)
+        self.tables = list(self.snapshots)
+        self.saver = saver if saver is not None else DirectSaver()
+        self.journal_path = os.path.splitext(self.snapshots[self.tables[0]])[0] + ".journal"
+        self.segment_path = self.journal_path + ".1"
+        self.compact_bytes = compact_bytes
+        self._journal = None
+        self._compaction = None
+        self._buffer = []
+        self._lock = threading.Lock()
+
+    def legacy_paths(self, table):
+        # Отдельный журнал таблицы прежних версий: сегмент, затем журнал
+        if table == self.tables[0]:
+            return []
+        path = os.path.splitext(self.snapshots[table])[0] + ".journal"
+        return [path + ".1", path]
+
+    def read(self):
+        # Снимки с применёнными журналами; ошибка чтения пробрасывается.
+        # Возвращает ({таблица: {id: запись}}, таблицы с новыми номерами)
+        tables, migrated = self._read_snapshots()
+        for path in (self.segment_path, self.journal_path):
+            self._replay(path, tables, self.tables[0])
+        return tables, migrated
+
+    def load(self, read_only=False):
+        # -> {таблица: [записи]}. read_only — номера, выданные записям старого
+        # формата, остаются только в памяти, журналы не сворачиваются
+        self.wait()
+        try:
+            tables, migrated = self.read()
+        except Exception as e:
+            print(f"Ошибка загрузки {os.path.basename(self.journal_path)}:", e)
+            return {table: [] for table in self.tables}
+        if not read_only:
+            for table in migrated:
+                # Снимок старого формата: номера сразу записываются в него,
+                # иначе они зависели бы от порядка записей в файле
+                path = self.snapshots[table]
+                try:
+                    atomic_write(path, json.dumps(list(tables[table].values()), ensure_ascii=False, indent=4))
+                except Exception as e:
+                    print(f"Ошибка сохранения {os.path.basename(path)}:", e)
+            if os.path.exists(self.segment_path) or self._has_legacy():
+                # Прерванное сворачивание или журналы прежнего формата
+                self._start_compaction()
+        return {table: list(records.values()) for table, records in tables.items()}
+
+    def append(self, put=None, delete=None):
+        # put и delete: {таблица: [записи]}; всё уходит одной строкой
+        put = {table: list(records) for table, records in (put or {}).items() if records}
+        delete = {table: [record.get("id") for record in records]
+                  for table, records in (delete or {}).items() if records}
+        if not put and not delete:
+            return
+        data = json.dumps({"op": "change", "put": put, "delete": delete}, ensure_ascii=False) + "\n"
+        with self._lock:
+            self._buffer.append(data)
+        self.saver.schedule(("journal", self.journal_path), self._write_buffer,
+                            os.path.basename(self.journal_path), keep_order=True)
+
+    def _write_buffer(self):
+        with self._lock:
+            data = "".join(self._buffer)
+            self._buffer = []
+        if not data:
+            return
+        try:
+            if self._journal is None:
+                self._journal = self._open_journal()
+            self._journal.write(data)
+            self._journal.flush()
+            os.fsync(self._journal.fileno())
+        except Exception:
+            # Несохранённые строки вернутся в буфер и уйдут со следующей записью
+            with self._lock:
+                self._buffer.insert(0, data)
+            if self._journal is not None:
+                self._journal.close()
+                self._journal = None
+            raise
+        if self._journal.tell() >= self.compact_bytes:
+            self.compact()
+
+    def _open_journal(self):
+        if os.path.exists(self.journal_path) and os.path.getsize(self.journal_path) > 0:
+            # Хвост, оборванный сбоем, отделяется от новых записей
+            with open(self.journal_path, "rb+") as f:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    f.write(b"\n")
+        return open(self.journal_path, "a", encoding="utf-8")
+
+    def compact(self):
+        # Текущий журнал откладывается в сегмент и сворачивается в фоне,
+        # новые записи сразу идут в свежий журнал
+        if self._compaction is not None and self._compaction.is_alive():
+            return
+        if os.path.exists(self.segment_path):
+            self._start_compaction()
+            return
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+        if not os.path.exists(self.journal_path):
+            return
+        os.replace(self.journal_path, self.segment_path)
+        self._start_compaction()
+
+    def _start_compaction(self):
+        self._compaction = threading.Thread(target=self._fold_segment, daemon=True)
+        self._compaction.start()
+
+    def _fold_segment(self):
+        try:
+            tables, _ = self._read_snapshots()
+            self._replay(self.segment_path, tables, self.tables[0])
+            for table, path in self.snapshots.items():
+                atomic_write(path, json.dumps(list(tables[table].values()), ensure_ascii=False, indent=4))
+            # Журналы прежнего формата старше сегмента и удаляются раньше него:
+            # после сбоя между удалениями сегмент просто применится ещё раз
+            for table in self.tables:
+                for path in self.legacy_paths(table):
+                    if os.path.exists(path):
+                        os.remove(path)
+            if os.path.exists(self.segment_path):
+                os.remove(self.segment_path)
+        except Exception as e:
+            report_error(self.saver.on_error, os.path.basename(self.journal_path), e)
+
+    def _has_legacy(self):
+        return any(os.path.exists(path) for table in self.tables for path in self.legacy_paths(table))
+
+    def wait(self):
+        if self._compaction is not None:
+            self._compaction.join()
+            self._compaction = None
+
+    def close(self):
+        self.saver.flush()
+        self.wait()
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+
+    def _read_snapshots(self):
+        # Снимки с журналами прежнего формата (но без общего журнала)
+        tables = {}
+        migrated = []
+        for table, path in self.snapshots.items():
+            tables[table], table_migrated = self._read_snapshot(path)
+            if table_migrated:
+                migrated.append(table)
+            for legacy_path in self.legacy_paths(table):
+                self._replay(legacy_path, tables, table)
+        return tables, migrated
+
+    @staticmethod
+    def _read_snapshot(path):
+        # Ошибка чтения пробрасывается: сворачивать журнал поверх
+        # нечитаемого снимка нельзя, иначе потеряются данные.
+        # Возвращает (записи по id, были ли выданы новые номера)
+        records = []
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                records = json.load(f)
+        ids = [record.get("id") for record in records]
+        assign_ids(records)
+        migrated = any(record["id"] != record_id for record, record_id in zip(records, ids))
+        return {record["id"]: record for record in records}, migrated
+
+    @staticmethod
+    def _replay(path, tables, default_table):
+        # default_table — таблица строк прежнего формата {"op": "delete", "id": N}
+        if not os.path.exists(path):
+            return
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # Недописанная при сбое строка (изменение целиком) пропускается
+                    continue
+                op = entry.get("op")
+                if op == "change":
+                    for table, records in entry.get("put", {}).items():
+                        target = tables.setdefault(table, {})
+                        for record in records:
+                            target[record["id"]] = record
+                    for table, ids in entry.get("delete", {}).items():
+                        target = tables.setdefault(table, {})
+                        for record_id in ids:
+                            target.pop(record_id, None)
+                elif op == "put":
+                    for table, target in tables.items():
+                        if table in entry:
+                            target[entry[table]["id"]] = entry[table]
+                elif op == "delete":
+                    tables[default_table].pop(entry.get("id"), None)
@@ -0,0 +1,160 @@
+import bisect
+from collections import Counter
+from datetime import date, timedelta
+
+# Срок выдачи по умолчанию, дней (в config.json — "loan_days")
+DEFAULT_LOAN_DAYS = 14
+
+
+def today_iso():
+    return date.today().isoformat()
+
+
+def add_days(day, days):
+    return (date.fromisoformat(day) + timedelta(days=days)).isoformat()
+
+
+def week_bounds(day):
+    # Понедельник и воскресенье недели, в которую попадает day
+    monday = date.fromisoformat(day) - timedelta(days=date.fromisoformat(day).weekday())
+    return monday.isoformat(), (monday + timedelta(days=6)).isoformat()
+
+
+# =============================================================
+# Журнал выдач: когда книга выдана, до какого числа и когда возвращена
+# =============================================================
+class LoanLedger:
+    # Выдача — словарь:
+    #   {"id", "student_id", "book" (id книги или строка),
+    #    "issued", "due", "returned" (None, пока книга на руках)}
+    # Даты хранятся строками ГГГГ-ММ-ДД и сравниваются как строки.
+    # Индексы: ученик -> id его выдач и отсортированный список
+    # (срок, id) невозвращённых выдач для запросов по диапазону сроков.
+    # Список "books" ученика остаётся тем, что у него на руках сейчас;
+    # sync_student приводит журнал в соответствие с ним.
+    # Записи выдач не изменяются на месте, чтобы прежние версии
+    # можно было хранить для отмены (см. library/history.py).
+    def __init__(self, loan_days=DEFAULT_LOAN_DAYS):
+        self.loan_days = loan_days
+        self.loans = {}
+        self._by_student = {}
+        self._open_by_due = []
+        self._next_id = 1
+
+    def __len__(self):
+        return len(self.loans)
+
+    def load(self, loans):
+        self.loans.clear()
+        self._by_student = {}
+        open_by_due = []
+        for loan in loans:
+            self.loans[loan["id"]] = loan
+            self._by_student.setdefault(loan["student_id"], set()).add(loan["id"])
+            if loan.get("returned") is None:
+                open_by_due.append((loan["due"], loan["id"]))
+        open_by_due.sort()
+        self._open_by_due = open_by_due
+        self._next_id = max(self.loans, default=0) + 1
+
+    def _index(self, loan):
+        self.loans[loan["id"]] = loan
+        self._by_student.setdefault(loan["student_id"], set()).add(loan["id"])
+        if loan.get("returned") is None:
+            bisect.insort(self._open_by_due, (loan["due"], loan["id"]))
+
+    def _unindex(self, loan):
+        self.loans.pop(loan["id"], None)
+        ids = self._by_student.get(loan["student_id"])
+        if ids is not None:
+            ids.discard(loan["id"])
+            if not ids:
+                del self._by_student[loan["student_id"]]
+        if loan.get("returned") is None:
+            entry = (loan["due"], loan["id"])
+            i = bisect.bisect_left(self._open_by_due, entry)
+            if i < len(self._open_by_due) and self._open_by_due[i] == entry:
+                del self._open_by_due[i]
+
+    def issue(self, student_id, book, day=None):
+        # Новая выдача; в журнал её добавляет apply
+        day = day or today_iso()
+        loan = {"id": self._next_id, "student_id": student_id, "book": book,
+                "issued": day, "due": add_days(day, self.loan_days), "returned": None}
+        self._next_id += 1
+        return loan
+
+    def close(self, loan, day=None):
+        # Выдачи не изменяются на месте: возврат — это новая запись
+        return dict(loan, returned=day or today_iso())
+
+    def apply(self, changes):
+        # changes: пары (было, стало), None — выдачи нет. Так же применяются
+        # и отменённые изменения, поэтому "стало" может быть и старой выдачей
+        for before, after in changes:
+            if before is not None:
+                self._unindex(before)
+            if after is not None:
+                self._index(after)
+                self._next_id = max(self._next_id, after["id"] + 1)
+
+    def diff_student(self, student, day=None):
+        # Новые книги в списке ученика выдаются, пропавшие — отмечаются
+        # возвращёнными. Возвращает пары (было, стало), журнал не меняется
+        wanted = Counter(student.get("books", []))
+        changes = []
+        for loan in self.open_loans(student["id"]):
+            if wanted[loan["book"]] > 0:
+                wanted[loan["book"]] -= 1
+            else:
+                changes.append((loan, self.close(loan, day)))
+        for entry in student.get("books", []):
+            if wanted[entry] > 0:
+                wanted[entry] -= 1
+                changes.append((None, self.issue(student["id"], entry, day)))
+        return changes
+
+    def sync_student(self, student, day=None):
+        # То же, что diff_student, но сразу с применением.
+        # Возвращает изменённые выдачи для сохранения
+        changes = self.diff_student(student, day)
+        self.apply(changes)
+        return [after for _, after in changes]
+
+    def remove_student(self, student_id):
+        # Выдачи удалённого ученика удаляются вместе с ним
+        removed = self.student_loans(student_id)
+        for loan in removed:
+            self._unindex(loan)
+        return removed
+
+    # ---------------------------------------------------------
+    # Запросы
+    # ---------------------------------------------------------
+    def student_loans(self, student_id):
+        return sorted((self.loans[key] for key in self._by_student.get(student_id, ())),
+                      key=lambda loan: loan["id"])
+
+    def open_loans(self, student_id):
+        return [loan for loan in self.student_loans(student_id) if loan.get("returned") is None]
+
+    def due_between(self, start=None, end=None, student_ids=None):
+        # Невозвращённые выдачи со сроком в [start, end] (None — без границы),
+        # по возрастанию срока. student_ids ограничивает выборку учениками
+        lo = bisect.bisect_left(self._open_by_due, (start,)) if start else 0
+        hi = bisect.bisect_right(self._open_by_due, (end, float("inf"))) if end else len(self._open_by_due)
+        if student_ids is not None:
+            candidates = [self.loans[key] for sid in student_ids for key in self._by_student.get(sid, ())]
+            if len(candidates) < hi - lo:
+                # Выдач у выбранных учеников меньше, чем в диапазоне сроков
+                return sorted((loan for loan in candidates if loan.get("returned") is None
+                               and (not start or loan["due"] >= start) and (not end or loan["due"] <= end)),
+                              key=lambda loan: (loan["due"], loan["id"]))
+        loans = [self.loans[key] for _, key in self._open_by_due[lo:hi]]
+        if student_ids is not None:
+            loans = [loan for loan in loans if loan["student_id"] in student_ids]
+        return loans
+
+    def overdue(self, day=None, student_ids=None):
+        # Срок истёк до указанного дня (по умолчанию — сегодня)
+        return self.due_between(None, add_days(day or today_iso(), -1), student_ids)
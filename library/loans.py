@@ -0,0 +1,94 @@
+from library.formats import book_display
+
+
+# =============================================================
+# Выданные книги: в "books" ученика лежат id книг каталога.
+# Строкой остаётся только то, чего в каталоге нет (введено вручную).
+# Каждая запись каталога — отдельный экземпляр, и у одного названия
+# их может быть много: строка названия превращается в id свободного
+# экземпляра, а не всегда первого.
+# =============================================================
+def book_copies(books):
+    # "Название - Автор" -> id экземпляров в порядке каталога
+    copies = {}
+    for b in books:
+        copies.setdefault(book_display(b), []).append(b["id"])
+    return copies
+
+
+def resolve_copies(entries, copies, is_taken, own=None):
+    # Строки из каталога заменяются id экземпляров: сначала тех, что уже
+    # у ученика (own: строка -> его id), затем первого свободного
+    # (is_taken(id) — выдан ли). Если свободных нет, берётся первый
+    own = {text: list(ids) for text, ids in (own or {}).items()}
+    chosen = set()
+    resolved = []
+    for entry in entries:
+        ids = copies.get(entry) if isinstance(entry, str) else None
+        if not ids:
+            resolved.append(entry)
+            continue
+        if own.get(entry):
+            book_id = own[entry].pop(0)
+        else:
+            book_id = next((i for i in ids if i not in chosen and not is_taken(i)), ids[0])
+        chosen.add(book_id)
+        resolved.append(book_id)
+    return resolved
+
+
+def resolve_loans(students, books):
+    # Строки "Название - Автор", совпадающие с книгой каталога, заменяются id
+    # свободных экземпляров. Возвращает изменённых учеников, чтобы сохранить только их
+    copies = book_copies(books)
+    taken = {entry for st in students for entry in st.get("books", []) if isinstance(entry, int)}
+    changed = []
+    for st in students:
+        loans = st.get("books", [])
+        if not any(isinstance(entry, str) and entry in copies for entry in loans):
+            continue
+        st["books"] = resolve_copies(loans, copies, taken.__contains__)
+        taken.update(entry for entry in st["books"] if isinstance(entry, int))
+        changed.append(st)
+    return changed
+
+
+class LoansIndex:
+    # Обратный индекс: id книги -> id учеников, у которых она на руках.
+    # Как и в ReadersIndex, запоминается, с какими книгами ученик был
+    # проиндексирован, поэтому изменённую запись можно переиндексировать.
+    def __init__(self):
+        self._holders = {}
+        self._loans = {}
+
+    def load(self, students):
+        self._holders = {}
+        self._loans = {}
+        for st in students:
+            self.add(st)
+
+    def add(self, student):
+        key = student["id"]
+        self._unindex(key)
+        book_ids = {entry for entry in student.get("books", []) if isinstance(entry, int)}
+        if not book_ids:
+            return
+        self._loans[key] = book_ids
+        for book_id in book_ids:
+            self._holders.setdefault(book_id, set()).add(key)
+
+    def remove(self, student):
+        self._unindex(student["id"])
+
+    def _unindex(self, key):
+        for book_id in self._loans.pop(key, ()):
+            holders = self._holders[book_id]
+            holders.discard(key)
+            if not holders:
+                del self._holders[book_id]
+
+    def holders(self, book_id):
+        return set(self._holders.get(book_id, ()))
+
+    def count(self, book_id):
+        return len(self._holders.get(book_id, ()))
@@ -0,0 +1,50 @@
+import os
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+    import msvcrt
+
+
+# =============================================================
+# Блокировка папки с данными: писать в неё может только одна копия
+# программы (окно или консольная команда), иначе номера записей и
+# литература.txt, переписываемый целиком, затирают чужие изменения.
+# Блокировка снимается системой и при аварийном завершении процесса.
+# =============================================================
+class DataLockedError(RuntimeError):
+    pass
+
+
+class DataLock:
+    def __init__(self, path):
+        self.path = path
+        self._file = None
+
+    def acquire(self):
+        # Не ждёт: если папка занята, сразу DataLockedError
+        f = open(self.path, "a+")
+        try:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+        except OSError:
+            f.close()
+            raise DataLockedError(
+                f"Данные в папке {os.path.dirname(os.path.abspath(self.path))} уже открыты "
+                f"другой копией программы (окном или консольной командой)")
+        self._file = f
+
+    def release(self):
+        if self._file is None:
+            return
+        if fcntl is not None:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+        else:
+            self._file.seek(0)
+            msvcrt.locking(self._file.fileno(), msvcrt.LK_UNLCK, 1)
+        self._file.close()
+        self._file = None
@@ -0,0 +1,202 @@
+import os
+import json
+import time
+import platform
+import threading
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+from functools import wraps
+
+# =============================================================
+# Замеры горячих мест (по умолчанию выключены).
+# Включение: переменная окружения LIBRARY_PROFILE=1 или ключ
+# "profiling": true в config.json; значение "time" — только время,
+# без подсчёта памяти (tracemalloc заметно замедляет программу).
+#   with profiler.measure("books.search"): ...
+#   @profiler.timed("core.load")
+# Выключенный профилировщик стоит одну проверку флага.
+# =============================================================
+ENV_VAR = "LIBRARY_PROFILE"
+
+# Верхние границы корзин гистограммы, мс; последняя корзина — всё, что дольше
+BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+
+_NULL = nullcontext()
+
+
+def parse_mode(value):
+    # -> (включено, считать память)
+    if isinstance(value, bool):
+        return value, value
+    value = str(value or "").strip().lower()
+    if value in ("", "0", "false", "no", "off"):
+        return False, False
+    return True, value != "time"
+
+
+class OperationStats:
+    def __init__(self, name):
+        self.name = name
+        self.count = 0
+        self.total_ms = 0.0
+        self.min_ms = None
+        self.max_ms = 0.0
+        self.buckets = [0] * (len(BUCKETS_MS) + 1)
+        # Прирост памяти за вызов (суммарно) и наибольший пик внутри вызова, байты
+        self.allocated = 0
+        self.peak = 0
+
+    def add(self, ms, allocated=0, peak=0):
+        self.count += 1
+        self.total_ms += ms
+        self.min_ms = ms if self.min_ms is None else min(self.min_ms, ms)
+        self.max_ms = max(self.max_ms, ms)
+        i = 0
+        while i < len(BUCKETS_MS) and ms > BUCKETS_MS[i]:
+            i += 1
+        self.buckets[i] += 1
+        self.allocated += allocated
+        self.peak = max(self.peak, peak)
+
+    def mean_ms(self):
+        return self.total_ms / self.count if self.count else 0.0
+
+    def percentile(self, q):
+        # Оценка по гистограмме: верхняя граница корзины, но не больше максимума
+        rank = q * self.count
+        seen = 0
+        for bound, n in zip(BUCKETS_MS + (None,), self.buckets):
+            seen += n
+            if n and seen >= rank:
+                return self.max_ms if bound is None else min(bound, self.max_ms)
+        return 0.0
+
+    def histogram(self):
+        labels = [f"<={bound}ms" for bound in BUCKETS_MS] + [f">{BUCKETS_MS[-1]}ms"]
+        return dict(zip(labels, self.buckets))
+
+    def to_dict(self):
+        return {
+            "operation": self.name, "count": self.count,
+            "total_ms": round(self.total_ms, 3), "mean_ms": round(self.mean_ms(), 3),
+            "min_ms": round(self.min_ms or 0.0, 3), "max_ms": round(self.max_ms, 3),
+            "p50_ms": round(self.percentile(0.5), 3), "p95_ms": round(self.percentile(0.95), 3),
+            "allocated_bytes": self.allocated, "peak_bytes": self.peak,
+            "histogram": self.histogram(),
+        }
+
+
+class Profiler:
+    def __init__(self):
+        self.enabled = False
+        self.trace_memory = False
+        self.started = None
+        self.operations = {}
+        self._lock = threading.Lock()
+        # Глубина вложенных замеров в каждом потоке: пик памяти
+        # сбрасывается только во внешнем замере
+        self._local = threading.local()
+        # tracemalloc считает память всего процесса, а reset_peak()
+        # сбрасывает общий пик, поэтому память замеряется только в
+        # главном потоке (окно); фоновая запись замеряет лишь время
+        self._memory_thread = threading.main_thread()
+        self._own_tracing = False
+
+    def configure(self, value):
+        # Только включает: выключить можно явно через disable()
+        enabled, memory = parse_mode(value)
+        if enabled:
+            self.enable(memory)
+
+    def enable(self, trace_memory=True):
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._own_tracing = True
+        self.trace_memory = trace_memory and tracemalloc.is_tracing()
+        if self.started is None:
+            self.started = datetime.now().isoformat(timespec="seconds")
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+        self.trace_memory = False
+        if self._own_tracing:
+            tracemalloc.stop()
+            self._own_tracing = False
+
+    def reset(self):
+        with self._lock:
+            self.operations = {}
+            self.started = datetime.now().isoformat(timespec="seconds") if self.enabled else None
+
+    def measure(self, name):
+        return self._measure(name) if self.enabled else _NULL
+
+    def timed(self, name):
+        def decorator(func):
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                with self._measure(name):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    @contextmanager
+    def _measure(self, name):
+        depth = getattr(self._local, "depth", 0)
+        memory = (self.trace_memory and threading.current_thread() is self._memory_thread
+                  and tracemalloc.is_tracing())
+        if memory:
+            if depth == 0:
+                tracemalloc.reset_peak()
+            mem_start = tracemalloc.get_traced_memory()[0]
+        self._local.depth = depth + 1
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            ms = (time.perf_counter() - start) * 1000
+            self._local.depth = depth
+            allocated = peak = 0
+            if memory and tracemalloc.is_tracing():
+                current, top = tracemalloc.get_traced_memory()
+                allocated = current - mem_start
+                peak = top - mem_start if depth == 0 else 0
+            self._add(name, ms, allocated, peak)
+
+    def record(self, name, ms):
+        # Длительность, измеренная снаружи (например, остановка окна)
+        if self.enabled:
+            self._add(name, ms)
+
+    def _add(self, name, ms, allocated=0, peak=0):
+        with self._lock:
+            stats = self.operations.get(name)
+            if stats is None:
+                stats = self.operations[name] = OperationStats(name)
+            stats.add(ms, allocated, peak)
+
+    def snapshot(self):
+        # Копии записей, самые затратные (по суммарному времени) — первыми
+        with self._lock:
+            records = [stats.to_dict() for stats in self.operations.values()]
+        return sorted(records, key=lambda r: r["total_ms"], reverse=True)
+
+    def export_jsonl(self, path):
+        # Одна строка JSON на операцию; сведения о сеансе повторяются в каждой строке
+        session = {"session_started": self.started, "exported": datetime.now().isoformat(timespec="seconds"),
+                   "memory_traced": self.trace_memory, "python": platform.python_version(),
+                   "platform": platform.platform()}
+        records = self.snapshot()
+        with open(path, "w", encoding="utf-8") as f:
+            for record in records:
+                f.write(json.dumps(dict(session, **record), ensure_ascii=False) + "\n")
+        return len(records)
+
+
+# Один профилировщик на процесс
+profiler = Profiler()
+profiler.configure(os.environ.get(ENV_VAR))
@@ -0,0 +1,94 @@
+import time
+from itertools import islice
+
+from library.profiling import profiler
+
+# =============================================================
+# Долгая работа порциями между событиями окна. Размер порции
+# подбирается по времени предыдущих так, чтобы одна порция
+# укладывалась в бюджет кадра: на быстрой машине порции крупнее,
+# на медленной — мельче, и окно успевает обработать ввод.
+# Планировщик не зависит от Qt: окно передаёт call_later,
+# например lambda fn: QTimer.singleShot(0, fn).
+# =============================================================
+FRAME_BUDGET_MS = 8
+
+
+class ChunkSizer:
+    def __init__(self, budget_ms=FRAME_BUDGET_MS, initial=16, limit=100000):
+        self.budget_ms = budget_ms
+        self.size = initial
+        self.limit = limit
+        # Сглаженное время на один элемент, мс
+        self.per_item_ms = None
+
+    def update(self, count, elapsed_ms):
+        if count <= 0:
+            return
+        cost = elapsed_ms / count
+        self.per_item_ms = cost if self.per_item_ms is None else (self.per_item_ms + cost) / 2
+        target = int(self.budget_ms / self.per_item_ms) if self.per_item_ms > 0 else self.limit
+        # Рост не больше чем вдвое за шаг: одна дешёвая порция не раздувает следующую
+        self.size = max(1, min(target, self.size * 2, self.limit))
+
+
+class ProgressiveScheduler:
+    # start(key, items, step): step(item) для каждого элемента, порциями.
+    # Одна задача на ключ: новый start с тем же ключом (или cancel)
+    # меняет поколение, и порции прежней задачи больше не выполняются.
+    # on_chunk() — после каждой порции (например, показать найденное),
+    # on_done() — после последней. Ошибка в step завершает задачу:
+    # вызывается on_error(ошибка), а без него ошибка печатается и
+    # вызывается on_done().
+    def __init__(self, call_later, budget_ms=FRAME_BUDGET_MS):
+        self.call_later = call_later
+        self.budget_ms = budget_ms
+        self._generations = {}
+        self._active = set()
+
+    def start(self, key, items, step, on_chunk=None, on_done=None, on_error=None):
+        generation = self._generations.get(key, 0) + 1
+        self._generations[key] = generation
+        self._active.add(key)
+        sizer = ChunkSizer(self.budget_ms)
+        iterator = iter(items)
+
+        def run_chunk():
+            if self._generations.get(key) != generation:
+                return
+            size = sizer.size
+            start = time.perf_counter()
+            count = 0
+            try:
+                for item in islice(iterator, size):
+                    step(item)
+                    count += 1
+            except Exception as e:
+                self._active.discard(key)
+                if on_error is not None:
+                    on_error(e)
+                    return
+                print(f"Ошибка задачи {key}:", e)
+                if on_done is not None:
+                    on_done()
+                return
+            if on_chunk is not None:
+                on_chunk()
+            # Показ результатов порции тоже входит в её время
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            sizer.update(count, elapsed_ms)
+            profiler.record(f"chunk.{key}", elapsed_ms)
+            if count < size:
+                self._active.discard(key)
+                if on_done is not None:
+                    on_done()
+            else:
+                self.call_later(run_chunk)
+
+        self.call_later(run_chunk)
+        return generation
+
+    def cancel(self, key):
+        if key in self._active:
+            self._generations[key] += 1
+            self._active.discard(key)
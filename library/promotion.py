@@ -0,0 +1,75 @@
+# =============================================================
+# Перевод учеников в следующий класс в конце учебного года.
+# Сначала строится план (что с кем произойдёт), записи не меняются;
+# применяет план вызывающий код, одним пакетом.
+# =============================================================
+PROMOTE = "promote"
+GRADUATE = "graduate"
+KEEP = "keep"
+
+ACTION_NAMES = {PROMOTE: "Перевести", GRADUATE: "Выпустить", KEEP: "Оставить"}
+
+
+def next_class(cls):
+    return str(int(cls) + 1)
+
+
+def ambiguous_classes(last_class):
+    # Из 9 класса ученики могут как перейти в 10, так и уйти из школы,
+    # последний класс выпускается
+    return {"9", last_class}
+
+
+def default_rules(last_class):
+    rules = {"9": PROMOTE}
+    rules[last_class] = GRADUATE
+    return rules
+
+
+class PromotionPlan:
+    # moves     — (id ученика, класс сейчас, класс после перевода)
+    # graduates — id выпускаемых (удаляемых) учеников
+    # kept      — id учеников, остающихся в своём классе
+    def __init__(self):
+        self.moves = []
+        self.graduates = []
+        self.kept = []
+
+    def __len__(self):
+        return len(self.moves) + len(self.graduates)
+
+
+def plan_promotion(groups, last_class, rules=None, overrides=None):
+    # groups: (класс, параллель) -> id учеников, например ReadersIndex.class_groups().
+    # rules: класс -> действие для всех его учеников (по умолчанию default_rules);
+    # overrides: id ученика -> действие, исключение из правила класса.
+    # Ученики с нечисловым классом не затрагиваются.
+    rules = dict(default_rules(last_class), **(rules or {}))
+    overrides = overrides or {}
+    plan = PromotionPlan()
+    for (cls, _), ids in groups.items():
+        if not cls.isdigit():
+            continue
+        rule = rules.get(cls, PROMOTE)
+        for student_id in ids:
+            action = overrides.get(student_id, rule)
+            if action == PROMOTE and cls == last_class:
+                action = KEEP
+            if action == PROMOTE:
+                plan.moves.append((student_id, cls, next_class(cls)))
+            elif action == GRADUATE:
+                plan.graduates.append(student_id)
+            else:
+                plan.kept.append(student_id)
+    plan.moves.sort()
+    plan.graduates.sort()
+    plan.kept.sort()
+    return plan
+
+
+def apply_plan(plan, students):
+    # students: id -> ученик. Возвращает (новые записи переведённых, выпускаемые).
+    # Исходные записи не меняются, поэтому их можно вернуть при отмене
+    updated = [dict(students[student_id], **{"class": new_cls}) for student_id, _, new_cls in plan.moves]
+    removed = [students[student_id] for student_id in plan.graduates]
+    return updated, removed
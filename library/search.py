@@ -0,0 +1,341 @@
+import bisect
+import threading
+from array import array
+from itertools import islice
+
+# Каталоги меньше этого размера индексируются сразу, большие — в фоновом потоке
+BACKGROUND_BUILD_MIN = 20000
+# Как часто фоновое построение проверяет, не устарело ли оно
+CANCEL_CHECK_EVERY = 4096
+# Пересечение списков прекращается, когда кандидатов остаётся столько,
+# что проверить их подстрокой дешевле
+VERIFY_LIMIT = 256
+# Во сколько раз кандидат из списков вхождений обходится дороже записи,
+# проверяемой перебором (выборка по id вразброс, сортировка)
+CANDIDATE_COST = 8
+
+
+def normalize(text):
+    return text.lower().replace("ё", "е")
+
+
+def trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def _post(postings, key, text):
+    # Текст короче трёх символов сам служит ключом: так его находит
+    # поиск коротких запросов (см. TrigramIndex._short_candidates)
+    get = postings.get
+    for gram in trigrams(text) or (text,):
+        posting = get(gram)
+        if posting is None:
+            posting = postings[gram] = array("i")
+        posting.append(key)
+
+
+# =============================================================
+# Триграммный индекс для поиска подстроки по нескольким полям
+# =============================================================
+class TrigramIndex:
+    # Ключ — целочисленный id записи, item — сама запись. Поля
+    # нормализуются и склеиваются через "\n", так что совпадение
+    # не может начаться в одном поле и закончиться в другом.
+    # Списки вхождений только дополняются: удалённые и изменённые
+    # записи отсеиваются проверкой, а при накоплении мусора индекс
+    # перестраивается.
+    # Каждое построение получает номер поколения; load() начинает новое
+    # поколение, и построение по прежним данным бросает работу, а его
+    # результат не устанавливается.
+    def __init__(self):
+        self._docs = {}
+        self._postings = None
+        # Запрос из 1–2 символов -> (число ключей, триграммы с этой подстрокой)
+        self._short_grams = {}
+        self._pending = []
+        self._stale = 0
+        self._building = False
+        self._generation = 0
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._docs)
+
+    def load(self, entries):
+        # entries: итерируемое из (key, item, (поле, поле, ...))
+        docs = {key: ("\n".join(map(normalize, fields)), item) for key, item, fields in entries}
+        with self._lock:
+            self._docs = docs
+            self._postings = None
+            self._short_grams = {}
+            self._pending = []
+            self._generation += 1
+            self._building = False
+        self.rebuild()
+
+    def add(self, key, item, *fields):
+        text = "\n".join(map(normalize, fields))
+        with self._lock:
+            if key in self._docs:
+                self._stale += 1
+            self._docs[key] = (text, item)
+            if self._postings is not None:
+                _post(self._postings, key, text)
+            if self._building:
+                self._pending.append(key)
+
+    def remove(self, key):
+        if self._docs.pop(key, None) is None:
+            return
+        self._stale += 1
+        if self._stale > max(len(self._docs), BACKGROUND_BUILD_MIN) // 2:
+            self.rebuild()
+
+    def rebuild(self):
+        with self._lock:
+            if self._building:
+                return
+            self._building = True
+            self._stale = 0
+            generation = self._generation
+        snapshot = [(key, text) for key, (text, _) in self._docs.items()]
+        if len(snapshot) < BACKGROUND_BUILD_MIN:
+            self._build(snapshot, generation)
+        else:
+            # Пока индекс строится, поиск идёт прежним индексом или перебором
+            self._thread = threading.Thread(target=self._build, args=(snapshot, generation), daemon=True)
+            self._thread.start()
+
+    def wait(self):
+        # Дождаться фонового построения (для замеров и консольных утилит)
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _build(self, snapshot, generation):
+        postings = {}
+        for i, (key, text) in enumerate(snapshot):
+            if i % CANCEL_CHECK_EVERY == 0 and generation != self._generation:
+                return
+            _post(postings, key, text)
+        with self._lock:
+            if generation != self._generation:
+                # Данные заменены во время построения: индекс строит новое поколение
+                return
+            for key in self._pending:
+                doc = self._docs.get(key)
+                if doc is not None:
+                    _post(postings, key, doc[0])
+            self._pending = []
+            self._postings = postings
+            self._short_grams = {}
+            self._building = False
+
+    def search(self, query, limit=None):
+        # limit — вернуть только первые limit совпадений (для подсказок)
+        return list(islice(self._matches(normalize(query), limit), limit))
+
+    def _matches(self, query, limit=None):
+        if not query:
+            return (item for _, item in self._docs.values())
+        with self._lock:
+            postings = self._postings
+        candidates = None
+        if postings is not None and len(query) < 3:
+            candidates = self._short_candidates(postings, query, limit)
+        elif postings is not None:
+            candidates = self._candidates(postings, query)
+        if candidates is None:
+            return (item for text, item in self._docs.values() if query in text)
+        docs = self._docs
+        return (doc[1] for doc in map(docs.get, sorted(candidates))
+                if doc is not None and query in doc[0])
+
+    @staticmethod
+    def _candidates(postings, query):
+        lists = sorted((postings.get(gram, ()) for gram in trigrams(query)), key=len)
+        if not lists[0]:
+            return set()
+        candidates = set(lists[0])
+        for posting in lists[1:]:
+            if len(candidates) <= VERIFY_LIMIT:
+                break
+            candidates.intersection_update(posting)
+        return candidates
+
+    def _short_candidates(self, postings, query, limit):
+        # Подстрока из 1–2 символов текста длиной от трёх символов целиком
+        # лежит в одной из его триграмм, поэтому кандидаты — объединение
+        # списков триграмм, содержащих запрос. Частый запрос дешевле найти
+        # перебором: с limit он останавливается на первых совпадениях.
+        # None — искать перебором
+        cached = self._short_grams.get(query)
+        if cached is None or cached[0] != len(postings):
+            # Ключи только добавляются: пока их число то же, список верен
+            cached = self._short_grams[query] = (len(postings), [gram for gram in postings if query in gram])
+        lists = [postings[gram] for gram in cached[1]]
+        total = sum(map(len, lists))
+        scan = len(self._docs)
+        if limit is not None:
+            scan = min(scan, limit * scan // max(total, 1))
+        if total * CANDIDATE_COST > scan:
+            return None
+        candidates = set()
+        for posting in lists:
+            candidates.update(posting)
+        return candidates
+
+
+# =============================================================
+# Индекс учеников: корзины по (класс, параллель) и поиск по ФИО
+# =============================================================
+NAME_FIELDS = ("last_name", "first_name", "middle_name")
+
+
+class ReadersIndex:
+    # Поиск по ФИО ищет подстроку в фамилии, имени или отчестве.
+    # Для этого в отсортированном массиве лежат все суффиксы
+    # нормализованных имён: подстрока имени — это префикс одного
+    # из суффиксов, и он находится двоичным поиском.
+    # Как и в TrigramIndex, массив только дополняется: суффиксы новых
+    # имён копятся в _added и сортируются вместе с массивом при
+    # следующем поиске по ФИО (одна сортировка на пачку изменений),
+    # а суффиксы удалённых и изменённых имён отсеиваются проверкой,
+    # пока их не накопится столько, что массив дешевле собрать заново.
+    # Если имя не изменилось (перевод в другой класс), суффиксы не трогаются.
+    # Результат упорядочен по id, т.е. по порядку добавления учеников.
+    def __init__(self):
+        self._students = {}
+        self._keys = {}
+        self._buckets = {}
+        self._suffixes = []
+        self._added = []
+        self._stale = 0
+        self._reorder = False
+
+    def __len__(self):
+        return len(self._students)
+
+    @staticmethod
+    def _index_key(student):
+        names = tuple(normalize(student.get(field, "")) for field in NAME_FIELDS)
+        return student.get("class", ""), student.get("parallel", ""), names
+
+    @staticmethod
+    def _name_suffixes(key, names):
+        return {(name[i:], key) for name in names for i in range(len(name))}
+
+    def load(self, students):
+        self._students = {}
+        self._keys = {}
+        self._buckets = {}
+        suffixes = []
+        for st in students:
+            cls, par, names = self._keys[st["id"]] = self._index_key(st)
+            self._students[st["id"]] = st
+            self._buckets.setdefault((cls, par), set()).add(st["id"])
+            suffixes.extend(self._name_suffixes(st["id"], names))
+        suffixes.sort()
+        self._suffixes = suffixes
+        self._added = []
+        self._stale = 0
+        self._reorder = False
+
+    def add(self, student):
+        key = student["id"]
+        cls, par, names = indexed = self._index_key(student)
+        previous = self._keys.get(key)
+        if previous is not None and previous[2] == names:
+            self._unbucket(key, previous)
+        else:
+            self._unindex(key)
+            self._added.extend(self._name_suffixes(key, names))
+        self._keys[key] = indexed
+        if key not in self._students and self._students and key < next(reversed(self._students)):
+            # Возвращённый отменой удаления ученик встаёт на место по id при следующем поиске
+            self._reorder = True
+        # Изменённый ученик остаётся на прежнем месте в порядке вывода
+        self._students[key] = student
+        self._buckets.setdefault((cls, par), set()).add(key)
+
+    def remove(self, student):
+        self._unindex(student["id"])
+        self._students.pop(student["id"], None)
+
+    def _unindex(self, key):
+        # Удаляет ученика по значениям, с которыми он был проиндексирован:
+        # сама запись к этому моменту могла уже измениться
+        indexed = self._keys.pop(key, None)
+        if indexed is None:
+            return
+        self._unbucket(key, indexed)
+        self._stale += sum(map(len, indexed[2]))
+
+    def _unbucket(self, key, indexed):
+        cls, par, _ = indexed
+        bucket = self._buckets[(cls, par)]
+        bucket.discard(key)
+        if not bucket:
+            del self._buckets[(cls, par)]
+
+    def _sorted_suffixes(self):
+        if self._stale > (len(self._suffixes) + len(self._added)) // 2:
+            suffixes = [entry for key, (_, _, names) in self._keys.items()
+                        for entry in self._name_suffixes(key, names)]
+            suffixes.sort()
+            self._suffixes, self._added, self._stale = suffixes, [], 0
+        elif self._added:
+            # Добавленные суффиксы — отсортированный хвост: сортировка сливает два прогона
+            self._added.sort()
+            self._suffixes.extend(self._added)
+            self._suffixes.sort()
+            self._added = []
+        return self._suffixes
+
+    def class_groups(self):
+        # (класс, параллель) -> множество id учеников; не изменять
+        return self._buckets
+
+    def _filter_ids(self, cls, par):
+        if cls is not None and par is not None:
+            return self._buckets.get((cls, par), set())
+        ids = set()
+        for (bucket_cls, bucket_par), bucket in self._buckets.items():
+            if (cls is None or bucket_cls == cls) and (par is None or bucket_par == par):
+                ids |= bucket
+        return ids
+
+    def _name_ids(self, query):
+        ids = set()
+        suffixes = self._sorted_suffixes()
+        i = bisect.bisect_left(suffixes, (query,))
+        while i < len(suffixes) and suffixes[i][0].startswith(query):
+            ids.add(suffixes[i][1])
+            i += 1
+        if self._stale:
+            # Суффиксы удалённых учеников и прежних имён
+            keys = self._keys
+            ids = {key for key in ids if key in keys and any(query in name for name in keys[key][2])}
+        return ids
+
+    def search(self, fio="", cls=None, par=None):
+        # cls / par равные None означают «Все»
+        query = normalize(fio)
+        if not query and cls is None and par is None:
+            if self._reorder:
+                self._students = dict(sorted(self._students.items()))
+                self._reorder = False
+            return list(self._students.values())
+        ids = None
+        if cls is not None or par is not None:
+            ids = self._filter_ids(cls, par)
+        if query:
+            if ids is not None and len(ids) <= VERIFY_LIMIT * 8:
+                # Небольшую корзину дешевле проверить напрямую, чем обходить суффиксы
+                keys = self._keys
+                ids = {key for key in ids if any(query in name for name in keys[key][2])}
+            else:
+                name_ids = self._name_ids(query)
+                ids = name_ids if ids is None else ids & name_ids
+        return [self._students[key] for key in sorted(ids)]
@@ -0,0 +1,134 @@
+from collections import Counter
+
+
+# =============================================================
+# Статистика: счётчики обновляются при каждом изменении,
+# а не пересчитываются по всем ученикам при открытии страницы
+# =============================================================
+class LibraryStats:
+    # by_class   — (класс, параллель) -> книг на руках
+    # by_student — id ученика -> книг на руках
+    # by_book    — книга (id или строка) -> сколько раз выдавалась (по журналу выдач)
+    # by_author  — автор книги из каталога -> сколько раз выдавались его книги
+    # Как и в индексах поиска, запоминается, с какими значениями ученик
+    # или выдача были учтены, чтобы изменённую запись можно было вычесть.
+    def __init__(self):
+        self.by_class = Counter()
+        self.by_student = Counter()
+        self.by_book = Counter()
+        self.by_author = Counter()
+        self._students = {}
+        self._loans = {}
+        self._authors = {}
+
+    def load(self, students, loans, books):
+        for counter in (self.by_class, self.by_student, self.by_book, self.by_author):
+            counter.clear()
+        self._students = {}
+        self._loans = {}
+        self._authors = {b["id"]: b.get("Author", "") for b in books}
+        for st in students:
+            self.add_student(st)
+        self.add_loans(loans)
+
+    # ---------------------------------------------------------
+    # Ученики: книги на руках
+    # ---------------------------------------------------------
+    def add_student(self, student):
+        key = student["id"]
+        self.remove_student(student)
+        count = len(student.get("books", []))
+        group = (student.get("class", ""), student.get("parallel", ""))
+        self._students[key] = (group, count)
+        if count:
+            self.by_class[group] += count
+            self.by_student[key] = count
+
+    def remove_student(self, student):
+        counted = self._students.pop(student["id"], None)
+        if counted is None:
+            return
+        group, count = counted
+        if count:
+            _decrement(self.by_class, group, count)
+            self.by_student.pop(student["id"], None)
+
+    # ---------------------------------------------------------
+    # Выдачи из журнала (см. library/ledger.py)
+    # ---------------------------------------------------------
+    def add_loans(self, loans):
+        # Уже учтённые выдачи (например, закрытые возвратом) не считаются повторно,
+        # а у выдачи, книга которой сменилась (книга удалена из каталога), счёт переносится
+        for loan in loans:
+            book = loan["book"]
+            if loan["id"] in self._loans:
+                if self._loans[loan["id"]] == book:
+                    continue
+                self.remove_loans([loan])
+            self._loans[loan["id"]] = book
+            self.by_book[book] += 1
+            author = self._authors.get(book) if isinstance(book, int) else None
+            if author:
+                self.by_author[author] += 1
+
+    def remove_loans(self, loans):
+        for loan in loans:
+            book = self._loans.pop(loan["id"], None)
+            if book is None:
+                continue
+            _decrement(self.by_book, book)
+            author = self._authors.get(book) if isinstance(book, int) else None
+            if author:
+                _decrement(self.by_author, author)
+
+    # ---------------------------------------------------------
+    # Каталог
+    # ---------------------------------------------------------
+    def update_book(self, book):
+        # Выдачи переименованной книги переходят к новому автору
+        old_author = self._authors.get(book["id"])
+        new_author = book.get("Author", "")
+        self._authors[book["id"]] = new_author
+        count = self.by_book.get(book["id"], 0)
+        if count and old_author != new_author:
+            if old_author:
+                _decrement(self.by_author, old_author, count)
+            if new_author:
+                self.by_author[new_author] += count
+
+    def remove_book(self, book):
+        # История выдач сохраняется, но автора у книги больше нет
+        author = self._authors.pop(book["id"], None)
+        count = self.by_book.get(book["id"], 0)
+        if author and count:
+            _decrement(self.by_author, author, count)
+
+    # ---------------------------------------------------------
+    # Запросы
+    # ---------------------------------------------------------
+    def loans_on_hand(self):
+        return sum(self.by_class.values())
+
+    def top_books(self, limit=20):
+        return self.by_book.most_common(limit)
+
+    def top_authors(self, limit=20):
+        return self.by_author.most_common(limit)
+
+    def top_students(self, limit=20):
+        return self.by_student.most_common(limit)
+
+    def classes(self):
+        return sorted(self.by_class.items(), key=lambda item: _class_order(item[0]))
+
+
+def _class_order(group):
+    # По номеру класса, затем по параллели; нечисловые классы в конце
+    cls, par = group
+    return (0, int(cls), par) if cls.isdigit() else (1, 0, cls + par)
+
+
+def _decrement(counter, key, count=1):
+    counter[key] -= count
+    if counter[key] <= 0:
+        del counter[key]
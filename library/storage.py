@@ -0,0 +1,425 @@
+import sys
+import os
+import sqlite3
+from abc import ABC, abstractmethod
+
+from library.formats import (
+    STUDENT_FIELDS, assign_ids, format_book_line, read_books_file
+)
+from library.catalog_cache import load_catalog, write_catalog_cache
+from library.journal import Journal
+from library.loans import resolve_loans
+from library.writer import DirectSaver, atomic_write
+
+
+# =============================================================
+# Базовый интерфейс хранилища
+# =============================================================
+class Storage(ABC):
+    # Каждая запись (ученик или книга) получает целочисленный "id",
+    # по которому хранилище выполняет точечные изменения. Хранилище,
+    # в котором не хватает методов, не создаётся (TypeError).
+    # Следующие номера (_next_student_id, _next_book_id) известны
+    # после загрузки, в том числе в режиме только для чтения
+    @abstractmethod
+    def load_books(self):
+        pass
+
+    @abstractmethod
+    def load_students(self):
+        pass
+
+    @abstractmethod
+    def update_students(self, students):
+        # Сохранение учеников вне истории (исправления при загрузке)
+        pass
+
+    def new_student_id(self):
+        student_id = self._next_student_id
+        self._next_student_id += 1
+        return student_id
+
+    def new_book_id(self):
+        book_id = self._next_book_id
+        self._next_book_id += 1
+        return book_id
+
+    @abstractmethod
+    def commit(self, students=(), deleted_students=(), books=(), deleted_books=(),
+               loans=(), deleted_loans=()):
+        # Пакет изменений (см. library/history.py), который сохраняется целиком.
+        # Записи уже с id (см. new_student_id и new_book_id)
+        pass
+
+    # Журнал выдач (см. library/ledger.py): номера выдач выдаёт сам журнал
+    @abstractmethod
+    def load_loans(self):
+        pass
+
+    @abstractmethod
+    def put_loans(self, loans):
+        pass
+
+    @abstractmethod
+    def delete_loans(self, loans):
+        pass
+
+    def close(self):
+        pass
+
+
+def default_loans_path(students_path):
+    return os.path.join(os.path.dirname(students_path), "loans.json")
+
+
+# =============================================================
+# Файловое хранилище: students.json, loans.json и литература.txt
+# =============================================================
+class FileStorage(Storage):
+    # Книги по-прежнему переписываются целиком, а изменения учеников
+    # и выдач дописываются в общий журнал (см. library/journal.py),
+    # одной строкой на изменение. Запись на диск выполняет saver
+    # (см. library/writer.py).
+    # Вместе с учениками и выдачами сохраняется только то, что в одной
+    # строке журнала; каталог переписывается отдельно, после неё.
+    def __init__(self, students_path, books_path, saver=None, loans_path=None, read_only=False):
+        self.students_path = students_path
+        self.books_path = books_path
+        self.saver = saver if saver is not None else DirectSaver()
+        # Только чтение: при загрузке ничего не переписывается
+        self.read_only = read_only
+        self.journal = Journal({"student": students_path,
+                                "loan": loans_path or default_loans_path(students_path)}, self.saver)
+        self._tables = None
+        self._books = {}
+        self._next_student_id = 1
+        self._next_book_id = 1
+
+    def load_books(self):
+        try:
+            books = load_catalog(self.books_path, self.saver, self.read_only)
+        except Exception as e:
+            print(f"Ошибка загрузки {os.path.basename(self.books_path)}:", e)
+            books = []
+        ids = [b.get("id") for b in books]
+        self._next_book_id = assign_ids(books)
+        self._books = {b["id"]: b for b in books}
+        if not self.read_only and any(b["id"] != book_id for b, book_id in zip(books, ids)):
+            # Перенос со старого формата: выданные номера сразу записываются в файл
+            self.save_books()
+        return books
+
+    def load_tables(self):
+        # Ученики и выдачи читаются из журнала вместе
+        if self._tables is None:
+            self._tables = self.journal.load(self.read_only)
+        return self._tables
+
+    def load_students(self):
+        students = self.load_tables()["student"]
+        self._next_student_id = max((st["id"] for st in students), default=0) + 1
+        return students
+
+    def update_students(self, students):
+        self.journal.append(put={"student": students})
+
+    def commit(self, students=(), deleted_students=(), books=(), deleted_books=(),
+               loans=(), deleted_loans=()):
+        # Ученики и выдачи — одной строкой журнала, каталог — после неё
+        self.journal.append({"student": students, "loan": loans},
+                            {"student": deleted_students, "loan": deleted_loans})
+        if books or deleted_books:
+            for book in deleted_books:
+                self._books.pop(book["id"], None)
+            for book in books:
+                self._books[book["id"]] = book
+            self.save_books()
+
+    def load_loans(self):
+        return self.load_tables()["loan"]
+
+    def put_loans(self, loans):
+        self.journal.append(put={"loan": loans})
+
+    def delete_loans(self, loans):
+        self.journal.append(delete={"loan": loans})
+
+    def save_books(self):
+        # Список копируется сейчас, а строки собираются и пишутся в фоне
+        books = list(self._books.values())
+
+        def write_books():
+            data = "".join(map(format_book_line, books)).encode("utf-8")
+            atomic_write(self.books_path, data)
+            write_catalog_cache(self.books_path, books, data)
+        self.saver.schedule(("books", self.books_path), write_books, os.path.basename(self.books_path))
+
+    def close(self):
+        self.journal.close()
+
+
+# =============================================================
+# Хранилище SQLite: одна строка на изменение
+# =============================================================
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS books (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    title TEXT NOT NULL,
+    author TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS books_title ON books(title);
+CREATE INDEX IF NOT EXISTS books_author ON books(author);
+
+CREATE TABLE IF NOT EXISTS students (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    last_name TEXT NOT NULL DEFAULT '',
+    first_name TEXT NOT NULL DEFAULT '',
+    middle_name TEXT NOT NULL DEFAULT '',
+    class TEXT NOT NULL DEFAULT '',
+    parallel TEXT NOT NULL DEFAULT ''
+);
+CREATE INDEX IF NOT EXISTS students_class ON students(class, parallel);
+CREATE INDEX IF NOT EXISTS students_last_name ON students(last_name);
+
+CREATE TABLE IF NOT EXISTS loans (
+    student_id INTEGER NOT NULL REFERENCES students(id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    book TEXT NOT NULL,
+    PRIMARY KEY (student_id, position)
+);
+CREATE INDEX IF NOT EXISTS loans_book ON loans(book);
+
+CREATE TABLE IF NOT EXISTS ledger (
+    id INTEGER PRIMARY KEY,
+    student_id INTEGER NOT NULL REFERENCES students(id) ON DELETE CASCADE,
+    book_id INTEGER,
+    book TEXT NOT NULL DEFAULT '',
+    issued TEXT NOT NULL,
+    due TEXT NOT NULL,
+    returned TEXT
+);
+CREATE INDEX IF NOT EXISTS ledger_student ON ledger(student_id);
+CREATE INDEX IF NOT EXISTS ledger_due ON ledger(due) WHERE returned IS NULL;
+"""
+
+# Выдача книги из каталога хранится ссылкой book_id (book = ''),
+# книга не из каталога — текстом в book. В базах, созданных до
+# появления book_id, столбец добавляется при открытии.
+LOANS_BOOK_ID_SQL = (
+    "ALTER TABLE loans ADD COLUMN book_id INTEGER REFERENCES books(id)"
+)
+LOANS_BOOK_ID_INDEX_SQL = "CREATE INDEX IF NOT EXISTS loans_book_id ON loans(book_id)"
+
+
+BOOK_UPSERT_SQL = (
+    "INSERT INTO books (id, title, author) VALUES (?, ?, ?) "
+    "ON CONFLICT(id) DO UPDATE SET title = excluded.title, author = excluded.author"
+)
+
+
+STUDENT_UPSERT_SQL = (
+    "INSERT INTO students (id, last_name, first_name, middle_name, class, parallel) "
+    "VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT(id) DO UPDATE SET "
+    "last_name = excluded.last_name, first_name = excluded.first_name, "
+    "middle_name = excluded.middle_name, class = excluded.class, "
+    "parallel = excluded.parallel"
+)
+
+
+LEDGER_UPSERT_SQL = (
+    "INSERT INTO ledger (id, student_id, book_id, book, issued, due, returned) "
+    "VALUES (?, ?, ?, ?, ?, ?, ?) ON CONFLICT(id) DO UPDATE SET "
+    "student_id = excluded.student_id, book_id = excluded.book_id, book = excluded.book, "
+    "issued = excluded.issued, due = excluded.due, returned = excluded.returned"
+)
+
+
+def ledger_rows(loans):
+    return [(loan["id"], loan["student_id"]) +
+            ((loan["book"], "") if isinstance(loan["book"], int) else (None, loan["book"])) +
+            (loan["issued"], loan["due"], loan.get("returned"))
+            for loan in loans]
+
+
+class SqliteStorage(Storage):
+    # Номера записей выдаются сразу, а сами запросы готовятся с копией
+    # значений и выполняются одной транзакцией через saver
+    def __init__(self, db_path, saver=None, read_only=False):
+        self.db_path = db_path
+        self.saver = saver if saver is not None else DirectSaver()
+        self.read_only = read_only
+        if read_only:
+            # Схема не создаётся и не обновляется: база должна быть уже перенесена
+            self.conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True, check_same_thread=False)
+        else:
+            self.conn = sqlite3.connect(db_path, check_same_thread=False)
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA synchronous=NORMAL")
+            self.conn.execute("PRAGMA foreign_keys=ON")
+            self.conn.executescript(SCHEMA)
+            columns = [r[1] for r in self.conn.execute("PRAGMA table_info(loans)")]
+            if "book_id" not in columns:
+                self.conn.execute(LOANS_BOOK_ID_SQL)
+            self.conn.execute(LOANS_BOOK_ID_INDEX_SQL)
+            self.conn.commit()
+        self._next_student_id = self._next_id("students")
+        self._next_book_id = self._next_id("books")
+
+    def _next_id(self, table):
+        # С AUTOINCREMENT номера удалённых записей не переиспользуются
+        row = self.conn.execute("SELECT seq FROM sqlite_sequence WHERE name = ?", (table,)).fetchone()
+        top = self.conn.execute(f"SELECT MAX(id) FROM {table}").fetchone()[0]
+        return max(row[0] if row else 0, top or 0) + 1
+
+    def is_empty(self):
+        for table in ("books", "students"):
+            if self.conn.execute(f"SELECT 1 FROM {table} LIMIT 1").fetchone():
+                return False
+        return True
+
+    def load_books(self):
+        rows = self.conn.execute("SELECT id, title, author FROM books ORDER BY id")
+        return [{"id": r[0], "Title": r[1], "Author": r[2]} for r in rows]
+
+    def load_students(self):
+        students = []
+        by_id = {}
+        rows = self.conn.execute(
+            "SELECT id, last_name, first_name, middle_name, class, parallel FROM students ORDER BY id")
+        for r in rows:
+            st = {"id": r[0]}
+            st.update(zip(STUDENT_FIELDS, r[1:]))
+            st["books"] = []
+            students.append(st)
+            by_id[r[0]] = st
+        for student_id, book_id, book in self.conn.execute(
+                "SELECT student_id, book_id, book FROM loans ORDER BY student_id, position"):
+            st = by_id.get(student_id)
+            if st is not None:
+                st["books"].append(book_id if book_id is not None else book)
+        return students
+
+    def _execute(self, statements):
+        if self.read_only:
+            raise RuntimeError(f"База {os.path.basename(self.db_path)} открыта только для чтения")
+
+        def job():
+            with self.conn:
+                for sql, rows in statements:
+                    self.conn.executemany(sql, rows)
+        self.saver.submit(job, os.path.basename(self.db_path))
+
+    def student_statements(self, students):
+        for st in students:
+            if not isinstance(st.get("id"), int):
+                st["id"] = self._next_student_id
+                self._next_student_id += 1
+        return [
+            (STUDENT_UPSERT_SQL,
+             [[st["id"]] + [st.get(field, "") for field in STUDENT_FIELDS] for st in students]),
+            ("DELETE FROM loans WHERE student_id = ?", [(st["id"],) for st in students]),
+            ("INSERT INTO loans (student_id, position, book_id, book) VALUES (?, ?, ?, ?)",
+             [(st["id"], pos) + ((bk, "") if isinstance(bk, int) else (None, bk))
+              for st in students for pos, bk in enumerate(st.get("books", []))]),
+        ]
+
+    def update_students(self, students):
+        self._execute(self.student_statements(students))
+
+    def commit(self, students=(), deleted_students=(), books=(), deleted_books=(),
+               loans=(), deleted_loans=()):
+        # Одна транзакция; выдачи удалённых учеников удаляются каскадом
+        self._execute(
+            [(BOOK_UPSERT_SQL, [(b["id"], b.get("Title", ""), b.get("Author", "")) for b in books])] +
+            self.student_statements(list(students)) +
+            [(LEDGER_UPSERT_SQL, ledger_rows(loans)),
+             ("DELETE FROM ledger WHERE id = ?", [(loan["id"],) for loan in deleted_loans]),
+             ("DELETE FROM students WHERE id = ?", [(st["id"],) for st in deleted_students]),
+             ("DELETE FROM books WHERE id = ?", [(b["id"],) for b in deleted_books])])
+
+    def load_loans(self):
+        rows = self.conn.execute(
+            "SELECT id, student_id, book_id, book, issued, due, returned FROM ledger ORDER BY id")
+        return [{"id": r[0], "student_id": r[1], "book": r[2] if r[2] is not None else r[3],
+                 "issued": r[4], "due": r[5], "returned": r[6]} for r in rows]
+
+    def put_loans(self, loans):
+        self._execute([(LEDGER_UPSERT_SQL, ledger_rows(loans))])
+
+    def delete_loans(self, loans):
+        self._execute([("DELETE FROM ledger WHERE id = ?", [(loan["id"],) for loan in loans])])
+
+    def close(self):
+        self.saver.flush()
+        self.conn.close()
+
+
+# =============================================================
+# Перенос данных из students.json, loans.json и литература.txt в SQLite
+# =============================================================
+def migrate_files_to_sqlite(students_path, books_path, db_path, loans_path=None):
+    if os.path.exists(db_path):
+        existing = SqliteStorage(db_path)
+        try:
+            if not existing.is_empty():
+                raise RuntimeError(f"База {os.path.basename(db_path)} уже содержит данные")
+        finally:
+            existing.close()
+    # База собирается во временном файле, чтобы сбой не оставил её наполовину заполненной
+    tmp_path = db_path + ".tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    books = read_books_file(books_path)
+    # Ученики и выдачи читаются вместе с журналами; ошибка чтения прерывает перенос
+    tables, _ = Journal({"student": students_path,
+                         "loan": loans_path or default_loans_path(students_path)}).read()
+    students = list(tables["student"].values())
+    loans = list(tables["loan"].values())
+    assign_ids(books)
+    resolve_loans(students, books)
+    student_ids = {st["id"] for st in students}
+    loans = [loan for loan in loans if loan["student_id"] in student_ids]
+    storage = SqliteStorage(tmp_path)
+    try:
+        with storage.conn:
+            storage.conn.executemany("INSERT INTO books (id, title, author) VALUES (?, ?, ?)",
+                                     [(b["id"], b["Title"], b["Author"]) for b in books])
+            for sql, rows in storage.student_statements(students):
+                storage.conn.executemany(sql, rows)
+            storage.conn.executemany(LEDGER_UPSERT_SQL, ledger_rows(loans))
+    finally:
+        storage.close()
+    os.replace(tmp_path, db_path)
+    return len(students), len(books)
+
+
+def open_storage(kind, students_path, books_path, db_path, saver=None, read_only=False):
+    if kind == "sqlite" and read_only:
+        # Без переноса: если базы ещё нет, данные пока лежат в файлах
+        if os.path.exists(db_path):
+            return SqliteStorage(db_path, saver, read_only=True)
+        return FileStorage(students_path, books_path, saver, read_only=True)
+    if kind == "sqlite":
+        if not os.path.exists(db_path) and (os.path.exists(students_path) or os.path.exists(books_path)):
+            try:
+                students, books = migrate_files_to_sqlite(students_path, books_path, db_path)
+                print(f"Перенесено в {os.path.basename(db_path)}: учеников {students}, книг {books}")
+            except Exception as e:
+                print("Ошибка переноса данных в SQLite:", e)
+                return FileStorage(students_path, books_path, saver)
+        return SqliteStorage(db_path, saver)
+    return FileStorage(students_path, books_path, saver, read_only=read_only)
+
+
+if __name__ == "__main__":
+    # python -m library.storage [папка с данными]
+    base_dir = sys.argv[1] if len(sys.argv) > 1 else os.getcwd()
+    try:
+        students, books = migrate_files_to_sqlite(
+            os.path.join(base_dir, "students.json"),
+            os.path.join(base_dir, "литература.txt"),
+            os.path.join(base_dir, "library.db"))
+    except Exception as e:
+        print("Ошибка переноса данных:", e)
+        sys.exit(1)
+    print(f"Перенесено учеников: {students}, книг: {books}")
@@ -0,0 +1,138 @@
+import os
+import json
+import random
+from datetime import date, timedelta
+
+from library.core import DEFAULT_CONFIG, data_paths
+from library.formats import format_book_line
+from library.ledger import DEFAULT_LOAN_DAYS
+from library.writer import atomic_write
+
+# =============================================================
+# Синтетические данные для замеров: ученики, каталог и выдачи
+# в тех же файлах, что пишет программа (students.json, loans.json,
+# литература.txt, config.json). Одинаковый seed — одинаковые данные.
+# =============================================================
+# Имена без "ё": проверка ФИО в программе пропускает только А-Я, а-я
+SURNAMES = [
+    "Иванов", "Смирнов", "Кузнецов", "Попов", "Васильев", "Петров", "Соколов", "Михайлов",
+    "Новиков", "Федоров", "Морозов", "Волков", "Алексеев", "Лебедев", "Семенов", "Егоров",
+    "Павлов", "Козлов", "Степанов", "Николаев", "Орлов", "Андреев", "Макаров", "Никитин",
+    "Захаров", "Зайцев", "Соловьев", "Борисов", "Яковлев", "Григорьев", "Романов", "Воробьев",
+    "Сергеев", "Кузьмин", "Фролов", "Александров", "Дмитриев", "Королев", "Гусев", "Киселев",
+    "Ильин", "Максимов", "Поляков", "Сорокин", "Виноградов", "Ковалев", "Белов", "Медведев",
+    "Антонов", "Тарасов", "Жуков", "Баранов", "Филиппов", "Комаров", "Давыдов", "Беляев",
+]
+MALE_NAMES = [
+    "Александр", "Дмитрий", "Максим", "Сергей", "Андрей", "Алексей", "Артем", "Илья",
+    "Кирилл", "Михаил", "Никита", "Матвей", "Роман", "Егор", "Арсений", "Иван", "Денис",
+    "Евгений", "Даниил", "Тимофей", "Владислав", "Игорь", "Павел", "Руслан", "Марк", "Лев",
+]
+FEMALE_NAMES = [
+    "Анастасия", "Мария", "Анна", "Виктория", "Екатерина", "Наталья", "Марина", "Полина",
+    "Дарья", "Алиса", "Ксения", "Елизавета", "Софья", "Варвара", "Вероника", "Ольга",
+    "Татьяна", "Ирина", "Юлия", "Алена", "Валерия", "Ульяна", "Ева", "Милана", "Кира",
+]
+# Отчество: мужская и женская форма от имени отца
+PATRONYMICS = [
+    ("Александрович", "Александровна"), ("Дмитриевич", "Дмитриевна"), ("Сергеевич", "Сергеевна"),
+    ("Андреевич", "Андреевна"), ("Алексеевич", "Алексеевна"), ("Михайлович", "Михайловна"),
+    ("Иванович", "Ивановна"), ("Петрович", "Петровна"), ("Николаевич", "Николаевна"),
+    ("Владимирович", "Владимировна"), ("Евгеньевич", "Евгеньевна"), ("Игоревич", "Игоревна"),
+    ("Олегович", "Олеговна"), ("Романович", "Романовна"), ("Павлович", "Павловна"),
+]
+TITLE_ADJECTIVES = [
+    "Тихий", "Белый", "Старый", "Последний", "Тайный", "Золотой", "Далекий", "Северный",
+    "Зимний", "Потерянный", "Новый", "Черный", "Синий", "Забытый", "Вечный", "Первый",
+]
+TITLE_NOUNS = [
+    "дом", "сад", "берег", "город", "лес", "путь", "остров", "корабль", "мост", "огонь",
+    "ветер", "день", "год", "край", "парус", "дождь", "снег", "рассвет", "океан", "замок",
+]
+TITLE_ENDINGS = [
+    "", "", "", " и его тайна", " над рекой", " на краю света", " в тумане", " у моря",
+    " и другие рассказы", " после войны",
+]
+
+
+def synthetic_student(rng, classes, parallels):
+    surname = rng.choice(SURNAMES)
+    patronymic = rng.choice(PATRONYMICS)
+    if rng.random() < 0.5:
+        first_name, middle_name = rng.choice(MALE_NAMES), patronymic[0]
+    else:
+        surname, first_name, middle_name = surname + "а", rng.choice(FEMALE_NAMES), patronymic[1]
+    return {"last_name": surname, "first_name": first_name, "middle_name": middle_name,
+            "class": rng.choice(classes), "parallel": rng.choice(parallels), "books": []}
+
+
+def synthetic_books(rng, count):
+    # Названия не повторяются; авторов примерно в восемь раз меньше, чем книг
+    authors = [f"{rng.choice(MALE_NAMES + FEMALE_NAMES)} {rng.choice(SURNAMES)}"
+               for _ in range(max(1, count // 8))]
+    books = []
+    seen = set()
+    for book_id in range(1, count + 1):
+        title = f"{rng.choice(TITLE_ADJECTIVES)} {rng.choice(TITLE_NOUNS)}{rng.choice(TITLE_ENDINGS)}"
+        if title in seen:
+            title = f"{title} (книга {book_id})"
+        seen.add(title)
+        books.append({"Title": title, "Author": rng.choice(authors), "id": book_id})
+    return books
+
+
+# Файлы, которые программа выводит из основных: журналы, кэш каталога, база
+DERIVED_FILES = ("students.journal", "students.journal.1", "loans.journal", "loans.journal.1",
+                 "литература.cache", "library.db", "library.db-wal", "library.db-shm")
+
+
+def generate_dataset(directory, students=1000, books=5000, seed=1, today=None, loan_days=DEFAULT_LOAN_DAYS,
+                     overwrite=False):
+    # Возвращает (учеников, книг, выдач). Популярность книг неравномерна:
+    # немногие книги выдаются часто, большая часть каталога — редко
+    paths = data_paths(directory)
+    if os.path.exists(paths["students"]) and not overwrite:
+        raise FileExistsError(f"В папке {directory} уже есть данные")
+    os.makedirs(directory, exist_ok=True)
+    for name in DERIVED_FILES:
+        # Иначе старый журнал применился бы поверх новых данных
+        path = os.path.join(directory, name)
+        if os.path.exists(path):
+            os.remove(path)
+    rng = random.Random(seed)
+    today = today or date.today()
+    config = {key: list(value) for key, value in DEFAULT_CONFIG.items()}
+    config["parallels"] = config["parallels"][:5]
+    catalog = synthetic_books(rng, books)
+    records = []
+    loans = []
+
+    def pick_book():
+        return catalog[int(len(catalog) * rng.random() ** 3)]["id"]
+
+    def add_loan(student_id, book_id, issued, returned):
+        loans.append({"id": len(loans) + 1, "student_id": student_id, "book": book_id,
+                      "issued": issued.isoformat(),
+                      "due": (issued + timedelta(days=loan_days)).isoformat(),
+                      "returned": returned.isoformat() if returned else None})
+
+    for student_id in range(1, students + 1):
+        st = synthetic_student(rng, config["classes"], config["parallels"])
+        st["id"] = student_id
+        # История: возвращённые книги за последние полгода
+        for _ in range(rng.choice((0, 0, 1, 1, 2, 3))):
+            issued = today - timedelta(days=rng.randint(30, 180))
+            add_loan(student_id, pick_book(), issued, issued + timedelta(days=rng.randint(3, 25)))
+        # На руках: у большинства ничего, у части — до пяти книг, некоторые просрочены
+        if catalog:
+            for _ in range(rng.choice((0, 0, 0, 0, 0, 0, 1, 1, 2, 3, 5))):
+                book_id = pick_book()
+                st["books"].append(book_id)
+                add_loan(student_id, book_id, today - timedelta(days=rng.randint(0, 40)), None)
+        records.append(st)
+
+    atomic_write(paths["config"], json.dumps(config, ensure_ascii=False, indent=4))
+    atomic_write(paths["students"], json.dumps(records, ensure_ascii=False, indent=4))
+    atomic_write(os.path.join(directory, "loans.json"), json.dumps(loans, ensure_ascii=False, indent=4))
+    atomic_write(paths["books"], "".join(map(format_book_line, catalog)))
+    return len(records), len(catalog), len(loans)
@@ -0,0 +1,60 @@
+import os
+import json
+import time
+from datetime import datetime
+
+# =============================================================
+# Запись действий библиотекаря для воспроизведения (replay.py).
+# Строка JSON на действие:
+#   {"t": 12.345, "op": "readers.filter", "args": {"fio": "ива", ...}}
+# t — секунды от начала записи. Первая строка (op "session")
+# описывает данные, на которых записана трасса.
+# Включение: переменная окружения LIBRARY_TRACE=путь или ключ
+# "trace_file" в config.json.
+# =============================================================
+ENV_VAR = "LIBRARY_TRACE"
+
+# Действия, которые записывает и воспроизводит окно (LibraryApp.perform):
+# сначала изменения данных, затем действия просмотра
+OPS = ("student.add", "student.edit", "student.delete", "book.add", "book.edit", "book.delete",
+       "promotion", "config.save", "undo", "redo",
+       "page", "readers.filter", "books.search", "student_dialog.open", "promotion_dialog.open",
+       "archive.open")
+
+
+class TraceRecorder:
+    # Строки дописываются через saver (в фоне, как журналы данных)
+    def __init__(self, path, saver, **session):
+        self.path = path
+        self.saver = saver
+        self.started = time.monotonic()
+        self.write("session", dict(session, started=datetime.now().isoformat(timespec="seconds")))
+
+    def write(self, op, args):
+        line = json.dumps({"t": round(time.monotonic() - self.started, 3), "op": op, "args": args},
+                          ensure_ascii=False) + "\n"
+        self.saver.submit(lambda: self._append(line), os.path.basename(self.path))
+
+    def _append(self, line):
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(line)
+
+
+def read_trace(path):
+    # -> список (t, op, args); недописанная последняя строка пропускается
+    records = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            records.append((record.get("t", 0), record["op"], record.get("args") or {}))
+    return records
+
+
+def trace_path(config):
+    # Переменная окружения важнее config.json; пустая — запись выключена
+    if ENV_VAR in os.environ:
+        return os.environ[ENV_VAR] or None
+    return config.get("trace_file") or None
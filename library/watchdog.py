@@ -0,0 +1,105 @@
+import os
+import sys
+import time
+import threading
+import traceback
+from datetime import datetime, timedelta
+
+from library.profiling import profiler
+
+# =============================================================
+# Сторожевой поток: замечает, что окно перестало отвечать.
+# GUI-поток по таймеру вызывает beat(); если очередного удара
+# нет дольше интервала плюс порога, поток снимает стек GUI-потока
+# (sys._current_frames) и после возобновления пишет в журнал,
+# сколько длилась остановка и какое действие её вызвало.
+# Библиотека от Qt не зависит: таймер заводит окно (widget.py).
+# =============================================================
+STALL_THRESHOLD_MS = 100
+# Размер журнала, после которого он переименовывается в .1
+LOG_LIMIT = 1024 * 1024
+
+
+class StallWatchdog:
+    def __init__(self, threshold_ms=STALL_THRESHOLD_MS, log_path=None, app_files=(), on_stall=None):
+        # Создаётся в GUI-потоке: его стек и снимается при остановке.
+        # app_files — файлы программы: по их функциям в стеке
+        # определяется действие (например, shift_students)
+        self.threshold = threshold_ms / 1000
+        self.interval = max(10, threshold_ms // 2) / 1000
+        self.log_path = log_path
+        self.app_files = {os.path.normcase(os.path.abspath(path)) for path in app_files}
+        self.on_stall = on_stall
+        self.thread_id = threading.get_ident()
+        self.stalls = 0
+        self.longest_ms = 0.0
+        self._last_beat = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="StallWatchdog", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def beat(self):
+        self._last_beat = time.monotonic()
+
+    def action_of(self, frame):
+        # Функции программы от внешней к внутренней: "shift_students > on_apply"
+        names = []
+        while frame is not None:
+            code = frame.f_code
+            if code.co_name != "<module>" and \
+                    os.path.normcase(os.path.abspath(code.co_filename)) in self.app_files:
+                names.append(code.co_name)
+            frame = frame.f_back
+        return " > ".join(reversed(names))
+
+    def _run(self):
+        stall = None
+        while not self._stop.wait(self.interval / 2):
+            last = self._last_beat
+            if last is None:
+                # Цикл событий ещё не запущен
+                continue
+            if stall is not None:
+                if last != stall["beat"]:
+                    # Окно снова отвечает: длительность известна
+                    stall["ms"] = max(0.0, (last - stall["beat"] - self.interval) * 1000)
+                    self._report(stall)
+                    stall = None
+                continue
+            late = time.monotonic() - last - self.interval
+            if late > self.threshold:
+                frame = sys._current_frames().get(self.thread_id)
+                stall = {"beat": last, "started": datetime.now() - timedelta(seconds=late),
+                         "action": self.action_of(frame),
+                         "stack": traceback.format_stack(frame) if frame is not None else []}
+                del frame
+
+    def _report(self, stall):
+        self.stalls += 1
+        self.longest_ms = max(self.longest_ms, stall["ms"])
+        profiler.record("event_loop.stall", stall["ms"])
+        if self.log_path:
+            try:
+                self._write_log(stall)
+            except OSError as e:
+                print("Ошибка записи журнала зависаний:", e)
+        if self.on_stall is not None:
+            self.on_stall(stall["ms"])
+
+    def _write_log(self, stall):
+        if os.path.exists(self.log_path) and os.path.getsize(self.log_path) > LOG_LIMIT:
+            os.replace(self.log_path, self.log_path + ".1")
+        with open(self.log_path, "a", encoding="utf-8") as f:
+            f.write(f'{stall["started"]:%Y-%m-%d %H:%M:%S} — окно не отвечало {stall["ms"]:.0f} мс; '
+                    f'действие: {stall["action"] or "неизвестно"}\n')
+            f.write("".join(stall["stack"]))
+            f.write("\n")
@@ -0,0 +1,138 @@
+import os
+import time
+import atexit
+import threading
+from collections import OrderedDict
+
+from library.profiling import profiler
+
+# Сколько секунд копятся изменения перед записью на диск
+WRITE_DELAY = 0.2
+
+
+def atomic_write(path, data):
+    # Файл либо остаётся прежним, либо целиком заменяется новым
+    tmp_path = path + ".tmp"
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+# =============================================================
+# Синхронная запись (консольные утилиты, перенос данных)
+# =============================================================
+class DirectSaver:
+    def __init__(self, on_error=None):
+        self.on_error = on_error
+
+    def schedule(self, key, job, label="", keep_order=False):
+        try:
+            with profiler.measure("saver.write"):
+                job()
+        except Exception as e:
+            report_error(self.on_error, label, e)
+
+    def submit(self, job, label=""):
+        self.schedule(None, job, label)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+
+# =============================================================
+# Отложенная запись в фоновом потоке
+# =============================================================
+class WriteBehindSaver:
+    # schedule(key, job) — задача с ключом: новая задача с тем же ключом
+    # заменяет ещё не выполненную (например, повторное сохранение файла)
+    # и встаёт в конец очереди: файл, переписываемый целиком, получает
+    # последнее состояние после всего, что поставлено раньше.
+    # keep_order=True — задача дописывает накопленные строки (журнал):
+    # она остаётся на месте первой постановки, иначе ранние строки
+    # легли бы на диск после более поздних записей других файлов.
+    # submit(job) — задача без склейки (например, строка трассы).
+    # Задачи выполняются по порядку, пачкой раз в WRITE_DELAY секунд.
+    def __init__(self, on_error=None, delay=WRITE_DELAY):
+        self.on_error = on_error
+        self.delay = delay
+        self._pending = OrderedDict()
+        self._cond = threading.Condition()
+        self._busy = False
+        self._flushing = False
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="WriteBehindSaver", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def schedule(self, key, job, label="", keep_order=False):
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("Сохранение уже остановлено")
+            self._pending[key] = (label, job)
+            if not keep_order:
+                self._pending.move_to_end(key)
+            self._cond.notify_all()
+
+    def submit(self, job, label=""):
+        self.schedule(object(), job, label)
+
+    def flush(self):
+        # Блокирует до записи всего, что было поставлено в очередь
+        with self._cond:
+            if not self._thread.is_alive():
+                return
+            self._flushing = True
+            self._cond.notify_all()
+            while self._pending or self._busy:
+                self._cond.wait()
+            self._flushing = False
+
+    def close(self):
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join()
+        atexit.unregister(self.close)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._closed:
+                    self._cond.wait()
+                if not self._pending:
+                    return
+                deadline = time.monotonic() + self.delay
+                while not self._closed and not self._flushing:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                jobs = list(self._pending.values())
+                self._pending.clear()
+                self._busy = True
+            with profiler.measure("saver.write"):
+                for label, job in jobs:
+                    try:
+                        job()
+                    except Exception as e:
+                        report_error(self.on_error, label, e)
+            with self._cond:
+                self._busy = False
+                self._cond.notify_all()
+
+
+def report_error(on_error, label, error):
+    message = f"Ошибка сохранения {label}: {error}" if label else f"Ошибка сохранения: {error}"
+    if on_error is not None:
+        on_error(message)
+    else:
+        print(message)
@@ -0,0 +1,142 @@
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import statistics
+from collections import Counter
+from datetime import datetime
+
+# Окно не показывается на экране; переменную можно задать и снаружи
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from benchmark import git_revision
+from library.core import data_paths
+from library.synthetic import generate_dataset
+from library.trace import ENV_VAR, OPS, read_trace
+
+# =============================================================
+# Воспроизведение записанных действий (library/trace.py) в окне
+# программы на копии данных. Для каждого вида действия — строка
+# JSON с временами, как в benchmark.py:
+#   python replay.py сеанс.jsonl --data путь/к/данным --repeat 3
+# Без --data данные генерируются (размер берётся из трассы).
+# =============================================================
+
+
+def missing_record(window, op, args):
+    # Действие ссылается на ученика или книгу, которых нет в этих данных
+    if op not in OPS:
+        # Действие неизвестно этой версии
+        return True
+    student_id = args.get("student_id")
+    if student_id is not None and student_id not in window.students:
+        return True
+    book_id = args.get("book_id")
+    return book_id is not None and book_id not in window.books
+
+
+def replay_once(app, trace, directory, pace=False):
+    import widget
+
+    widget.paths = data_paths(directory)
+    timings = {}
+    skipped = Counter()
+    start = time.perf_counter()
+    window = widget.LibraryApp()
+    # Окно с ошибкой сохранения модально и остановило бы воспроизведение
+    window.save_failed.disconnect()
+    window.save_failed.connect(lambda message: print(message, file=sys.stderr))
+    window.show()
+    app.processEvents()
+    timings["startup"] = [(time.perf_counter() - start) * 1000]
+    start = time.perf_counter()
+    for t, op, args in trace:
+        if op == "session":
+            continue
+        if pace:
+            # Паузы как у библиотекаря: успевают сработать таймеры окна
+            while time.perf_counter() - start < t:
+                app.processEvents()
+                time.sleep(0.005)
+        if missing_record(window, op, args):
+            skipped[op] += 1
+            continue
+        op_start = time.perf_counter()
+        window.perform(op, args)
+        app.processEvents()
+        timings.setdefault(op, []).append((time.perf_counter() - op_start) * 1000)
+    window.close()
+    app.processEvents()
+    return timings, skipped
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Воспроизведение записанных действий с замером времени")
+    parser.add_argument("trace", help="файл JSON lines, записанный с LIBRARY_TRACE")
+    parser.add_argument("--data", help="папка с данными (копируется; по умолчанию — синтетические)")
+    parser.add_argument("--students", type=int, help="учеников в синтетических данных")
+    parser.add_argument("--books", type=int, help="книг в синтетических данных")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--pace", action="store_true", help="выдерживать паузы между действиями")
+    parser.add_argument("--output", help="файл JSON lines (по умолчанию — стандартный вывод)")
+    args = parser.parse_args(argv)
+
+    try:
+        from PyQt6.QtWidgets import QApplication
+    except ImportError:
+        print("Для воспроизведения нужен PyQt6", file=sys.stderr)
+        return 1
+    # Воспроизведение не записывает новую трассу
+    os.environ[ENV_VAR] = ""
+    trace = read_trace(args.trace)
+    session = next((a for _, op, a in trace if op == "session"), {})
+    students = args.students or session.get("students") or 1000
+    books = args.books or session.get("books") or students * 2
+
+    app = QApplication.instance() or QApplication(sys.argv)
+    timings = {}
+    skipped = Counter()
+    for _ in range(args.repeat):
+        # Действия меняют данные: каждый прогон — на свежей копии
+        directory = tempfile.mkdtemp(prefix="library-replay-")
+        try:
+            if args.data:
+                shutil.copytree(args.data, directory, dirs_exist_ok=True)
+            else:
+                generate_dataset(directory, students, books, args.seed, overwrite=True)
+            run_timings, run_skipped = replay_once(app, trace, directory, args.pace)
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+        for op, times in run_timings.items():
+            timings.setdefault(op, []).extend(times)
+        skipped.update(run_skipped)
+
+    meta = {"trace": os.path.basename(args.trace), "data": args.data or f"synthetic:{students}/{books}/{args.seed}",
+            "repeat": args.repeat, "revision": git_revision(), "python": platform.python_version(),
+            "platform": platform.platform(), "time": datetime.now().isoformat(timespec="seconds")}
+    total = [ms for op, times in timings.items() if op != "startup" for ms in times]
+    timings["total"] = [sum(total) / args.repeat]
+    out = open(args.output, "a", encoding="utf-8") if args.output else sys.stdout
+    try:
+        for op, times in sorted(timings.items(), key=lambda item: -sum(item[1])):
+            record = dict(meta, benchmark=f"replay.{op}", runs=len(times),
+                          min_ms=round(min(times), 3), median_ms=round(statistics.median(times), 3),
+                          max_ms=round(max(times), 3), total_ms=round(sum(times), 3),
+                          skipped=skipped.get(op, 0))
+            out.write(json.dumps(record, ensure_ascii=False) + "\n")
+        for op in sorted(set(skipped) - set(timings)):
+            out.write(json.dumps(dict(meta, benchmark=f"replay.{op}", runs=0, skipped=skipped[op]),
+                                 ensure_ascii=False) + "\n")
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,126 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from library.archive import StudentArchive, archive_entry
+from library.core import CommitError, LibraryCore, data_paths
+from library.synthetic import generate_dataset
+
+
+# =============================================================
+# Уход учеников в архив: если архив не записан, ученики и их
+# выдачи остаются в рабочих данных (без окна, без Qt):
+#   python -m unittest discover tests
+# =============================================================
+class ArchiveFailureTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix="library-test-")
+        generate_dataset(self.directory, students=200, books=100, seed=1, overwrite=True)
+        self.paths = data_paths(self.directory)
+        self.core = LibraryCore(self.paths)
+
+    def tearDown(self):
+        self.core.close()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def break_archive(self):
+        # Вместо папки архива — файл: создать в нём часть года нельзя
+        shutil.rmtree(self.paths["archive"], ignore_errors=True)
+        with open(self.paths["archive"], "w", encoding="utf-8") as f:
+            f.write("")
+
+    def reopen(self):
+        self.core.close()
+        self.core = LibraryCore(self.paths)
+
+    def debtor(self):
+        return next(st for st in self.core.students.values() if self.core.ledger.open_loans(st["id"]))
+
+    def test_delete_student_keeps_student(self):
+        st = self.debtor()
+        loans = self.core.ledger.open_loans(st["id"])
+        self.break_archive()
+        with self.assertRaises(CommitError):
+            self.core.delete_student(st)
+        self.assertIn(st["id"], self.core.students)
+        self.assertFalse(self.core.history.can_undo())
+        self.reopen()
+        self.assertEqual(self.core.students[st["id"]], st)
+        self.assertEqual(self.core.ledger.open_loans(st["id"]), loans)
+
+    def test_promotion_keeps_graduates(self):
+        plan = self.core.plan_promotion()
+        self.assertTrue(plan.graduates)
+        before = {key: dict(st) for key, st in self.core.students.items()}
+        self.break_archive()
+        with self.assertRaises(CommitError):
+            self.core.promote(plan)
+        self.assertEqual(self.core.students, before)
+        self.reopen()
+        self.assertEqual(self.core.students, before)
+
+    def test_failed_redo_stays_in_history(self):
+        st = self.debtor()
+        self.core.delete_student(st)
+        self.core.undo()
+        self.assertIn(st["id"], self.core.students)
+        self.break_archive()
+        with self.assertRaises(CommitError):
+            self.core.redo()
+        self.assertIn(st["id"], self.core.students)
+        self.assertTrue(self.core.history.can_redo())
+
+
+def entry(student_id, last_name, when):
+    student = {"id": student_id, "last_name": last_name, "first_name": "Тест", "middle_name": "",
+               "class": "11", "parallel": "А", "books": []}
+    return archive_entry(student, [], "graduated", {}, when)
+
+
+class ArchivePartitionTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix="library-test-")
+        self.archive = StudentArchive(os.path.join(self.directory, "архив"))
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_blocks_are_appended_by_year(self):
+        first = [entry(1, "Иванов", "2023-06-01T10:00:00"), entry(2, "Петров", "2024-06-01T10:00:00")]
+        second = [entry(3, "Сидоров", "2024-06-02T10:00:00")]
+        self.archive.store(first)
+        size = os.path.getsize(self.archive.partition_path(2024))
+        self.archive.store(second)
+        # Новый блок дописан в конец, прежний не переписан
+        self.assertGreater(os.path.getsize(self.archive.partition_path(2024)), size)
+        self.assertEqual(self.archive.years(), [2024, 2023])
+        self.assertEqual(list(self.archive.read(2023).values()), first[:1])
+        self.assertEqual(list(self.archive.read(2024).values()), [first[1], second[0]])
+        self.assertEqual(self.archive.read(2022), {})
+
+    def test_remove_and_store_again(self):
+        entries = [entry(1, "Иванов", "2024-06-01T10:00:00"), entry(2, "Петров", "2024-06-01T10:00:00")]
+        self.archive.store(entries)
+        self.archive.remove(entries[:1])
+        self.assertEqual(list(self.archive.read(2024).values()), entries[1:])
+        # Повтор после отмены: удаление должно лечь в файл раньше новой записи
+        self.archive.store(entries[:1])
+        self.assertEqual(sorted(self.archive.read(2024)), sorted(e["id"] for e in entries))
+
+    def test_torn_block_is_skipped(self):
+        kept = entry(1, "Иванов", "2024-06-01T10:00:00")
+        self.archive.store([kept])
+        self.archive.store([entry(2, "Петров", "2024-06-02T10:00:00")])
+        path = self.archive.partition_path(2024)
+        with open(path, "rb+") as f:
+            f.truncate(os.path.getsize(path) - 10)
+        self.assertEqual(list(self.archive.read(2024).values()), [kept])
+        # Дописанное после сбоя читается за оборванным блоком
+        added = entry(3, "Сидоров", "2024-06-03T10:00:00")
+        self.archive.store([added])
+        self.assertEqual(list(self.archive.read(2024).values()), [kept, added])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,88 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from library import catalog_cache
+from library.catalog_cache import CACHE_HEADER, cache_path_for, load_catalog
+from library.formats import format_book_line
+
+
+def write_books(path, books):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("".join(format_book_line(b) + "\n" for b in books))
+
+
+# =============================================================
+# Кэш каталога LIBCAT2 (library/catalog_cache.py): кэш берётся, пока
+# совпадают размер и mtime либо хэш литература.txt:
+#   python -m unittest discover tests
+# =============================================================
+class CatalogCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix="library-test-")
+        self.books_path = os.path.join(self.directory, "литература.txt")
+        self.cache_path = cache_path_for(self.books_path)
+        self.books = [{"Title": "Евгений Онегин", "Author": "Александр Пушкин", "id": 1},
+                      {"Title": "Мёртвые души", "Author": "Николай Гоголь", "id": 2}]
+        write_books(self.books_path, self.books)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def load(self):
+        # -> (книги, был ли разобран литература.txt)
+        with mock.patch.object(catalog_cache, "parse_books", wraps=catalog_cache.parse_books) as parse:
+            books = load_catalog(self.books_path)
+        return books, parse.called
+
+    def cache_header(self):
+        with open(self.cache_path, "rb") as f:
+            return CACHE_HEADER.unpack(f.read(CACHE_HEADER.size))
+
+    def test_cache_used_while_size_and_mtime_match(self):
+        self.assertEqual(self.load(), (self.books, True))
+        self.assertTrue(os.path.exists(self.cache_path))
+        self.assertEqual(self.load(), (self.books, False))
+
+    def test_changed_file_is_parsed_again(self):
+        self.load()
+        books = self.books + [{"Title": "Шинель", "Author": "Николай Гоголь", "id": 3}]
+        write_books(self.books_path, books)
+        self.assertEqual(self.load(), (books, True))
+        self.assertEqual(self.load(), (books, False))
+
+    def test_same_size_change_is_caught_by_mtime(self):
+        self.load()
+        stat = os.stat(self.books_path)
+        books = [dict(self.books[0], Title="Евгений Онегим"), self.books[1]]
+        write_books(self.books_path, books)
+        os.utime(self.books_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+        self.assertEqual(os.path.getsize(self.books_path), stat.st_size)
+        self.assertEqual(self.load(), (books, True))
+
+    def test_touched_file_rewrites_only_header(self):
+        self.load()
+        stat = os.stat(self.books_path)
+        os.utime(self.books_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+        self.assertEqual(self.load(), (self.books, False))
+        self.assertEqual(self.cache_header()[2], stat.st_mtime_ns + 10 ** 9)
+        self.assertEqual(self.load(), (self.books, False))
+
+    def test_corrupt_cache_is_ignored(self):
+        self.load()
+        with open(self.cache_path, "rb") as f:
+            blob = f.read()
+        with open(self.cache_path, "wb") as f:
+            f.write(blob[:len(blob) - 5])
+        self.assertEqual(self.load(), (self.books, True))
+        self.assertEqual(self.load(), (self.books, False))
+
+    def test_read_only_does_not_write_cache(self):
+        self.assertEqual(load_catalog(self.books_path, read_only=True), self.books)
+        self.assertFalse(os.path.exists(self.cache_path))
+
+
+if __name__ == "__main__":
+    unittest.main()
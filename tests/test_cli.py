@@ -0,0 +1,52 @@
+import io
+import shutil
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+
+from library.cli import main
+from library.core import LibraryCore, data_paths
+from library.synthetic import generate_dataset
+
+
+# =============================================================
+# Консольная проверка данных (python -m library check):
+#   python -m unittest discover tests
+# =============================================================
+class CheckTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix="library-test-")
+        generate_dataset(self.directory, students=100, books=50, seed=1, overwrite=True)
+        self.paths = data_paths(self.directory)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def check(self):
+        out = io.StringIO()
+        with redirect_stdout(out):
+            code = main(["--data", self.directory, "check"])
+        return code, out.getvalue()
+
+    def test_repeated_titles_are_not_problems(self):
+        core = LibraryCore(self.paths)
+        book = next(iter(core.books.values()))
+        core.add_book({"Title": book["Title"], "Author": book["Author"]})
+        core.close()
+        code, out = self.check()
+        self.assertEqual(code, 0, out)
+        self.assertIn("Названий с несколькими экземплярами: 1", out)
+
+    def test_dangling_loan_fails(self):
+        core = LibraryCore(self.paths)
+        st = next(st for st in core.students.values() if st["books"])
+        # Список книг ученика расходится с журналом выдач
+        core.storage.update_students([dict(st, books=st["books"] + [10 ** 6])])
+        core.close()
+        code, out = self.check()
+        self.assertEqual(code, 1, out)
+        self.assertIn("отсутствует в каталоге", out)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,104 @@
+import unittest
+
+from library.history import Change, UndoStack
+
+
+def student(student_id, last_name):
+    return {"id": student_id, "last_name": last_name}
+
+
+def change(label, *students):
+    result = Change(label)
+    for st in students:
+        result.put("students", st)
+    return result
+
+
+def undo_labels(history):
+    labels = []
+    while history.can_undo():
+        labels.append(history.undo_label())
+        history.undo()
+    return labels
+
+
+# =============================================================
+# Разница изменений и история отмены (library/history.py):
+#   python -m unittest discover tests
+# =============================================================
+class ChangeTest(unittest.TestCase):
+    def test_repeated_record_keeps_first_before(self):
+        first, second, third = student(1, "Иванов"), student(1, "Петров"), student(1, "Сидоров")
+        result = Change("правка")
+        result.put("students", second, first)
+        result.put("students", third, second)
+        self.assertEqual(result.students, {1: (first, third)})
+
+    def test_split_and_inverse(self):
+        old, new, gone = student(1, "Иванов"), student(1, "Петров"), student(2, "Сидоров")
+        result = Change("правка")
+        result.put("students", new, old)
+        result.delete("students", gone)
+        result.put("students", student(3, "Новиков"))
+        result.config = ({"classes": ["5"]}, {"classes": ["5", "6"]})
+        self.assertEqual(result.split("students"), ([new, student(3, "Новиков")], [gone]))
+        inverse = result.inverse()
+        self.assertEqual(inverse.split("students"), ([old, gone], [student(3, "Новиков")]))
+        self.assertEqual(inverse.config, ({"classes": ["5", "6"]}, {"classes": ["5"]}))
+        self.assertEqual(inverse.inverse().students, result.students)
+
+    def test_empty_change_is_false(self):
+        self.assertFalse(Change("пусто"))
+        self.assertTrue(change("ученик", student(1, "Иванов")))
+
+
+class UndoStackTest(unittest.TestCase):
+    def test_undo_redo(self):
+        history = UndoStack()
+        history.push(change("первое", student(1, "Иванов")))
+        history.push(change("второе", student(2, "Петров")))
+        self.assertEqual(history.undo().split("students"), ([], [student(2, "Петров")]))
+        self.assertEqual((history.undo_label(), history.redo_label()), ("первое", "второе"))
+        self.assertEqual(history.redo().split("students"), ([student(2, "Петров")], []))
+        self.assertFalse(history.can_redo())
+
+    def test_push_clears_redo(self):
+        history = UndoStack()
+        history.push(change("первое", student(1, "Иванов")))
+        history.push(change("второе", student(2, "Петров")))
+        history.undo()
+        history.push(change("третье", student(3, "Сидоров")))
+        self.assertFalse(history.can_redo())
+        self.assertEqual(undo_labels(history), ["третье", "первое"])
+
+    def test_max_steps_evicts_oldest(self):
+        history = UndoStack(max_steps=3)
+        for i in range(5):
+            history.push(change(str(i), student(i, "Иванов")))
+        self.assertEqual(undo_labels(history), ["4", "3", "2"])
+
+    def test_budget_evicts_oldest(self):
+        step = change("шаг", student(1, "Иванов"))
+        history = UndoStack(budget=step.size() * 2)
+        for i in range(4):
+            history.push(change(str(i), student(i, "Иванов")))
+        self.assertEqual(undo_labels(history), ["3", "2"])
+
+    def test_step_over_budget_is_not_kept(self):
+        history = UndoStack(budget=100)
+        history.push(change("большое", student(1, "Иванов" * 100)))
+        self.assertFalse(history.can_undo())
+
+    def test_redo_steps_count_until_dropped(self):
+        step = change("шаг", student(1, "Иванов"))
+        history = UndoStack(budget=step.size() * 2)
+        history.push(change("0", student(0, "Иванов")))
+        history.push(change("1", student(1, "Иванов")))
+        history.undo()
+        # Отменённый шаг сбрасывается новым, и его память освобождается
+        history.push(change("2", student(2, "Иванов")))
+        self.assertEqual(undo_labels(history), ["2", "0"])
+
+
+if __name__ == "__main__":
+    unittest.main()
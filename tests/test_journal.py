@@ -0,0 +1,176 @@
+import os
+import json
+import shutil
+import tempfile
+import unittest
+
+from library.core import LibraryCore, data_paths
+from library.journal import Journal
+from library.synthetic import generate_dataset
+
+
+def student(student_id, last_name, books=()):
+    return {"id": student_id, "last_name": last_name, "first_name": "Тест", "middle_name": "",
+            "class": "5", "parallel": "А", "books": list(books)}
+
+
+def loan(loan_id, student_id, book):
+    return {"id": loan_id, "student_id": student_id, "book": book,
+            "issued": "2024-09-01", "due": "2024-09-15", "returned": None}
+
+
+def write_lines(path, entries):
+    with open(path, "w", encoding="utf-8") as f:
+        for entry in entries:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+
+# =============================================================
+# Журнал учеников и выдач (library/journal.py):
+#   python -m unittest discover tests
+# =============================================================
+class JournalTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix="library-test-")
+        self.students_path = os.path.join(self.directory, "students.json")
+        self.loans_path = os.path.join(self.directory, "loans.json")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def journal(self, **kwargs):
+        return Journal({"student": self.students_path, "loan": self.loans_path}, **kwargs)
+
+    def load(self):
+        journal = self.journal()
+        tables = journal.load()
+        journal.wait()
+        return ({st["id"]: st for st in tables["student"]},
+                {record["id"]: record for record in tables["loan"]})
+
+    def test_change_is_one_line(self):
+        journal = self.journal()
+        journal.load()
+        journal.append({"student": [student(1, "Иванов", ["Книга"])], "loan": [loan(1, 1, "Книга")]},
+                       {"student": [], "loan": []})
+        journal.close()
+        with open(journal.journal_path, "r", encoding="utf-8") as f:
+            self.assertEqual(len(f.readlines()), 1)
+        students, loans = self.load()
+        self.assertEqual(list(students), [1])
+        self.assertEqual(list(loans), [1])
+
+    def test_torn_change_is_dropped_whole(self):
+        journal = self.journal()
+        journal.load()
+        journal.append({"student": [student(1, "Иванов")]})
+        journal.append({"student": [student(1, "Иванов", ["Книга"]), student(2, "Петров", ["Книга"])],
+                        "loan": [loan(1, 1, "Книга"), loan(2, 2, "Книга")]})
+        journal.close()
+        with open(journal.journal_path, "rb+") as f:
+            f.truncate(os.path.getsize(journal.journal_path) - 40)
+        students, loans = self.load()
+        self.assertEqual(students, {1: student(1, "Иванов")})
+        self.assertEqual(loans, {})
+
+    def test_replay_applies_changes_in_order(self):
+        journal = self.journal()
+        journal.load()
+        journal.append({"student": [student(1, "Иванов"), student(2, "Петров")]})
+        journal.append({"student": [student(1, "Иванова")]}, {"student": [student(2, "Петров")]})
+        journal.append({"student": [student(3, "Сидоров")], "loan": [loan(1, 3, "Книга")]})
+        journal.close()
+        students, loans = self.load()
+        self.assertEqual(students, {1: student(1, "Иванова"), 3: student(3, "Сидоров")})
+        self.assertEqual(list(loans), [1])
+
+    def test_torn_tail_does_not_swallow_next_change(self):
+        journal = self.journal()
+        journal.load()
+        journal.append({"student": [student(1, "Иванов")]})
+        journal.close()
+        # Сбой посреди записи: строка без конца
+        with open(journal.journal_path, "a", encoding="utf-8") as f:
+            f.write('{"op": "change", "put": {"student": [{"id": 2')
+        journal = self.journal()
+        journal.load()
+        journal.append({"student": [student(3, "Сидоров")]})
+        journal.close()
+        students, _ = self.load()
+        self.assertEqual(sorted(students), [1, 3])
+
+    def test_compaction_folds_journal_into_snapshots(self):
+        journal = self.journal(compact_bytes=1)
+        journal.load()
+        journal.append({"student": [student(1, "Иванов")], "loan": [loan(1, 1, "Книга")]})
+        journal.wait()
+        journal.append({"student": [student(2, "Петров")]})
+        journal.close()
+        with open(self.students_path, "r", encoding="utf-8") as f:
+            self.assertIn(1, [st["id"] for st in json.load(f)])
+        with open(self.loans_path, "r", encoding="utf-8") as f:
+            self.assertEqual([record["id"] for record in json.load(f)], [1])
+        self.assertFalse(os.path.exists(journal.segment_path))
+        students, loans = self.load()
+        self.assertEqual(sorted(students), [1, 2])
+        self.assertEqual(list(loans), [1])
+
+    def test_interrupted_compaction_is_finished_on_load(self):
+        journal = self.journal()
+        journal.load()
+        journal.append({"student": [student(1, "Иванов")]})
+        journal.close()
+        # Сбой после переноса журнала в сегмент, до записи снимков
+        os.replace(journal.journal_path, journal.segment_path)
+        students, _ = self.load()
+        self.assertEqual(list(students), [1])
+        self.assertFalse(os.path.exists(journal.segment_path))
+        with open(self.students_path, "r", encoding="utf-8") as f:
+            self.assertEqual([st["id"] for st in json.load(f)], [1])
+
+    def test_legacy_journals_are_read_and_folded(self):
+        with open(self.students_path, "w", encoding="utf-8") as f:
+            json.dump([student(1, "Иванов"), student(2, "Петров")], f)
+        write_lines(os.path.join(self.directory, "students.journal"),
+                    [{"op": "put", "student": student(3, "Сидоров")}, {"op": "delete", "id": 1}])
+        with open(self.loans_path, "w", encoding="utf-8") as f:
+            json.dump([loan(1, 2, "Книга")], f)
+        legacy_loans = os.path.join(self.directory, "loans.journal")
+        write_lines(legacy_loans, [{"op": "put", "loan": loan(2, 3, "Другая")}, {"op": "delete", "id": 1}])
+        students, loans = self.load()
+        self.assertEqual(sorted(students), [2, 3])
+        self.assertEqual(sorted(loans), [2])
+        # Отдельный журнал выдач свёрнут в loans.json при загрузке
+        self.assertFalse(os.path.exists(legacy_loans))
+        self.assertEqual(self.load(), (students, loans))
+
+
+class PromotionJournalTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix="library-test-")
+        generate_dataset(self.directory, students=300, books=200, seed=1, overwrite=True)
+        self.paths = data_paths(self.directory)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_torn_promotion_is_not_applied(self):
+        core = LibraryCore(self.paths)
+        students = {key: dict(st) for key, st in core.students.items()}
+        loans = dict(core.ledger.loans)
+        core.promote(core.plan_promotion())
+        core.close()
+        path = os.path.join(self.directory, "students.journal")
+        with open(path, "rb+") as f:
+            f.truncate(os.path.getsize(path) - 100)
+        core = LibraryCore(self.paths)
+        try:
+            self.assertEqual(core.students, students)
+            self.assertEqual(core.ledger.loans, loans)
+            self.assertEqual(core.check_integrity(), [])
+        finally:
+            core.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,43 @@
+import unittest
+
+from library.loans import book_copies, resolve_copies, resolve_loans
+
+
+def book(book_id, title="Война и мир", author="Толстой"):
+    return {"id": book_id, "Title": title, "Author": author}
+
+
+# =============================================================
+# Выдача экземпляров книг с одинаковым названием (library/loans.py):
+#   python -m unittest discover tests
+# =============================================================
+class CopiesTest(unittest.TestCase):
+    def setUp(self):
+        self.books = [book(1), book(2), book(3), book(4, "Мцыри", "Лермонтов")]
+        self.copies = book_copies(self.books)
+
+    def test_free_copy_is_chosen(self):
+        taken = {1}
+        self.assertEqual(resolve_copies(["Война и мир - Толстой"] * 2, self.copies, taken.__contains__), [2, 3])
+
+    def test_own_copy_is_kept(self):
+        taken = {1, 2}
+        resolved = resolve_copies(["Война и мир - Толстой", "Мцыри - Лермонтов", "Своя книга"],
+                                  self.copies, taken.__contains__, {"Война и мир - Толстой": [2]})
+        self.assertEqual(resolved, [2, 4, "Своя книга"])
+
+    def test_no_free_copy_falls_back_to_first(self):
+        taken = {1, 2, 3}
+        self.assertEqual(resolve_copies(["Война и мир - Толстой"], self.copies, taken.__contains__), [1])
+
+    def test_resolve_loans_spreads_copies(self):
+        students = [{"id": 1, "books": [1]},
+                    {"id": 2, "books": ["Война и мир - Толстой"]},
+                    {"id": 3, "books": ["Война и мир - Толстой", "Мцыри - Лермонтов"]}]
+        changed = resolve_loans(students, self.books)
+        self.assertEqual([st["id"] for st in changed], [2, 3])
+        self.assertEqual([st["books"] for st in students], [[1], [2], [3, 4]])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,84 @@
+import shutil
+import tempfile
+import unittest
+
+from library.core import LibraryCore, data_paths
+from library.promotion import GRADUATE, KEEP, apply_plan, plan_promotion
+from library.synthetic import generate_dataset
+
+
+# =============================================================
+# Перевод учеников (library/promotion.py) и его отмена через
+# LibraryCore: ученики, выдачи и архив (без окна, без Qt):
+#   python -m unittest discover tests
+# =============================================================
+class PromotionPlanTest(unittest.TestCase):
+    def test_plan(self):
+        groups = {("5", "А"): {1, 2}, ("9", "А"): {4}, ("11", "Б"): {3}, ("Выпуск", "А"): {5}}
+        plan = plan_promotion(groups, "11", overrides={1: KEEP, 4: GRADUATE})
+        self.assertEqual(plan.moves, [(2, "5", "6")])
+        self.assertEqual(plan.graduates, [3, 4])
+        self.assertEqual(plan.kept, [1])
+        self.assertEqual(len(plan), 3)
+
+    def test_last_class_is_never_promoted(self):
+        plan = plan_promotion({("11", "А"): {1}}, "11", rules={"11": "promote"})
+        self.assertEqual((plan.moves, plan.kept), ([], [1]))
+
+    def test_apply_plan_keeps_records(self):
+        students = {1: {"id": 1, "class": "5"}, 2: {"id": 2, "class": "11"}}
+        plan = plan_promotion({("5", "А"): {1}, ("11", "А"): {2}}, "11")
+        updated, removed = apply_plan(plan, students)
+        self.assertEqual(updated, [{"id": 1, "class": "6"}])
+        self.assertIs(removed[0], students[2])
+        self.assertEqual(students[1]["class"], "5")
+
+
+class PromoteTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix="library-test-")
+        generate_dataset(self.directory, students=300, books=200, seed=1, overwrite=True)
+        self.paths = data_paths(self.directory)
+        self.core = LibraryCore(self.paths)
+
+    def tearDown(self):
+        self.core.close()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def snapshot(self):
+        return {key: dict(st) for key, st in self.core.students.items()}, dict(self.core.ledger.loans)
+
+    def archived_ids(self):
+        return {entry["student"]["id"] for year in self.core.archive.years()
+                for entry in self.core.archive.read(year).values()}
+
+    def test_promote_undo_redo(self):
+        before = self.snapshot()
+        plan = self.core.plan_promotion()
+        self.assertTrue(plan.moves and plan.graduates)
+        graduate_loans = {key for key, loan in self.core.ledger.loans.items() if loan["student_id"] in plan.graduates}
+        self.core.promote(plan)
+        for student_id, _, new_cls in plan.moves:
+            self.assertEqual(self.core.students[student_id]["class"], new_cls)
+        self.assertFalse(set(plan.graduates) & set(self.core.students))
+        self.assertFalse(graduate_loans & set(self.core.ledger.loans))
+        self.assertEqual(self.archived_ids(), set(plan.graduates))
+        after = self.snapshot()
+
+        self.core.undo()
+        self.assertEqual(self.snapshot(), before)
+        self.assertEqual(self.archived_ids(), set())
+        self.assertEqual(self.core.check_integrity(), [])
+
+        self.core.redo()
+        self.assertEqual(self.snapshot(), after)
+        self.assertEqual(self.archived_ids(), set(plan.graduates))
+        self.core.close()
+        self.core = LibraryCore(self.paths)
+        self.assertEqual(self.snapshot(), after)
+        self.assertEqual(self.archived_ids(), set(plan.graduates))
+        self.assertEqual(self.core.check_integrity(), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,157 @@
+import random
+import unittest
+from unittest import mock
+
+from library import search
+from library.search import ReadersIndex, TrigramIndex, normalize
+
+LETTERS = "абвгдеё "
+NAMES = ("Иванов", "Петрова", "Сидоров", "Алёна", "Ёлкин", "Иван", "Анна", "")
+CLASSES = ("1", "5", "9", "11")
+PARALLELS = ("А", "Б")
+
+
+def random_text(rng):
+    return "".join(rng.choice(LETTERS) for _ in range(rng.randint(0, 12)))
+
+
+# =============================================================
+# Индексы поиска (library/search.py) должны находить то же,
+# что и перебор по текущим данным:
+#   python -m unittest discover tests
+# =============================================================
+class TrigramIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.rng = random.Random(1)
+        self.index = TrigramIndex()
+        self.docs = {}
+
+    def brute_force(self, query):
+        query = normalize(query)
+        return sorted(key for key, fields in self.docs.items()
+                      if query in "\n".join(map(normalize, fields)))
+
+    def queries(self):
+        for _ in range(200):
+            text = random_text(self.rng)
+            start = self.rng.randint(0, len(text))
+            yield text[start:start + self.rng.randint(1, 5)]
+        yield from ("", "а", "Ё", "ее", "е\nа")
+
+    def assertMatchesBruteForce(self):
+        for query in self.queries():
+            self.assertEqual(sorted(self.index.search(query)), self.brute_force(query), repr(query))
+
+    def add(self, key):
+        fields = (random_text(self.rng), random_text(self.rng).upper())
+        self.docs[key] = fields
+        self.index.add(key, key, *fields)
+
+    def load(self, count):
+        self.docs = {key: (random_text(self.rng), random_text(self.rng)) for key in range(count)}
+        self.index.load((key, key, fields) for key, fields in self.docs.items())
+
+    def test_load_and_search(self):
+        self.load(500)
+        self.assertMatchesBruteForce()
+
+    def test_add_and_remove(self):
+        self.load(300)
+        for _ in range(400):
+            key = self.rng.randrange(400)
+            if key in self.docs and self.rng.random() < 0.5:
+                del self.docs[key]
+                self.index.remove(key)
+            else:
+                self.add(key)
+        self.assertMatchesBruteForce()
+
+    def test_limit_returns_first_matches(self):
+        self.load(300)
+        for query in ("а", "бв", "где"):
+            self.assertEqual(self.index.search(query, limit=5), self.index.search(query)[:5])
+
+    def test_rare_short_queries(self):
+        # Короткий редкий запрос ищется по спискам триграмм, а не перебором;
+        # короткие тексты ("ж\n") триграмм не имеют
+        self.load(500)
+        for key, fields in ((500, ("ж", "")), (501, ("", "")), (502, ("бвж", "Ж")), (503, ("жж", "а"))):
+            self.docs[key] = fields
+            self.index.add(key, key, *fields)
+        for query in ("ж", "жж", "вж", "ж\n", "\n", "жа", "ъ"):
+            self.assertEqual(sorted(self.index.search(query)), self.brute_force(query), repr(query))
+            self.assertEqual(len(self.index.search(query, limit=2)), min(2, len(self.brute_force(query))))
+        self.docs.pop(500)
+        self.index.remove(500)
+        self.assertEqual(sorted(self.index.search("ж")), self.brute_force("ж"))
+
+    def test_background_build(self):
+        with mock.patch.object(search, "BACKGROUND_BUILD_MIN", 10):
+            self.load(300)
+            # Изменения во время построения попадают в новый индекс
+            for key in range(300, 320):
+                self.add(key)
+            self.index.wait()
+            self.assertMatchesBruteForce()
+            self.load(200)
+            self.index.wait()
+            self.assertMatchesBruteForce()
+
+
+class ReadersIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.rng = random.Random(1)
+        self.index = ReadersIndex()
+        self.students = {}
+
+    def random_student(self, student_id):
+        return {"id": student_id, "last_name": self.rng.choice(NAMES), "first_name": self.rng.choice(NAMES),
+                "middle_name": self.rng.choice(NAMES), "class": self.rng.choice(CLASSES),
+                "parallel": self.rng.choice(PARALLELS), "books": []}
+
+    def brute_force(self, fio, cls, par):
+        query = normalize(fio)
+        return [st for _, st in sorted(self.students.items())
+                if (cls is None or st["class"] == cls) and (par is None or st["parallel"] == par)
+                and (not query or any(query in normalize(st[field]) for field in search.NAME_FIELDS))]
+
+    def assertMatchesBruteForce(self):
+        for fio in ("", "и", "ИВАН", "ов", "ова", "але", "ёлк", "нн", "я"):
+            for cls in (None,) + CLASSES:
+                for par in (None,) + PARALLELS:
+                    self.assertEqual(self.index.search(fio, cls, par), self.brute_force(fio, cls, par),
+                                     (fio, cls, par))
+        groups = {}
+        for st in self.students.values():
+            groups.setdefault((st["class"], st["parallel"]), set()).add(st["id"])
+        self.assertEqual(self.index.class_groups(), groups)
+
+    def test_load_and_search(self):
+        self.students = {key: self.random_student(key) for key in range(300)}
+        self.index.load(self.students.values())
+        self.assertMatchesBruteForce()
+
+    def test_add_edit_remove(self):
+        self.students = {key: self.random_student(key) for key in range(200)}
+        self.index.load(self.students.values())
+        for step in range(600):
+            key = self.rng.randrange(300)
+            action = self.rng.random()
+            if key in self.students and action < 0.3:
+                self.index.remove(self.students.pop(key))
+            elif key in self.students and action < 0.6:
+                # Перевод в другой класс: имя не меняется
+                st = dict(self.students[key], **{"class": self.rng.choice(CLASSES)})
+                self.students[key] = st
+                self.index.add(st)
+            else:
+                self.students[key] = self.random_student(key)
+                self.index.add(self.students[key])
+            if step % 100 == 0:
+                self.assertMatchesBruteForce()
+        self.assertMatchesBruteForce()
+
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,77 @@
+import shutil
+import tempfile
+import unittest
+
+from library.core import LibraryCore, data_paths
+from library.stats import LibraryStats
+from library.synthetic import generate_dataset
+
+
+# =============================================================
+# Счётчики статистики, обновлённые по изменениям, должны совпадать
+# с полным пересчётом по текущим данным (без окна, без Qt):
+#   python -m unittest discover tests
+# =============================================================
+class IncrementalStatsTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix="library-test-")
+        generate_dataset(self.directory, students=300, books=200, seed=1, overwrite=True)
+        self.core = LibraryCore(data_paths(self.directory))
+        # Счётчики строятся до изменений и дальше только обновляются
+        self.stats = self.core.stats
+
+    def tearDown(self):
+        self.core.close()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def assertMatchesRecount(self):
+        full = LibraryStats()
+        full.load(self.core.students.values(), self.core.ledger.loans.values(), self.core.books.values())
+        for name in ("by_class", "by_student", "by_book", "by_author"):
+            # Counter с нулевыми значениями равен Counter без них только с 3.10
+            self.assertEqual(+getattr(self.stats, name), +getattr(full, name), name)
+        self.assertEqual(self.stats.loans_on_hand(), full.loans_on_hand())
+
+    def held_book(self):
+        return max(self.core.books.values(), key=lambda b: self.core.loans_index.count(b["id"]))
+
+    def test_add_student(self):
+        book = self.held_book()
+        self.core.add_student({"last_name": "Тестов", "first_name": "Тест", "middle_name": "",
+                               "class": "5", "parallel": "А", "books": [book["id"], "Книга не из каталога"]})
+        self.assertMatchesRecount()
+
+    def test_edit_student(self):
+        st = next(st for st in self.core.students.values() if st["books"])
+        book = self.held_book()
+        self.core.update_student(st, dict(st, **{"class": "9", "books": st["books"][1:] + [book["id"]]}))
+        self.assertMatchesRecount()
+
+    def test_delete_student(self):
+        st = next(st for st in self.core.students.values() if st["books"])
+        self.core.delete_student(st)
+        self.assertMatchesRecount()
+
+    def test_edit_book(self):
+        book = self.held_book()
+        self.core.update_book(book, {"Title": book["Title"], "Author": "Другой Автор"})
+        self.assertMatchesRecount()
+
+    def test_delete_book(self):
+        self.core.delete_book(self.held_book())
+        self.assertMatchesRecount()
+
+    def test_promotion(self):
+        self.core.promote(self.core.plan_promotion())
+        self.assertMatchesRecount()
+
+    def test_undo_redo(self):
+        self.core.delete_book(self.held_book())
+        self.core.promote(self.core.plan_promotion())
+        for step in (self.core.undo, self.core.undo, self.core.redo, self.core.redo):
+            step()
+            self.assertMatchesRecount()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,50 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from library.core import data_paths
+from library.storage import SqliteStorage, Storage, migrate_files_to_sqlite
+from library.synthetic import generate_dataset
+
+
+# =============================================================
+# Хранилища (library/storage.py):
+#   python -m unittest discover tests
+# =============================================================
+class StorageInterfaceTest(unittest.TestCase):
+    def test_incomplete_storage_is_not_created(self):
+        class BooksOnly(Storage):
+            def load_books(self):
+                return []
+
+        with self.assertRaises(TypeError):
+            BooksOnly()
+
+
+class ReadOnlySqliteTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix="library-test-")
+        generate_dataset(self.directory, students=50, books=40, seed=1, overwrite=True)
+        paths = data_paths(self.directory)
+        self.db_path = os.path.join(self.directory, "library.db")
+        migrate_files_to_sqlite(paths["students"], paths["books"], self.db_path)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_next_ids_and_writes(self):
+        storage = SqliteStorage(self.db_path, read_only=True)
+        try:
+            students = storage.load_students()
+            books = storage.load_books()
+            self.assertEqual(storage.new_student_id(), max(st["id"] for st in students) + 1)
+            self.assertEqual(storage.new_book_id(), max(b["id"] for b in books) + 1)
+            with self.assertRaises(RuntimeError):
+                storage.update_students(students[:1])
+        finally:
+            storage.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,38 @@
+import unittest
+
+from library.writer import WriteBehindSaver
+
+
+# =============================================================
+# Порядок отложенной записи (library/writer.py):
+#   python -m unittest discover tests
+# =============================================================
+class WriteOrderTest(unittest.TestCase):
+    def setUp(self):
+        self.written = []
+        # Большая задержка: всё ставится в очередь до первой записи
+        self.saver = WriteBehindSaver(delay=10)
+
+    def tearDown(self):
+        self.saver.close()
+
+    def job(self, name):
+        return lambda: self.written.append(name)
+
+    def test_rewrite_moves_to_end(self):
+        self.saver.schedule("books", self.job("books 1"))
+        self.saver.submit(self.job("line"))
+        self.saver.schedule("books", self.job("books 2"))
+        self.saver.flush()
+        self.assertEqual(self.written, ["line", "books 2"])
+
+    def test_append_keeps_first_position(self):
+        self.saver.schedule("journal", self.job("journal 1"), keep_order=True)
+        self.saver.schedule("books", self.job("books"))
+        self.saver.schedule("journal", self.job("journal 1+2"), keep_order=True)
+        self.saver.flush()
+        self.assertEqual(self.written, ["journal 1+2", "books"])
+
+
+if __name__ == "__main__":
+    unittest.main()
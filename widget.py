@@ -1,20 +1,35 @@
 import sys
 import os
-import json
-import re
+import threading
+from datetime import date
 from PyQt6.QtWidgets import (
     QApplication, QWidget, QVBoxLayout, QHBoxLayout, QPushButton, QLabel,
     QComboBox, QDialog, QFormLayout, QMessageBox, QLineEdit, QCompleter, QStyle,
     QSizePolicy, QStackedWidget, QTableWidget, QTableWidgetItem, QListWidget,
-    QGroupBox, QHeaderView
+    QGroupBox, QHeaderView, QTableView, QAbstractItemView, QStyledItemDelegate, QCheckBox, QFileDialog
 )
-from PyQt6.QtCore import Qt, QTimer
+from PyQt6.QtCore import Qt, QTimer, pyqtSignal, QAbstractTableModel, QModelIndex, QStringListModel
+from PyQt6.QtGui import QColor, QKeySequence, QShortcut
+
+from library.archive import REASON_NAMES, entry_debts, entry_matches
+from library.core import CommitError, LibraryCore, data_paths
+from library.formats import book_display
+from library.loans import book_copies, resolve_copies
+from library.ledger import today_iso, week_bounds
+from library.lock import DataLockedError
+from library.profiling import ENV_VAR, profiler
+from library.progressive import ProgressiveScheduler
+from library.promotion import (
+    ACTION_NAMES, GRADUATE, KEEP, PROMOTE, ambiguous_classes, default_rules, plan_promotion
+)
+from library.search import normalize
+from library.trace import TraceRecorder, trace_path
+from library.watchdog import STALL_THRESHOLD_MS, StallWatchdog
+from library.writer import WriteBehindSaver
 
 # Абсолютные пути для файлов (находятся в той же папке, что и этот файл)
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-config_path = os.path.join(BASE_DIR, "config.json")
-books_path = os.path.join(BASE_DIR, "литература.txt")
-students_path = os.path.join(BASE_DIR, "students.json")
+paths = data_paths(BASE_DIR)
 
 if getattr(sys, 'frozen', False):
     BASE_DIR = os.path.dirname(sys.executable)
@@ -22,14 +37,41 @@ else:
     BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 
 
+# =============================================================
+# Подсказки при вводе книги: первые совпадения из поискового индекса
+# =============================================================
+class BookCompleter(QCompleter):
+    # Сам QCompleter ничего не фильтрует: при каждом изменении текста
+    # его модель заменяется первыми MAX_SUGGESTIONS найденными книгами
+    MAX_SUGGESTIONS = 50
+
+    def __init__(self, search, parent=None):
+        super().__init__(parent)
+        # search(query, limit) -> список строк "Название - Автор"
+        self.search = search
+        self.suggestions = QStringListModel(self)
+        self.setModel(self.suggestions)
+        self.setCompletionMode(QCompleter.CompletionMode.UnfilteredPopupCompletion)
+
+    def update_suggestions(self, text):
+        self.suggestions.setStringList(self.search(text, self.MAX_SUGGESTIONS) if text.strip() else [])
+        if self.suggestions.rowCount():
+            self.complete()
+        else:
+            self.popup().hide()
+
+
 # =============================================================
 # Диалог для добавления/редактирования ученика с выбором книг
 # =============================================================
 class StudentDialog(QDialog):
-    def __init__(self, parent=None, student_data=None, books_list=None, classes_list=None, parallels_list=None):
+    def __init__(self, parent=None, student_data=None, books_model=None, book_search=None,
+                 classes_list=None, parallels_list=None):
         super().__init__(parent)
         self.student_data = student_data
-        self.books_list = books_list if books_list is not None else []
+        # Общая для всех диалогов модель списка книг (см. LibraryApp.get_book_choices)
+        self.books_model = books_model if books_model is not None else QStringListModel(self)
+        self.book_search = book_search if book_search is not None else (lambda query, limit: [])
         self.classes_list = classes_list if classes_list is not None else []
         self.parallels_list = parallels_list if parallels_list is not None else []
         # Каждый элемент хранится как кортеж (container, combo, delete_btn)
@@ -108,10 +150,16 @@ class StudentDialog(QDialog):
         combo = QComboBox()
         combo.setEditable(True)
         combo.setSizePolicy(QSizePolicy.Policy.Expanding, QSizePolicy.Policy.Preferred)
-        combo.addItems(self.books_list)
-        completer = QCompleter(self.books_list)
-        completer.setCaseSensitivity(Qt.CaseSensitivity.CaseInsensitive)
+        # Введённый текст не добавляется в общую модель, а ширина поля
+        # не вычисляется по всем строкам каталога
+        combo.setInsertPolicy(QComboBox.InsertPolicy.NoInsert)
+        combo.setSizeAdjustPolicy(QComboBox.SizeAdjustPolicy.AdjustToMinimumContentsLengthWithIcon)
+        combo.setMinimumContentsLength(30)
+        combo.setModel(self.books_model)
+        combo.view().setUniformItemSizes(True)
+        completer = BookCompleter(self.book_search, combo)
         combo.setCompleter(completer)
+        combo.lineEdit().textEdited.connect(completer.update_suggestions)
         combo.setCurrentText(initial_text)
         h_layout.addWidget(combo)
 
@@ -161,9 +209,10 @@ class StudentDialog(QDialog):
 # Диалог для добавления книги
 # =============================================================
 class BookDialog(QDialog):
-    def __init__(self, parent=None):
+    def __init__(self, parent=None, book_data=None):
         super().__init__(parent)
-        self.setWindowTitle("Добавить книгу")
+        self.book_data = book_data
+        self.setWindowTitle("Изменить книгу" if book_data else "Добавить книгу")
         self._init_ui()
 
     def _init_ui(self):
@@ -175,6 +224,9 @@ class BookDialog(QDialog):
         self.author_edit.setSizePolicy(QSizePolicy.Policy.Expanding, QSizePolicy.Policy.Preferred)
         layout.addRow("Название:", self.title_edit)
         layout.addRow("Автор:", self.author_edit)
+        if self.book_data:
+            self.title_edit.setText(self.book_data.get("Title", ""))
+            self.author_edit.setText(self.book_data.get("Author", ""))
         btn_layout = QHBoxLayout()
         cancel_btn = QPushButton("Отмена")
         cancel_btn.clicked.connect(self.reject)
@@ -195,130 +247,692 @@ class BookDialog(QDialog):
 # Диалог для обработки неоднозначных учеников при сдвиге
 # =============================================================
 class AmbiguousShiftDialog(QDialog):
-    def __init__(self, ambiguous_students, last_class, parent=None):
+    # Решения по отдельным ученикам 9 и последнего класса. Записи учеников
+    # не меняются: результат — self.decisions (id ученика -> действие).
+    # Таблица построена на модели, редактор решения создаётся только
+    # для ячейки, которую редактируют, поэтому размер выпуска не важен.
+    # Подтверждение выпуска запрашивает PromotionDialog, один раз.
+    def __init__(self, ambiguous_students, last_class, decisions=None, parent=None):
         super().__init__(parent)
         self.setWindowTitle("Выбор для неоднозначных учеников")
         self.ambiguous_students = ambiguous_students  # список ссылок на объекты учеников из self.students
         self.last_class = last_class
-        self.decisions = {}  # для каждого ученика: "shift" или "delete"
+        self.decisions = dict(decisions or {})  # для каждого ученика: PROMOTE, GRADUATE или KEEP
         self._init_ui()
 
     def _init_ui(self):
         layout = QVBoxLayout(self)
-        info_label = QLabel("Для следующих учеников выбор неоднозначен. Выберите действие для каждого:")
+        info_label = QLabel("Решение меняется двойным щелчком по ячейке или кнопками ниже "
+                            "для выбранных строк либо для целого класса.")
         layout.addWidget(info_label)
-        self.table = QTableWidget(len(self.ambiguous_students), 4)
-        self.table.setHorizontalHeaderLabels(["ФИО", "Класс", "Перевести", "Удалить"])
-        self.table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Stretch)
-        for row, st in enumerate(self.ambiguous_students):
-            fio = f'{st.get("last_name", "")} {st.get("first_name", "")} {st.get("middle_name", "")}'
-            self.table.setItem(row, 0, QTableWidgetItem(fio))
-            self.table.setItem(row, 1, QTableWidgetItem(st.get("class", "")))
-            btn_shift = QPushButton("Перевести")
-            btn_delete = QPushButton("Удалить")
-            btn_shift.setFocusPolicy(Qt.FocusPolicy.NoFocus)
-            btn_delete.setFocusPolicy(Qt.FocusPolicy.NoFocus)
-            if st.get("class", "") == self.last_class:
-                btn_shift.setEnabled(False)
-            btn_shift.clicked.connect(lambda checked, r=row: self.set_decision(r, "shift"))
-            btn_delete.clicked.connect(lambda checked, r=row: self.on_delete_clicked(r))
-            self.table.setCellWidget(row, 2, btn_shift)
-            self.table.setCellWidget(row, 3, btn_delete)
+        self.model = DecisionsTableModel({st["id"]: st for st in self.ambiguous_students},
+                                         self.decisions, self.last_class, self)
+        self.model.set_rows(self.ambiguous_students)
+        self.model.dataChanged.connect(lambda: self.check_all_decisions_set())
+        self.table = make_table_view(self.model)
+        self.table.setSelectionMode(QAbstractItemView.SelectionMode.ExtendedSelection)
+        self.table.setItemDelegateForColumn(DecisionsTableModel.DECISION_COLUMN, DecisionDelegate(self.table))
         layout.addWidget(self.table)
+
+        selected_layout = QHBoxLayout()
+        selected_layout.addWidget(QLabel("Выбранным:"))
+        for action in (PROMOTE, GRADUATE, KEEP):
+            btn = QPushButton(ACTION_NAMES[action])
+            btn.clicked.connect(lambda _, a=action: self.apply_to_selected(a))
+            selected_layout.addWidget(btn)
+        selected_layout.addStretch()
+        layout.addLayout(selected_layout)
+
+        classes = sorted({st.get("class", "") for st in self.ambiguous_students}, key=int)
+        for cls in classes:
+            class_layout = QHBoxLayout()
+            class_layout.addWidget(QLabel(f"Всем из {cls} класса:"))
+            for action in self.model.allowed_actions({"class": cls}):
+                btn = QPushButton(ACTION_NAMES[action])
+                btn.clicked.connect(lambda _, c=cls, a=action: self.apply_to_class(c, a))
+                class_layout.addWidget(btn)
+            class_layout.addStretch()
+            layout.addLayout(class_layout)
+
         btn_layout = QHBoxLayout()
         self.apply_btn = QPushButton("Применить")
-        self.apply_btn.clicked.connect(self.on_apply)
+        self.apply_btn.clicked.connect(self.accept)
         self.cancel_btn = QPushButton("Отмена")
         self.cancel_btn.clicked.connect(self.reject)
         btn_layout.addStretch()
         btn_layout.addWidget(self.cancel_btn)
         btn_layout.addWidget(self.apply_btn)
         layout.addLayout(btn_layout)
+        self.resize(800, 500)
         self.check_all_decisions_set()
 
-    def set_decision(self, row, decision):
-        self.decisions[row] = decision
-        for col in range(self.table.columnCount()):
-            item = self.table.item(row, col)
-            if item:
-                item.setBackground(Qt.GlobalColor.lightGray)
-        self.check_all_decisions_set()
+    def apply_to_selected(self, action):
+        rows = [index.row() for index in self.table.selectionModel().selectedRows()]
+        self.model.set_decisions(rows, action)
 
-    def on_delete_clicked(self, row):
-        msgBox = QMessageBox(self)
-        msgBox.setWindowTitle("Подтверждение удаления")
-        msgBox.setText("Вы уверены, ведь удалиться и долг ученика?")
-        yesButton = msgBox.addButton("Да", QMessageBox.ButtonRole.YesRole)
-        noButton = msgBox.addButton("Нет", QMessageBox.ButtonRole.NoRole)
-        msgBox.exec()
-        if msgBox.clickedButton() == yesButton:
-            self.set_decision(row, "delete")
+    def apply_to_class(self, cls, action):
+        rows = [row for row, st in enumerate(self.ambiguous_students) if st.get("class", "") == cls]
+        self.model.set_decisions(rows, action)
 
     def check_all_decisions_set(self):
-        self.apply_btn.setEnabled(len(self.decisions) == len(self.ambiguous_students))
+        self.apply_btn.setEnabled(all(st["id"] in self.decisions for st in self.ambiguous_students))
+
+
+class DecisionDelegate(QStyledItemDelegate):
+    # Выпадающий список допустимых решений для одной ячейки
+    def createEditor(self, parent, option, index):
+        model = index.model()
+        combo = QComboBox(parent)
+        for action in model.allowed_actions(model.records[model.record_id(index.row())]):
+            combo.addItem(ACTION_NAMES[action], action)
+        return combo
+
+    def setEditorData(self, editor, index):
+        editor.setCurrentIndex(max(0, editor.findData(index.data(Qt.ItemDataRole.EditRole))))
+
+    def setModelData(self, editor, model, index):
+        model.setData(index, editor.currentData(), Qt.ItemDataRole.EditRole)
+
+
+# =============================================================
+# Перевод в следующий класс: правила по классам и просмотр плана
+# =============================================================
+class PromotionDialog(QDialog):
+    # План строится заново при каждом изменении правил (см. library/promotion.py);
+    # ученики не меняются, пока план не применён
+    def __init__(self, students, groups, last_class, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Перевод в следующий класс")
+        self.students = students
+        self.groups = groups
+        self.last_class = last_class
+        self.rules = default_rules(last_class)
+        self.overrides = {}
+        self.plan = None
+        self._init_ui()
+        self.recompute()
+
+    def _init_ui(self):
+        layout = QVBoxLayout(self)
+        rules_layout = QFormLayout()
+        self.rule_combos = {}
+        present = {cls for cls, _ in self.groups}
+        for cls in sorted(ambiguous_classes(self.last_class) & present, key=int):
+            combo = QComboBox()
+            actions = [GRADUATE, KEEP] if cls == self.last_class else [PROMOTE, GRADUATE, KEEP]
+            for action in actions:
+                combo.addItem(ACTION_NAMES[action], action)
+            combo.setCurrentIndex(combo.findData(self.rules[cls]))
+            combo.currentIndexChanged.connect(lambda _, c=cls: self.on_rule_changed(c))
+            rules_layout.addRow(f"Все ученики {cls} класса:", combo)
+            self.rule_combos[cls] = combo
+        layout.addLayout(rules_layout)
+
+        exceptions_btn = QPushButton("Решения по отдельным ученикам...")
+        exceptions_btn.setEnabled(bool(self.rule_combos))
+        exceptions_btn.clicked.connect(self.edit_exceptions)
+        layout.addWidget(exceptions_btn)
+
+        self.summary_label = QLabel()
+        layout.addWidget(self.summary_label)
+        self.model = PromotionTableModel(self.students, self)
+        layout.addWidget(make_table_view(self.model))
+
+        btn_layout = QHBoxLayout()
+        cancel_btn = QPushButton("Отмена")
+        cancel_btn.clicked.connect(self.reject)
+        apply_btn = QPushButton("Применить")
+        apply_btn.clicked.connect(self.on_apply)
+        btn_layout.addStretch()
+        btn_layout.addWidget(cancel_btn)
+        btn_layout.addWidget(apply_btn)
+        layout.addLayout(btn_layout)
+        self.resize(800, 500)
+
+    def on_rule_changed(self, cls):
+        self.rules[cls] = self.rule_combos[cls].currentData()
+        self.recompute()
+
+    def edit_exceptions(self):
+        ids = sorted(key for (cls, _), ids in self.groups.items() if cls in self.rule_combos for key in ids)
+        students = [self.students[key] for key in ids]
+        decisions = {st["id"]: self.overrides.get(st["id"], self.rules[st["class"]]) for st in students}
+        dlg = AmbiguousShiftDialog(students, self.last_class, decisions, parent=self)
+        if dlg.exec() == QDialog.DialogCode.Accepted:
+            # Запоминаются только отличия от правила класса
+            self.overrides = {key: action for key, action in dlg.decisions.items()
+                              if action != self.rules[self.students[key]["class"]]}
+            self.recompute()
+
+    def recompute(self):
+        self.plan = plan_promotion(self.groups, self.last_class, self.rules, self.overrides)
+        self.model.set_plan(self.plan)
+        self.summary_label.setText(
+            f"Переводятся: {len(self.plan.moves)}, выпускаются: {len(self.plan.graduates)}, "
+            f"остаются: {len(self.plan.kept)}")
 
     def on_apply(self):
-        for row, st in enumerate(self.ambiguous_students):
-            decision = self.decisions.get(row)
-            if decision == "shift":
-                if st.get("class", "").isdigit():
-                    st["class"] = str(int(st["class"]) + 1)
-            elif decision == "delete":
-                st["to_delete"] = True
+        if self.plan.graduates:
+            reply = QMessageBox.question(
+                self, "Подтверждение",
+                f"Выпускаемые ученики ({len(self.plan.graduates)}) будут перенесены в архив "
+                f"вместе с их долгами. Продолжить?")
+            if reply != QMessageBox.StandardButton.Yes:
+                return
         self.accept()
 
 
+# =============================================================
+# Архив выпускников и удалённых учеников
+# =============================================================
+class ArchiveDialog(QDialog):
+    # Архив не входит в рабочий набор: части по годам читаются
+    # при первом поиске и хранятся, только пока открыт диалог.
+    # Список лет и части читаются в фоновом потоке (archive.years()
+    # дожидается записи, а распаковка года может быть долгой), а
+    # просмотр записей идёт порциями (library/progressive.py).
+    # Новый поиск отменяет незаконченный. После закрытия диалога
+    # потоки ничего в него не доставляют, а порции не выполняются
+    MAX_ROWS = 1000
+    # Результаты фонового чтения доставляются в GUI-поток
+    years_loaded = pyqtSignal(object)
+    # (номер поиска, {год: записи})
+    partitions_loaded = pyqtSignal(int, object)
+
+    def __init__(self, archive, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Архив учеников")
+        self.archive = archive
+        self.years = None
+        self.partitions = {}
+        self.scheduler = ProgressiveScheduler(lambda fn: QTimer.singleShot(0, fn))
+        self.search_number = 0
+        self.query = None
+        self.waiting_for_years = False
+        self.found = 0
+        self.pending_rows = []
+        self.workers = []
+        self.closed = False
+        # Проверка closed и отправка сигнала потоком идут под одной блокировкой
+        self.deliver_lock = threading.Lock()
+        self.years_loaded.connect(self.on_years_loaded)
+        self.partitions_loaded.connect(self.on_partitions_loaded)
+        self._init_ui()
+        self.run_in_background(self.archive.years, self.years_loaded.emit)
+
+    def _init_ui(self):
+        layout = QVBoxLayout(self)
+        search_layout = QHBoxLayout()
+        search_layout.addWidget(QLabel("ФИО:"))
+        self.fio_edit = QLineEdit()
+        self.fio_edit.setPlaceholderText("Введите ФИО...")
+        self.fio_edit.returnPressed.connect(self.search)
+        search_layout.addWidget(self.fio_edit)
+        search_layout.addWidget(QLabel("Год:"))
+        self.year_combo = QComboBox()
+        self.year_combo.addItem("Все")
+        search_layout.addWidget(self.year_combo)
+        self.debts_check = QCheckBox("Только с долгами")
+        search_layout.addWidget(self.debts_check)
+        search_btn = QPushButton("Найти")
+        search_btn.clicked.connect(self.search)
+        search_layout.addWidget(search_btn)
+        layout.addLayout(search_layout)
+
+        self.table = QTableWidget(0, 5)
+        self.table.setHorizontalHeaderLabels(["ФИО", "Класс", "В архиве с", "Причина", "Долги"])
+        self.table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Stretch)
+        self.table.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+        layout.addWidget(self.table)
+
+        status_layout = QHBoxLayout()
+        status_layout.addStretch()
+        self.status_label = QLabel("Введите запрос и нажмите «Найти»")
+        status_layout.addWidget(self.status_label)
+        layout.addLayout(status_layout)
+        self.resize(800, 500)
+
+    def run_in_background(self, job, deliver):
+        # deliver(результат job()) вызывается в потоке, если диалог ещё открыт
+        def run():
+            try:
+                result = job()
+                with self.deliver_lock:
+                    if not self.closed:
+                        deliver(result)
+            except Exception as e:
+                print("Ошибка чтения архива:", e)
+        worker = threading.Thread(target=run, daemon=True)
+        self.workers = [w for w in self.workers if w.is_alive()] + [worker]
+        worker.start()
+
+    def wait_background(self):
+        # Дождаться фонового чтения (воспроизведение сценариев); результаты
+        # доставляются при следующей обработке событий
+        for worker in self.workers:
+            worker.join()
+        self.workers = []
+
+    def on_years_loaded(self, years):
+        if self.closed:
+            # Сигнал отправлен до закрытия, а доставлен после
+            return
+        self.years = years
+        self.year_combo.addItems([str(year) for year in years])
+        if self.waiting_for_years:
+            self.waiting_for_years = False
+            self.search()
+
+    def search(self):
+        if self.years is None:
+            self.waiting_for_years = True
+            self.status_label.setText("Загрузка архива...")
+            return
+        if self.year_combo.currentIndex() == 0:
+            years = self.years
+        else:
+            years = [int(self.year_combo.currentText())]
+        self.scheduler.cancel("archive")
+        self.search_number += 1
+        number = self.search_number
+        self.query = (years, normalize(self.fio_edit.text()), self.debts_check.isChecked())
+        self.table.setRowCount(0)
+        self.found = 0
+        self.pending_rows = []
+        self.status_label.setText("Поиск...")
+        missing = [year for year in years if year not in self.partitions]
+        self.run_in_background(lambda: {year: list(self.archive.read(year).values()) for year in missing},
+                               lambda loaded: self.partitions_loaded.emit(number, loaded))
+
+    def on_partitions_loaded(self, number, loaded):
+        self.partitions.update(loaded)
+        if number != self.search_number:
+            # Пока части читались, начат другой поиск
+            return
+        years, query, debts_only = self.query
+        self.scheduler.start("archive", (entry for year in years for entry in self.partitions[year]),
+                             lambda entry: self.collect(entry, query, debts_only),
+                             self.show_found, lambda: self.show_found(done=True), self.on_search_failed)
+
+    def on_search_failed(self, error):
+        self.show_found(done=True)
+        self.status_label.setText(f"Ошибка поиска: {error}")
+
+    def collect(self, entry, query, debts_only):
+        if entry_matches(entry, query, debts_only):
+            self.found += 1
+            if self.found <= self.MAX_ROWS:
+                self.pending_rows.append(entry)
+
+    def show_found(self, done=False):
+        rows, self.pending_rows = self.pending_rows, []
+        start = self.table.rowCount()
+        self.table.setRowCount(start + len(rows))
+        for i, entry in enumerate(rows, start):
+            st = entry["student"]
+            debts = entry_debts(entry)
+            values = [
+                f'{st.get("last_name", "")} {st.get("first_name", "")} {st.get("middle_name", "")}',
+                f'{st.get("class", "")}{st.get("parallel", "")}',
+                entry["archived"],
+                REASON_NAMES.get(entry["reason"], entry["reason"]),
+                f'{len(debts)}: {", ".join(loan["book"] for loan in debts)}' if debts else "",
+            ]
+            for col, value in enumerate(values):
+                self.table.setItem(i, col, QTableWidgetItem(value))
+        status = f"Найдено: {self.found}"
+        if self.found > self.MAX_ROWS:
+            status += f" (показаны первые {self.MAX_ROWS})"
+        if not done:
+            status += ", поиск..."
+        self.status_label.setText(status)
+
+    def stop_background(self):
+        with self.deliver_lock:
+            self.closed = True
+        self.scheduler.cancel("archive")
+        # Части, прочитанные после закрытия, не запустят поиск
+        self.search_number += 1
+        self.waiting_for_years = False
+
+    def done(self, result):
+        self.stop_background()
+        super().done(result)
+
+    def closeEvent(self, event):
+        # Закрытие ещё не показанного диалога проходит мимо done()
+        self.stop_background()
+        super().closeEvent(event)
+
+
+# =============================================================
+# Модели таблиц: ячейки запрашиваются только для видимой части
+# =============================================================
+class RecordsTableModel(QAbstractTableModel):
+    # Строка таблицы хранит только id записи, а сама запись берётся из
+    # общего словаря id -> запись (LibraryApp.students / LibraryApp.books).
+    # Id строки доступен через роль UserRole и record_id(row).
+    HEADERS = []
+    FIELDS = []
+
+    def __init__(self, records, parent=None):
+        super().__init__(parent)
+        self.records = records
+        self.ids = []
+
+    def set_rows(self, rows):
+        # Фильтрация подменяет список строк целиком
+        self.beginResetModel()
+        self.ids = [r["id"] for r in rows]
+        self.endResetModel()
+
+    def record_id(self, row):
+        return self.ids[row] if 0 <= row < len(self.ids) else None
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.ids)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.HEADERS)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        if role == Qt.ItemDataRole.UserRole:
+            return self.ids[index.row()]
+        if role != Qt.ItemDataRole.DisplayRole:
+            return None
+        record = self.records.get(self.ids[index.row()])
+        if record is None:
+            return None
+        return self.display(record, index.row(), index.column())
+
+    def refresh_column(self, column):
+        # Значения столбца пересчитываются для видимых строк, без сброса модели
+        if self.ids:
+            self.dataChanged.emit(self.index(0, column), self.index(len(self.ids) - 1, column))
+
+    def display(self, record, row, column):
+        return record.get(self.FIELDS[column], "")
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if role == Qt.ItemDataRole.DisplayRole and orientation == Qt.Orientation.Horizontal:
+            return self.HEADERS[section]
+        return super().headerData(section, orientation, role)
+
+
+class StudentsTableModel(RecordsTableModel):
+    HEADERS = ["Id", "Фамилия", "Имя", "Отчество", "Класс", "Параллель", "Книги"]
+    FIELDS = [None, "last_name", "first_name", "middle_name", "class", "parallel", "books"]
+    BOOKS_COLUMN = 6
+
+    def __init__(self, records, loan_display, parent=None):
+        super().__init__(records, parent)
+        # loan_display(entry) -> строка для id книги или книги не из каталога
+        self.loan_display = loan_display
+
+    def display(self, record, row, column):
+        if column == 0:
+            return str(row + 1)
+        if column == self.BOOKS_COLUMN:
+            return ", ".join(map(self.loan_display, record.get("books", [])))
+        return super().display(record, row, column)
+
+
+class BooksTableModel(RecordsTableModel):
+    HEADERS = ["Название", "Автор", "Выдано"]
+    FIELDS = ["Title", "Author", None]
+    HOLDERS_COLUMN = 2
+
+    def __init__(self, search, records, holders_count, parent=None):
+        super().__init__(records, parent)
+        # search(query) -> список книг, например TrigramIndex.search
+        self.search = search
+        # holders_count(book_id) -> сколько читателей держат книгу
+        self.holders_count = holders_count
+        self.query = ""
+
+    def display(self, record, row, column):
+        if column == self.HOLDERS_COLUMN:
+            return str(self.holders_count(record["id"]))
+        return super().display(record, row, column)
+
+    def set_filter(self, query):
+        self.query = query
+        self.set_rows(self.search(query))
+
+    def refilter(self):
+        self.set_filter(self.query)
+
+
+class DecisionsTableModel(RecordsTableModel):
+    HEADERS = ["Фамилия", "Имя", "Отчество", "Класс", "Решение"]
+    FIELDS = ["last_name", "first_name", "middle_name", None, None]
+    DECISION_COLUMN = 4
+
+    def __init__(self, records, decisions, last_class, parent=None):
+        super().__init__(records, parent)
+        # decisions: id ученика -> действие; изменяется на месте
+        self.decisions = decisions
+        self.last_class = last_class
+
+    def allowed_actions(self, record):
+        # Из последнего класса переводить некуда
+        if record.get("class", "") == self.last_class:
+            return [GRADUATE, KEEP]
+        return [PROMOTE, GRADUATE, KEEP]
+
+    def display(self, record, row, column):
+        if column == 3:
+            return record.get("class", "") + record.get("parallel", "")
+        if column == self.DECISION_COLUMN:
+            return ACTION_NAMES.get(self.decisions.get(record["id"]), "")
+        return super().display(record, row, column)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if role == Qt.ItemDataRole.EditRole and index.isValid():
+            return self.decisions.get(self.ids[index.row()])
+        if role == Qt.ItemDataRole.BackgroundRole and index.isValid():
+            if self.decisions.get(self.ids[index.row()]) == GRADUATE:
+                return QColor(Qt.GlobalColor.lightGray)
+            return None
+        return super().data(index, role)
+
+    def flags(self, index):
+        flags = super().flags(index)
+        if index.column() == self.DECISION_COLUMN:
+            flags |= Qt.ItemFlag.ItemIsEditable
+        return flags
+
+    def setData(self, index, value, role=Qt.ItemDataRole.EditRole):
+        if role != Qt.ItemDataRole.EditRole or index.column() != self.DECISION_COLUMN:
+            return False
+        record = self.records.get(self.ids[index.row()])
+        if record is None or value not in self.allowed_actions(record):
+            return False
+        self.decisions[record["id"]] = value
+        self.dataChanged.emit(self.index(index.row(), 0), self.index(index.row(), len(self.HEADERS) - 1))
+        return True
+
+    def set_decisions(self, rows, action):
+        # Одно решение для многих строк; недопустимое для строки пропускается
+        for row in rows:
+            record = self.records.get(self.record_id(row))
+            if record is not None and action in self.allowed_actions(record):
+                self.decisions[record["id"]] = action
+        if self.ids:
+            self.dataChanged.emit(self.index(0, 0), self.index(len(self.ids) - 1, len(self.HEADERS) - 1))
+
+
+class PromotionTableModel(RecordsTableModel):
+    HEADERS = ["Фамилия", "Имя", "Отчество", "Сейчас", "Станет"]
+    FIELDS = ["last_name", "first_name", "middle_name", None, None]
+
+    def __init__(self, records, parent=None):
+        super().__init__(records, parent)
+        self.targets = {}
+
+    def set_plan(self, plan):
+        targets = {}
+        for student_id, _, new_cls in plan.moves:
+            targets[student_id] = new_cls + self.records[student_id].get("parallel", "")
+        for student_id in plan.graduates:
+            targets[student_id] = "выпуск"
+        for student_id in plan.kept:
+            targets[student_id] = "остаётся"
+        self.targets = targets
+        self.set_rows([self.records[key] for key in sorted(targets)])
+
+    def display(self, record, row, column):
+        if column == 3:
+            return record.get("class", "") + record.get("parallel", "")
+        if column == 4:
+            return self.targets.get(record["id"], "")
+        return super().display(record, row, column)
+
+
+class LoansTableModel(RecordsTableModel):
+    HEADERS = ["Ученик", "Класс", "Книга", "Выдана", "Срок", "Просрочено, дн."]
+    FIELDS = [None, None, None, "issued", "due", None]
+    BOOK_COLUMN = 2
+
+    def __init__(self, records, students, loan_display, parent=None):
+        super().__init__(records, parent)
+        self.students = students
+        self.loan_display = loan_display
+        self.today = date.today()
+
+    def set_rows(self, rows):
+        self.today = date.today()
+        super().set_rows(rows)
+
+    def display(self, record, row, column):
+        if column == 0 or column == 1:
+            st = self.students.get(record["student_id"], {})
+            if column == 0:
+                return " ".join(st.get(field, "") for field in ("last_name", "first_name", "middle_name"))
+            return st.get("class", "") + st.get("parallel", "")
+        if column == self.BOOK_COLUMN:
+            return self.loan_display(record["book"])
+        if column == 5:
+            days = (self.today - date.fromisoformat(record["due"])).days
+            return str(days) if days > 0 else ""
+        return super().display(record, row, column)
+
+
+def make_table_view(model):
+    view = QTableView()
+    view.setModel(model)
+    view.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
+    view.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Stretch)
+    # Одинаковая высота строк: прокрутка не измеряет каждую строку
+    view.verticalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Fixed)
+    return view
+
+
 # =============================================================
 # Главный класс приложения
 # =============================================================
 class LibraryApp(QWidget):
+    # Сообщение об ошибке из потока записи (доставляется в GUI-поток)
+    save_failed = pyqtSignal(str)
+    # Длительность остановки окна, мс (из сторожевого потока)
+    stall_detected = pyqtSignal(float)
+
     def __init__(self):
         super().__init__()
         self.setWindowTitle("Школьная библиотека")
         self.setGeometry(100, 100, 900, 600)
-        self.config = self.load_config()
-        self.books = self.load_books()
-        self.students = self.load_students()
-
-        self.readers_loaded = False
-        self.books_loaded = False
-        self.lazy_cancelled = False
-
-        self.lazy_readers_data = []
-        self.current_reader_index = 0
-        self.total_readers = 0
-        self.lazy_books_data = []
-        self.current_book_index = 0
-        self.total_books = 0
+        self.save_failed.connect(self.on_save_failed)
+        self.saver = WriteBehindSaver(on_error=self.save_failed.emit)
+        # Данные и операции над ними — в library/core.py, окно только показывает их
+        self.core = LibraryCore(paths, self.saver)
+        self.config = self.core.config
+        self.archive = self.core.archive
+        self.books = self.core.books
+        self.students = self.core.students
+        self.loans_index = self.core.loans_index
+        self.ledger = self.core.ledger
+        self.stats = self.core.stats
+        self.book_index = self.core.book_index
+        self.readers_index = self.core.readers_index
+        self.history = self.core.history
+        # Запись действий для replay.py (library/trace.py)
+        path = trace_path(self.config)
+        self.trace = TraceRecorder(path, self.saver, students=len(self.students), books=len(self.books)) \
+            if path else None
+        self.book_choices = QStringListModel(self)
+        # "Название - Автор" -> id экземпляров (см. library/loans.py)
+        self.book_copies = {}
+        self.book_choices_stale = True
 
         self.book_search_timer = QTimer(self)
         self.book_search_timer.setSingleShot(True)
-        self.book_search_timer.timeout.connect(self.start_lazy_loading_books)
+        self.book_search_timer.timeout.connect(self.refresh_books)
+        # По одной очереди обновления на таблицу: изменения фильтров за один
+        # проход цикла событий (например, пересоздание списков классов в
+        # apply_config_lists) дают одно обновление; прямой вызов refresh_*
+        # отменяет ожидающее, так что устаревший запрос не выполняется
+        self.readers_refresh_timer = QTimer(self)
+        self.readers_refresh_timer.setSingleShot(True)
+        self.readers_refresh_timer.timeout.connect(self.refresh_readers)
+        self.debts_refresh_timer = QTimer(self)
+        self.debts_refresh_timer.setSingleShot(True)
+        self.debts_refresh_timer.timeout.connect(self.refresh_debts)
 
         self._init_ui()
-        self.start_lazy_loading_readers()
+        self.refresh_readers()
+        self.refresh_books()
+        self.start_watchdog()
 
     def _init_ui(self):
         main_layout = QHBoxLayout(self)
         self.menu_buttons = []
         menu_layout = QVBoxLayout()
-        for name, index in [("Читатели", 0), ("Книги", 1), ("Классы и параллели", 2)]:
+        for name, index in [("Читатели", 0), ("Книги", 1), ("Классы и параллели", 2), ("Долги", 3),
+                            ("Статистика", 4), ("Производительность", 5)]:
             btn = QPushButton(name)
             btn.setFixedSize(150, 40)
             btn.clicked.connect(lambda _, i=index: self.switch_page(i))
             self.menu_buttons.append(btn)
             menu_layout.addWidget(btn)
         menu_layout.addStretch()
+        self.undo_btn = QPushButton("Отменить")
+        self.redo_btn = QPushButton("Повторить")
+        for btn, slot in ((self.undo_btn, self.undo), (self.redo_btn, self.redo)):
+            btn.setFixedSize(150, 30)
+            btn.clicked.connect(slot)
+            menu_layout.addWidget(btn)
+        # Ctrl+Z / Ctrl+Y и стандартные сочетания платформы
+        redo_keys = QKeySequence.keyBindings(QKeySequence.StandardKey.Redo)
+        if QKeySequence("Ctrl+Y") not in redo_keys:
+            redo_keys.append(QKeySequence("Ctrl+Y"))
+        for keys, slot in ((QKeySequence.keyBindings(QKeySequence.StandardKey.Undo), self.undo),
+                           (redo_keys, self.redo)):
+            for key in keys:
+                QShortcut(key, self).activated.connect(slot)
+        self.update_history_buttons()
         main_layout.addLayout(menu_layout)
 
         self.pages = QStackedWidget()
         self.pages.addWidget(self.create_readers_page())
         self.pages.addWidget(self.create_books_page())
         self.pages.addWidget(self.create_config_page())
+        self.pages.addWidget(self.create_debts_page())
+        self.pages.addWidget(self.create_stats_page())
+        self.pages.addWidget(self.create_profiling_page())
         main_layout.addWidget(self.pages)
         self.switch_page(0)
 
     def switch_page(self, index):
+        self.record("page", {"index": index})
+        if index == 3:
+            # Просрочка зависит от текущей даты
+            self.refresh_debts()
+        elif index == 4:
+            self.refresh_stats()
+        elif index == 5:
+            self.refresh_profiling()
         self.pages.setCurrentIndex(index)
         for i, btn in enumerate(self.menu_buttons):
             btn.setStyleSheet("background-color: lightblue; font-weight: bold;" if i == index else "")
@@ -349,13 +963,17 @@ class LibraryApp(QWidget):
         self.parallel_filter.currentTextChanged.connect(lambda: self.on_filters_changed())
         layout.addLayout(filters_layout)
 
+        buttons_layout = QHBoxLayout()
         add_student_btn = QPushButton("Добавить ученика")
         add_student_btn.clicked.connect(self.add_student)
-        layout.addWidget(add_student_btn)
-
-        self.readers_table = QTableWidget(0, 7)
-        self.readers_table.setHorizontalHeaderLabels(["Id", "Фамилия", "Имя", "Отчество", "Класс", "Параллель", "Книги"])
-        self.readers_table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Stretch)
+        buttons_layout.addWidget(add_student_btn)
+        archive_btn = QPushButton("Архив")
+        archive_btn.clicked.connect(self.show_archive)
+        buttons_layout.addWidget(archive_btn)
+        layout.addLayout(buttons_layout)
+
+        self.readers_model = StudentsTableModel(self.students, self.loan_display, self)
+        self.readers_table = make_table_view(self.readers_model)
         self.readers_table.doubleClicked.connect(self.edit_student)
         layout.addWidget(self.readers_table)
 
@@ -368,69 +986,31 @@ class LibraryApp(QWidget):
         return page
 
     def on_filters_changed(self):
-        self.lazy_cancelled = True
-        self.start_lazy_loading_readers(reset_books=False)
-
-    def start_lazy_loading_readers(self, reset_books=True):
-        self.lazy_cancelled = False
-        self.lazy_readers_data = self.get_filtered_students()
-        self.current_reader_index = 0
-        self.total_readers = len(self.lazy_readers_data)
-        self.readers_table.setRowCount(0)
-        self.readers_loaded = False
-        self.update_readers_status()
-        self.load_next_readers_chunk(reset_books=reset_books)
-
-    def load_next_readers_chunk(self, reset_books=True):
-        if self.lazy_cancelled:
-            return
-        CHUNK_SIZE = 50
-        end_index = min(self.current_reader_index + CHUNK_SIZE, self.total_readers)
-        for i in range(self.current_reader_index, end_index):
-            row = self.readers_table.rowCount()
-            self.insert_student_in_table(row, self.lazy_readers_data[i])
-        self.current_reader_index = end_index
+        self.record("readers.filter", {"fio": self.fio_search.text(), "class": self.class_filter.currentText(),
+                                       "parallel": self.parallel_filter.currentText()})
+        self.readers_refresh_timer.start(0)
+
+    def show_archive(self):
+        self.record("archive.open", {})
+        ArchiveDialog(self.archive, parent=self).exec()
+
+    @profiler.timed("readers.populate")
+    def refresh_readers(self):
+        self.readers_refresh_timer.stop()
+        self.readers_model.set_rows(self.get_filtered_students())
         self.update_readers_status()
-        if self.current_reader_index < self.total_readers and not self.lazy_cancelled:
-            QTimer.singleShot(60, lambda: self.load_next_readers_chunk(reset_books=reset_books))
-        else:
-            self.readers_loaded = True
-            if reset_books and (not self.books_loaded):
-                self.start_lazy_loading_books()
 
     def update_readers_status(self):
-        self.readers_status_label.setText(f"Читателей: {self.current_reader_index}/{self.total_readers}")
+        self.readers_status_label.setText(f"Читателей: {self.readers_model.rowCount()}/{len(self.students)}")
 
     def get_filtered_students(self):
         selected_class = self.class_filter.currentText()
         selected_parallel = self.parallel_filter.currentText()
-        fio_query = self.fio_search.text().lower()
-        filtered = []
-        for st in self.students:
-            if selected_class != "Все" and st.get("class", "") != selected_class:
-                continue
-            if selected_parallel != "Все" and st.get("parallel", "") != selected_parallel:
-                continue
-            if fio_query:
-                if not (fio_query in st.get("last_name", "").lower() or
-                        fio_query in st.get("first_name", "").lower() or
-                        fio_query in st.get("middle_name", "").lower()):
-                    continue
-            filtered.append(st)
-        return filtered
-
-    def insert_student_in_table(self, row, data):
-        self.readers_table.insertRow(row)
-        self.set_student_row(row, data)
-
-    def set_student_row(self, row, data):
-        self.readers_table.setItem(row, 0, QTableWidgetItem(str(row + 1)))
-        self.readers_table.setItem(row, 1, QTableWidgetItem(data["last_name"]))
-        self.readers_table.setItem(row, 2, QTableWidgetItem(data["first_name"]))
-        self.readers_table.setItem(row, 3, QTableWidgetItem(data["middle_name"]))
-        self.readers_table.setItem(row, 4, QTableWidgetItem(data["class"]))
-        self.readers_table.setItem(row, 5, QTableWidgetItem(data["parallel"]))
-        self.readers_table.setItem(row, 6, QTableWidgetItem(", ".join(data.get("books", []))))
+        return self.core.search_students(
+            self.fio_search.text(),
+            None if selected_class == "Все" else selected_class,
+            None if selected_parallel == "Все" else selected_parallel
+        )
 
     def create_books_page(self):
         page = QWidget()
@@ -445,17 +1025,20 @@ class LibraryApp(QWidget):
         search_layout.addWidget(self.book_search_edit)
         layout.addLayout(search_layout)
 
-        self.books_table = QTableWidget(0, 2)
-        self.books_table.setHorizontalHeaderLabels(["Название", "Автор"])
-        self.books_table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Stretch)
+        self.books_model = BooksTableModel(self.book_index.search, self.books, self.loans_index.count, self)
+        self.books_table = make_table_view(self.books_model)
+        self.books_table.doubleClicked.connect(lambda: self.edit_book())
         layout.addWidget(self.books_table)
 
         btn_layout = QHBoxLayout()
         add_book_btn = QPushButton("Добавить книгу")
         add_book_btn.clicked.connect(self.add_book)
+        edit_book_btn = QPushButton("Изменить книгу")
+        edit_book_btn.clicked.connect(lambda: self.edit_book())
         del_book_btn = QPushButton("Удалить книгу")
         del_book_btn.clicked.connect(self.delete_book)
         btn_layout.addWidget(add_book_btn)
+        btn_layout.addWidget(edit_book_btn)
         btn_layout.addWidget(del_book_btn)
         layout.addLayout(btn_layout)
 
@@ -470,65 +1053,265 @@ class LibraryApp(QWidget):
     def on_book_search_text_changed(self):
         self.book_search_timer.start(300)
 
-    def start_lazy_loading_books(self):
-        query = self.book_search_edit.text().lower() if hasattr(self, 'book_search_edit') else ""
-        self.lazy_books_data = []
-        for bk in self.books:
-            title = bk.get("Title", "")
-            author = bk.get("Author", "")
-            if query and (query not in title.lower() and query not in author.lower()):
-                continue
-            self.lazy_books_data.append(bk)
-        self.current_book_index = 0
-        self.total_books = len(self.lazy_books_data)
-        self.books_table.setRowCount(0)
-        self.books_loaded = False
-        self.update_books_status()
-        self.load_next_books_chunk()
-
-    def load_next_books_chunk(self):
-        CHUNK_SIZE = 50
-        end_index = min(self.current_book_index + CHUNK_SIZE, self.total_books)
-        for i in range(self.current_book_index, end_index):
-            row = self.books_table.rowCount()
-            book = self.lazy_books_data[i]
-            self.books_table.insertRow(row)
-            self.books_table.setItem(row, 0, QTableWidgetItem(book.get("Title", "")))
-            self.books_table.setItem(row, 1, QTableWidgetItem(book.get("Author", "")))
-        self.current_book_index = end_index
+    @profiler.timed("books.populate")
+    def refresh_books(self):
+        self.book_search_timer.stop()
+        self.record("books.search", {"query": self.book_search_edit.text()})
+        self.books_model.set_filter(self.book_search_edit.text())
         self.update_books_status()
-        if self.current_book_index < self.total_books:
-            QTimer.singleShot(60, self.load_next_books_chunk)
-        else:
-            self.books_loaded = True
 
     def update_books_status(self):
-        self.books_status_label.setText(f"Книг: {self.current_book_index}/{self.total_books}")
+        self.books_status_label.setText(f"Книг: {self.books_model.rowCount()}/{len(self.books)}")
 
     def add_book(self):
         dlg = BookDialog(self)
         if dlg.exec() == QDialog.DialogCode.Accepted:
             data = dlg.get_data()
             if data["Title"] and data["Author"]:
-                self.books.append(data)
-                self.save_books()
-                self.start_lazy_loading_books()
+                self.perform("book.add", {"data": data})
             else:
                 QMessageBox.warning(self, "Ошибка", "Оба поля должны быть заполнены!")
 
-    def delete_book(self):
-        selected = self.books_table.selectedItems()
+    def selected_book(self):
+        selected = self.books_table.selectionModel().selectedRows()
         if not selected:
+            return None
+        return self.books.get(self.books_model.record_id(selected[0].row()))
+
+    def confirm_holders(self, book, question):
+        # Показывает, скольких читателей затронет изменение книги
+        holders = self.loans_index.count(book["id"])
+        if not holders:
+            return True
+        reply = QMessageBox.question(
+            self, "Подтверждение",
+            f"Книга «{book_display(book)}» числится у читателей: {holders}.\n{question}")
+        return reply == QMessageBox.StandardButton.Yes
+
+    def edit_book(self):
+        book = self.selected_book()
+        if book is None:
+            QMessageBox.warning(self, "Ошибка", "Выберите книгу для изменения!")
+            return
+        dlg = BookDialog(self, book_data=book)
+        if dlg.exec() != QDialog.DialogCode.Accepted:
+            return
+        data = dlg.get_data()
+        if not (data["Title"] and data["Author"]):
+            QMessageBox.warning(self, "Ошибка", "Оба поля должны быть заполнены!")
+            return
+        if data["Title"] == book["Title"] and data["Author"] == book["Author"]:
+            return
+        if not self.confirm_holders(book, "Новое название будет показано и у них. Сохранить?"):
+            return
+        self.perform("book.edit", {"book_id": book["id"], "data": data})
+
+    def delete_book(self):
+        book_to_delete = self.selected_book()
+        if book_to_delete is None:
             QMessageBox.warning(self, "Ошибка", "Выберите книгу для удаления!")
             return
-        row = selected[0].row()
-        query = self.book_search_edit.text().lower()
-        filtered = [b for b in self.books if (not query) or (query in b.get("Title", "").lower() or query in b.get("Author", "").lower())]
-        if row < len(filtered):
-            book_to_delete = filtered[row]
-            self.books.remove(book_to_delete)
-            self.save_books()
-            self.start_lazy_loading_books()
+        if not self.confirm_holders(book_to_delete, "Удалить её из каталога? У читателей она останется в списках названием."):
+            return
+        self.perform("book.delete", {"book_id": book_to_delete["id"]})
+
+    def create_debts_page(self):
+        page = QWidget()
+        layout = QVBoxLayout(page)
+
+        filters_layout = QHBoxLayout()
+        filters_layout.addWidget(QLabel("Показать:"))
+        self.debts_mode = QComboBox()
+        self.debts_mode.addItems(["Просроченные", "Срок на этой неделе", "Все на руках"])
+        filters_layout.addWidget(self.debts_mode)
+        filters_layout.addWidget(QLabel("Класс:"))
+        self.debts_class_filter = QComboBox()
+        self.debts_class_filter.addItem("Все")
+        self.debts_class_filter.addItems(self.config.get("classes", []))
+        filters_layout.addWidget(self.debts_class_filter)
+        filters_layout.addWidget(QLabel("Параллель:"))
+        self.debts_parallel_filter = QComboBox()
+        self.debts_parallel_filter.addItem("Все")
+        self.debts_parallel_filter.addItems(self.config.get("parallels", []))
+        filters_layout.addWidget(self.debts_parallel_filter)
+        for combo in (self.debts_mode, self.debts_class_filter, self.debts_parallel_filter):
+            combo.currentTextChanged.connect(lambda: self.debts_refresh_timer.start(0))
+        layout.addLayout(filters_layout)
+
+        self.debts_model = LoansTableModel(self.ledger.loans, self.students, self.loan_display, self)
+        self.debts_table = make_table_view(self.debts_model)
+        layout.addWidget(self.debts_table)
+
+        status_layout = QHBoxLayout()
+        status_layout.addStretch()
+        self.debts_status_label = QLabel("Выдач: 0")
+        status_layout.addWidget(self.debts_status_label)
+        layout.addLayout(status_layout)
+
+        return page
+
+    def refresh_debts(self):
+        self.debts_refresh_timer.stop()
+        self.debts_model.set_rows(self.get_debts())
+        self.debts_status_label.setText(f"Выдач: {self.debts_model.rowCount()}")
+
+    def get_debts(self):
+        # Ученики класса берутся из корзины индекса, выдачи — из индекса по сроку
+        selected_class = self.debts_class_filter.currentText()
+        selected_parallel = self.debts_parallel_filter.currentText()
+        student_ids = None
+        if selected_class != "Все" or selected_parallel != "Все":
+            student_ids = {st["id"] for st in self.readers_index.search(
+                "",
+                None if selected_class == "Все" else selected_class,
+                None if selected_parallel == "Все" else selected_parallel)}
+        mode = self.debts_mode.currentIndex()
+        if mode == 0:
+            return self.ledger.overdue(today_iso(), student_ids)
+        if mode == 1:
+            return self.ledger.due_between(*week_bounds(today_iso()), student_ids=student_ids)
+        return self.ledger.due_between(student_ids=student_ids)
+
+    def on_loans_changed(self):
+        self.books_model.refresh_column(BooksTableModel.HOLDERS_COLUMN)
+        self.refresh_debts()
+
+    def create_stats_page(self):
+        page = QWidget()
+        layout = QVBoxLayout(page)
+        self.stats_summary_label = QLabel()
+        layout.addWidget(self.stats_summary_label)
+
+        # Четыре таблицы в две строки
+        self.stats_tables = {}
+        sections = [
+            ("classes", "Книги на руках по классам", "Класс"),
+            ("books", "Самые читаемые книги", "Книга"),
+            ("authors", "Популярные авторы", "Автор"),
+            ("students", "Больше всего книг на руках", "Ученик"),
+        ]
+        for row_start in (0, 2):
+            row_layout = QHBoxLayout()
+            for key, title, header in sections[row_start:row_start + 2]:
+                group = QGroupBox(title)
+                group_layout = QVBoxLayout(group)
+                table = QTableWidget(0, 2)
+                table.setHorizontalHeaderLabels([header, "Кол-во"])
+                table.horizontalHeader().setSectionResizeMode(0, QHeaderView.ResizeMode.Stretch)
+                table.horizontalHeader().setSectionResizeMode(1, QHeaderView.ResizeMode.ResizeToContents)
+                table.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+                group_layout.addWidget(table)
+                row_layout.addWidget(group)
+                self.stats_tables[key] = table
+            layout.addLayout(row_layout)
+
+        return page
+
+    @profiler.timed("stats.refresh")
+    def refresh_stats(self):
+        # Все значения берутся из счётчиков self.stats, без обхода учеников
+        self.stats_summary_label.setText(
+            f"Читателей: {len(self.students)}, книг в каталоге: {len(self.books)}, "
+            f"книг на руках: {self.stats.loans_on_hand()}, выдач в журнале: {len(self.ledger)}")
+
+        def student_name(student_id):
+            st = self.students.get(student_id, {})
+            return (f'{st.get("last_name", "")} {st.get("first_name", "")} '
+                    f'{st.get("class", "")}{st.get("parallel", "")}')
+
+        rows = {
+            "classes": [(cls + par, count) for (cls, par), count in self.stats.classes()],
+            "books": [(self.loan_display(book) or "(удалена из каталога)", count)
+                      for book, count in self.stats.top_books()],
+            "authors": self.stats.top_authors(),
+            "students": [(student_name(key), count) for key, count in self.stats.top_students()],
+        }
+        for key, table in self.stats_tables.items():
+            table.setRowCount(len(rows[key]))
+            for i, (name, count) in enumerate(rows[key]):
+                table.setItem(i, 0, QTableWidgetItem(name))
+                table.setItem(i, 1, QTableWidgetItem(str(count)))
+
+    # ---------------------------------------------------------
+    # Производительность: замеры из library/profiling.py
+    # ---------------------------------------------------------
+    PROFILING_HEADERS = ["Операция", "Вызовов", "Всего, мс", "Среднее, мс", "p50, мс", "p95, мс",
+                         "Макс, мс", "Пик памяти, КиБ"]
+
+    def create_profiling_page(self):
+        page = QWidget()
+        layout = QVBoxLayout(page)
+        top_layout = QHBoxLayout()
+        self.profiling_check = QCheckBox("Собирать замеры")
+        self.profiling_check.setChecked(profiler.enabled)
+        self.profiling_check.setToolTip(
+            f"С самого запуска: переменная окружения {ENV_VAR}=1 или \"profiling\": true в config.json")
+        self.profiling_check.toggled.connect(self.on_profiling_toggled)
+        top_layout.addWidget(self.profiling_check)
+        top_layout.addStretch()
+        for text, slot in (("Обновить", self.refresh_profiling), ("Сбросить", self.reset_profiling),
+                           ("Экспорт...", self.export_profiling)):
+            btn = QPushButton(text)
+            btn.clicked.connect(slot)
+            top_layout.addWidget(btn)
+        layout.addLayout(top_layout)
+
+        self.profiling_table = QTableWidget(0, len(self.PROFILING_HEADERS))
+        self.profiling_table.setHorizontalHeaderLabels(self.PROFILING_HEADERS)
+        self.profiling_table.horizontalHeader().setSectionResizeMode(0, QHeaderView.ResizeMode.Stretch)
+        self.profiling_table.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+        layout.addWidget(self.profiling_table)
+        self.profiling_status_label = QLabel()
+        layout.addWidget(self.profiling_status_label)
+        return page
+
+    def refresh_profiling(self):
+        records = profiler.snapshot()
+        self.profiling_table.setRowCount(len(records))
+        for i, r in enumerate(records):
+            values = [r["operation"], r["count"], f'{r["total_ms"]:.1f}', f'{r["mean_ms"]:.2f}',
+                      f'{r["p50_ms"]:.2f}', f'{r["p95_ms"]:.2f}', f'{r["max_ms"]:.2f}',
+                      f'{r["peak_bytes"] / 1024:.0f}' if profiler.trace_memory else "—"]
+            # Гистограмма длительностей — во всплывающей подсказке строки
+            tooltip = "\n".join(f"{label}: {n}" for label, n in r["histogram"].items() if n)
+            for column, value in enumerate(values):
+                item = QTableWidgetItem(str(value))
+                item.setToolTip(tooltip)
+                if column:
+                    item.setTextAlignment(Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter)
+                self.profiling_table.setItem(i, column, item)
+        if not profiler.enabled:
+            status = "Замеры выключены"
+        else:
+            memory = "время и память" if profiler.trace_memory else "только время"
+            status = f"Замеры с {profiler.started} ({memory})"
+        if self.watchdog is not None:
+            status += (f". Зависаний за сеанс: {self.watchdog.stalls}"
+                       f" (самое долгое {self.watchdog.longest_ms:.0f} мс, журнал: {paths['stall_log']})")
+        self.profiling_status_label.setText(status)
+
+    def on_profiling_toggled(self, checked):
+        if checked:
+            profiler.enable()
+        else:
+            profiler.disable()
+        self.refresh_profiling()
+
+    def reset_profiling(self):
+        profiler.reset()
+        self.refresh_profiling()
+
+    def export_profiling(self):
+        path, _ = QFileDialog.getSaveFileName(self, "Экспорт замеров", os.path.join(BASE_DIR, "замеры.jsonl"),
+                                              "JSON lines (*.jsonl)")
+        if not path:
+            return
+        try:
+            count = profiler.export_jsonl(path)
+        except OSError as e:
+            QMessageBox.warning(self, "Ошибка", f"Не удалось сохранить замеры: {e}")
+            return
+        QMessageBox.information(self, "Экспорт", f"Сохранено операций: {count}")
 
     def create_config_page(self):
         page = QWidget()
@@ -614,150 +1397,245 @@ class LibraryApp(QWidget):
         if not classes or not parallels:
             QMessageBox.warning(self, "Ошибка", "Списки не могут быть пустыми!")
             return
-        self.config["classes"] = classes
-        self.config["parallels"] = parallels
-        self.save_config()
-        self.class_filter.clear()
-        self.class_filter.addItem("Все")
-        self.class_filter.addItems(classes)
-        self.parallel_filter.clear()
-        self.parallel_filter.addItem("Все")
-        self.parallel_filter.addItems(parallels)
+        self.perform("config.save", {"classes": classes, "parallels": parallels})
         QMessageBox.information(self, "Сохранено", "Настройки сохранены.")
 
-    def add_student(self):
-        dlg = StudentDialog(
+    def apply_config_lists(self):
+        classes = self.config.get("classes", [])
+        parallels = self.config.get("parallels", [])
+        for widget, items in ((self.classes_list_widget, classes), (self.parallels_list_widget, parallels)):
+            widget.clear()
+            widget.addItems(items)
+        for combo, items in ((self.class_filter, classes), (self.parallel_filter, parallels),
+                             (self.debts_class_filter, classes), (self.debts_parallel_filter, parallels)):
+            combo.clear()
+            combo.addItem("Все")
+            combo.addItems(items)
+
+    @profiler.timed("student_dialog.open")
+    def create_student_dialog(self, student=None):
+        self.record("student_dialog.open", {"student_id": None if student is None else student["id"]})
+        # Диалог получает копию ученика, где книги заменены строками для показа
+        return StudentDialog(
             self,
-            student_data=None,
-            books_list=self.get_books_display_list(),
+            student_data=None if student is None else
+            dict(student, books=[self.loan_display(entry) for entry in student.get("books", [])]),
+            books_model=self.get_book_choices(),
+            book_search=self.search_book_choices,
             classes_list=self.config.get("classes", []),
             parallels_list=self.config.get("parallels", [])
         )
+
+    def add_student(self):
+        dlg = self.create_student_dialog()
         if dlg.exec() == QDialog.DialogCode.Accepted:
             data = dlg.get_data()
             if not self.validate_student_data(data):
                 return
-            self.students.append(data)
-            self.save_students()
-            self.start_lazy_loading_readers(reset_books=False)
+            self.resolve_dialog_loans(data)
+            self.perform("student.add", {"data": data})
 
     def edit_student(self, index):
-        row = index.row()
-        filtered = self.get_filtered_students()
-        if row >= len(filtered):
+        student_id = self.readers_model.record_id(index.row())
+        student = self.students.get(student_id)
+        if student is None:
             return
-        student = filtered[row]
-        full_index = self.students.index(student)
-        dlg = StudentDialog(
-            self,
-            student_data=student,
-            books_list=self.get_books_display_list(),
-            classes_list=self.config.get("classes", []),
-            parallels_list=self.config.get("parallels", [])
-        )
+        dlg = self.create_student_dialog(student)
         res = dlg.exec()
         if res == 2:
-            del self.students[full_index]
-            self.save_students()
-            self.start_lazy_loading_readers(reset_books=False)
+            self.perform("student.delete", {"student_id": student_id})
         elif res == QDialog.DialogCode.Accepted:
             data = dlg.get_data()
             if not self.validate_student_data(data):
                 return
-            self.students[full_index] = data
-            self.save_students()
-            self.start_lazy_loading_readers(reset_books=False)
+            self.resolve_dialog_loans(data, student)
+            self.perform("student.edit", {"student_id": student_id, "data": data})
 
     def validate_student_data(self, data):
-        if (not self.is_valid_name(data["last_name"]) or
-            not self.is_valid_name(data["first_name"]) or
-            not self.is_valid_name(data["middle_name"])):
-            QMessageBox.warning(self, "Ошибка ввода", "Фамилия, Имя и Отчество должны содержать только буквы!")
+        error = self.core.validate_student(data)
+        if error:
+            QMessageBox.warning(self, "Ошибка ввода", error)
             return False
         return True
 
-    @staticmethod
-    def is_valid_name(text):
-        return bool(re.fullmatch(r"[А-Яа-яA-Za-z-]+", text.strip()))
-
-    def get_books_display_list(self):
-        return [f'{b.get("Title", "")} - {b.get("Author", "")}' for b in self.books]
+    def get_book_choices(self):
+        # Модель и словарь строка -> id пересобираются только после изменения каталога.
+        # Экземпляры одного названия показываются одной строкой
+        if self.book_choices_stale:
+            self.book_copies = book_copies(self.books.values())
+            self.book_choices.setStringList(list(self.book_copies))
+            self.book_choices_stale = False
+        return self.book_choices
+
+    def resolve_dialog_loans(self, data, student=None):
+        # Диалог возвращает строки; книги из каталога сохраняются по id экземпляра:
+        # у ученика остаются его экземпляры, новые выдаются из свободных
+        self.get_book_choices()
+        own = {}
+        for entry in (student or {}).get("books", []):
+            if isinstance(entry, int) and entry in self.books:
+                own.setdefault(book_display(self.books[entry]), []).append(entry)
+        data["books"] = resolve_copies(data["books"], self.book_copies,
+                                       lambda book_id: self.loans_index.count(book_id) > 0, own)
+
+    def loan_display(self, entry):
+        return self.core.loan_display(entry)
+
+    def search_book_choices(self, query, limit):
+        return list(dict.fromkeys(book_display(b) for b in self.book_index.search(query, limit)))
 
     def shift_students(self):
-        last_class = max(self.config.get("classes", []), key=lambda x: int(x))
-        ambiguous_students = []
-        for st in self.students:
-            cls = st.get("class", "")
-            if not cls.isdigit():
-                continue
-            if cls not in ["9", last_class]:
-                st["class"] = str(int(cls) + 1)
-            else:
-                ambiguous_students.append(st)
-        if ambiguous_students:
-            dlg = AmbiguousShiftDialog(ambiguous_students, last_class, parent=self)
-            if dlg.exec() == QDialog.DialogCode.Accepted:
-                self.students = [st for st in self.students if not st.get("to_delete", False)]
-        self.save_students()
-        self.start_lazy_loading_readers(reset_books=False)
-
-    def load_config(self):
-        if os.path.exists(config_path):
-            try:
-                with open(config_path, "r", encoding="utf-8") as f:
-                    return json.load(f)
-            except Exception as e:
-                print("Ошибка загрузки config.json:", e)
-        return {
-            "classes": [str(i) for i in range(1, 12)],
-            "parallels": ["А", "Б", "В", "Г", "Д", "Л", "М"]
-        }
-
-    def save_config(self):
-        try:
-            with open(config_path, "w", encoding="utf-8") as f:
-                json.dump(self.config, f, ensure_ascii=False, indent=4)
-        except Exception as e:
-            print("Ошибка сохранения config.json:", e)
-
-    def load_books(self):
-        books = []
-        if os.path.exists(books_path):
-            try:
-                with open(books_path, "r", encoding="utf-8") as f:
-                    for line in f:
-                        line = line.strip().rstrip(',')
-                        m = re.search(r'\{Title\s*=\s*"([^"]+)"\s*,\s*Author\s*=\s*"([^"]+)"\}', line)
-                        if m:
-                            books.append({"Title": m.group(1), "Author": m.group(2)})
-            except Exception as e:
-                print("Ошибка загрузки литература.txt:", e)
-        return books
-
-    def save_books(self):
-        try:
-            with open(books_path, "w", encoding="utf-8") as f:
-                for book in self.books:
-                    line = f'{{Title = "{book.get("Title", "")}", Author = "{book.get("Author", "")}"}},\n'
-                    f.write(line)
-        except Exception as e:
-            print("Ошибка сохранения литература.txt:", e)
-
-    def load_students(self):
-        if os.path.exists(students_path):
-            try:
-                with open(students_path, "r", encoding="utf-8") as f:
-                    return json.load(f)
-            except Exception as e:
-                print("Ошибка загрузки students.json:", e)
-        return []
-
-    def save_students(self):
+        self.record("promotion_dialog.open", {})
+        dlg = PromotionDialog(self.students, self.readers_index.class_groups(), self.core.last_class(), parent=self)
+        if dlg.exec() == QDialog.DialogCode.Accepted:
+            self.perform("promotion", {"rules": dlg.rules, "overrides": dlg.overrides, "last_class": dlg.last_class})
+
+    # ---------------------------------------------------------
+    # Действия для записи и воспроизведения (library/trace.py, replay.py)
+    # ---------------------------------------------------------
+    def record(self, op, args):
+        if self.trace is not None:
+            self.trace.write(op, args)
+
+    def perform(self, op, args):
+        # Изменения данных — уже после диалогов и подтверждений; окно и
+        # replay.py выполняют их одним и тем же кодом. Действия просмотра
+        # (фильтры, поиск, открытие диалогов) окно только записывает,
+        # а здесь они воспроизводятся без показа модальных окон
+        self.record(op, args)
         try:
-            with open(students_path, "w", encoding="utf-8") as f:
-                json.dump(self.students, f, ensure_ascii=False, indent=4)
-        except Exception as e:
-            print("Ошибка сохранения students.json:", e)
+            if op == "student.add":
+                change = self.core.add_student(args["data"])
+            elif op == "student.edit":
+                change = self.core.update_student(self.students[args["student_id"]], args["data"])
+            elif op == "student.delete":
+                change = self.core.delete_student(self.students[args["student_id"]])
+            elif op == "book.add":
+                change = self.core.add_book(args["data"])
+            elif op == "book.edit":
+                change = self.core.update_book(self.books[args["book_id"]], args["data"])
+            elif op == "book.delete":
+                change = self.core.delete_book(self.books[args["book_id"]])
+            elif op == "promotion":
+                # Ключи JSON — строки, id учеников — числа
+                overrides = {int(key): action for key, action in args["overrides"].items()}
+                change = self.core.promote(self.core.plan_promotion(args["rules"], overrides, args["last_class"]))
+            elif op == "config.save":
+                change = self.core.set_class_lists(args["classes"], args["parallels"])
+            elif op == "undo":
+                change = self.core.undo()
+            elif op == "redo":
+                change = self.core.redo()
+            else:
+                self.replay_view(op, args)
+                return
+        except CommitError as e:
+            # Например, архив недоступен для записи: данные не изменились
+            self.save_failed.emit(str(e))
+            return
+        self.apply_change(change)
+
+    def replay_view(self, op, args):
+        if op == "page":
+            self.switch_page(args["index"])
+        elif op == "readers.filter":
+            for widget, value in ((self.fio_search, args["fio"]), (self.class_filter, args["class"]),
+                                  (self.parallel_filter, args["parallel"])):
+                widget.blockSignals(True)
+                if widget is self.fio_search:
+                    widget.setText(value)
+                else:
+                    widget.setCurrentText(value)
+                widget.blockSignals(False)
+            self.on_filters_changed()
+            self.refresh_readers()
+        elif op == "books.search":
+            self.book_search_edit.blockSignals(True)
+            self.book_search_edit.setText(args["query"])
+            self.book_search_edit.blockSignals(False)
+            self.refresh_books()
+        elif op == "student_dialog.open":
+            student_id = args.get("student_id")
+            self.create_student_dialog(None if student_id is None else self.students[student_id]).deleteLater()
+        elif op == "promotion_dialog.open":
+            PromotionDialog(self.students, self.readers_index.class_groups(), self.core.last_class(),
+                            parent=self).deleteLater()
+        elif op == "archive.open":
+            # Открытие включает чтение списка лет; диалог закрывается,
+            # только когда фоновое чтение закончилось и доставлено
+            dlg = ArchiveDialog(self.archive, parent=self)
+            dlg.wait_background()
+            QApplication.processEvents()
+            dlg.done(0)
+            dlg.deleteLater()
+        else:
+            raise ValueError(f"Неизвестное действие: {op}")
+
+    # ---------------------------------------------------------
+    # Отмена и обновление представлений после изменений
+    # ---------------------------------------------------------
+    def apply_change(self, change):
+        # Данные уже изменены ядром (LibraryCore.commit); здесь
+        # обновляются только таблицы, списки и кнопки истории
+        self.update_history_buttons()
+        if change is None:
+            return
+        if change.config is not None:
+            self.apply_config_lists()
+        if change.books:
+            self.book_choices_stale = True
+            self.books_model.refilter()
+            self.update_books_status()
+            self.readers_model.refresh_column(StudentsTableModel.BOOKS_COLUMN)
+        if change.students:
+            self.refresh_readers()
+        if change.books or change.students or change.loans:
+            self.on_loans_changed()
+        if self.pages.currentIndex() == 4:
+            self.refresh_stats()
+
+    def undo(self):
+        self.perform("undo", {})
+
+    def redo(self):
+        self.perform("redo", {})
+
+    def update_history_buttons(self):
+        self.undo_btn.setEnabled(self.history.can_undo())
+        self.undo_btn.setToolTip(f"Отменить: {self.history.undo_label()}" if self.history.can_undo() else "")
+        self.redo_btn.setEnabled(self.history.can_redo())
+        self.redo_btn.setToolTip(f"Повторить: {self.history.redo_label()}" if self.history.can_redo() else "")
+
+    def start_watchdog(self):
+        # Окно не отвечало дольше порога — стек и действие пишутся в зависания.log;
+        # "stall_threshold_ms": 0 в config.json отключает слежение
+        self.watchdog = None
+        threshold = self.config.get("stall_threshold_ms", STALL_THRESHOLD_MS)
+        if not threshold:
+            return
+        self.stall_detected.connect(self.on_stall_detected)
+        self.watchdog = StallWatchdog(threshold, paths["stall_log"], [__file__], self.stall_detected.emit)
+        self.heartbeat_timer = QTimer(self)
+        self.heartbeat_timer.setInterval(round(self.watchdog.interval * 1000))
+        self.heartbeat_timer.timeout.connect(self.watchdog.beat)
+        self.heartbeat_timer.start()
+        self.watchdog.start()
+
+    def on_stall_detected(self, ms):
+        if self.pages.currentIndex() == 5:
+            self.refresh_profiling()
+
+    def on_save_failed(self, message):
+        QMessageBox.warning(self, "Ошибка сохранения", message)
+
+    def closeEvent(self, event):
+        # Всё, что ещё не записано, сохраняется до выхода
+        if self.watchdog is not None:
+            self.heartbeat_timer.stop()
+            self.watchdog.stop()
+        self.core.close()
+        self.saver.close()
+        super().closeEvent(event)
 
     if getattr(sys, 'frozen', False):
         BASE_DIR = os.path.dirname(sys.executable)
@@ -768,6 +1646,10 @@ class LibraryApp(QWidget):
 if __name__ == "__main__":
     os.chdir(BASE_DIR)
     app = QApplication(sys.argv)
-    window = LibraryApp()
+    try:
+        window = LibraryApp()
+    except DataLockedError as e:
+        QMessageBox.critical(None, "Школьная библиотека", str(e))
+        sys.exit(1)
     window.show()
     sys.exit(app.exec())